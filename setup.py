@@ -70,17 +70,21 @@ setup_args = dict(
     # Optional requirements
     extras_require={
         "test": ["pytest", "nose", "coverage"],
+        "tracing": ["opentelemetry-api"],
     },
     setup_requires=["pytest-runner"],
     tests_require=["pytest"],
     entry_points={
         "console_scripts": [
-            "pii-extract-presidio-info = pii_extract_plg_presidio.app.info:main"
+            "pii-extract-presidio-info = pii_extract_plg_presidio.app.info:main",
+            "pii-extract-presidio-daemon = pii_extract_plg_presidio.app.daemon:main",
+            "pii-extract-presidio-job = pii_extract_plg_presidio.app.job:main"
         ],
         "pii_extract.plugins": "piisa-detectors-presidio = pii_extract_plg_presidio.plugin_loader:PiiExtractPluginLoader"
     },
     include_package_data=True,
-    package_data={"": ["pii_extract_plg_presidio/resources/*.json"]},
+    package_data={"": ["pii_extract_plg_presidio/resources/*.json",
+                      "pii_extract_plg_presidio/resources/langid/*.txt"]},
     # Post-install hooks
     cmdclass={},
     keywords=["PIISA, PII"],
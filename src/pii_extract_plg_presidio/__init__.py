@@ -1 +1 @@
-VERSION = "0.3.3"
+VERSION = "0.4.0"
@@ -0,0 +1,72 @@
+"""
+Command-line script to launch the Presidio analyzer daemon
+"""
+
+import sys
+import argparse
+
+from typing import List
+
+from pii_data.helper.logger import PiiLogger
+
+from .. import VERSION
+from ..plugin_loader import load_presidio_plugin_config
+from ..task.collector import PresidioTaskCollector
+from ..task.daemon import AnalyzerDaemon, default_socket
+
+
+def parse_args(args: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=f"Launch a local Presidio analyzer daemon (version {VERSION})")
+
+    parser.add_argument("--socket", default=default_socket(),
+                        help="Unix socket to listen on (default: %(default)s)")
+
+    c1 = parser.add_argument_group('Preloading options')
+    c1.add_argument("--config", nargs="+",
+                    help="PIISA configuration file(s) for the engine to preload")
+    c1.add_argument("--lang", nargs='+', help="language(s) to preload")
+    c1.add_argument("--no-preload", action="store_true",
+                    help="do not preload any engine")
+
+    c2 = parser.add_argument_group("Other")
+    c2.add_argument("--debug", action="store_true", help="debug mode")
+    c2.add_argument('--reraise', action='store_true',
+                    help='re-raise exceptions on errors')
+
+    return parser.parse_args(args)
+
+
+def main(args: List[str] = None):
+    if args is None:
+        args = sys.argv[1:]
+    args = parse_args(args)
+
+    try:
+        log = PiiLogger(__name__, debug=True if args.debug else None)
+        server = AnalyzerDaemon(args.socket, logger=log)
+
+        # Build & warm up the engine for the config, so that it is ready for
+        # the tasks that will use it
+        if not args.no_preload:
+            config = load_presidio_plugin_config(args.config)
+            tc = PresidioTaskCollector(config, languages=args.lang,
+                                       debug=args.debug or None)
+            tc.warmup()
+
+        print(f". Presidio daemon listening on {server.socket_path}",
+              file=sys.stderr)
+        with server:
+            server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        if args.reraise:
+            raise
+        else:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,28 +2,67 @@
 Command-line script to show information about the package
 """
 
+import re
 import sys
+import json
 import argparse
 from operator import attrgetter
+from contextlib import nullcontext
 
-from typing import List, TextIO
+from typing import List, TextIO, Iterable
 
 from presidio_analyzer import RemoteRecognizer, PatternRecognizer
 
 from pii_data import VERSION as VERSION_DATA
 from pii_data.helper.exception import ProcException
 from pii_data.helper.logger import PiiLogger
+from pii_data.types.doc import DocumentChunk
 from pii_extract import VERSION as VERSION_EXTRACT
 from pii_extract.gather.parser import parse_task_descriptor
 from pii_extract.gather.collection.sources.utils import RawTaskDefaults
 from pii_extract.gather.collection.task_collection import filter_piid
 from pii_extract.build.build import build_task
+from pii_extract.build.task import BasePiiTask
 
 from .. import VERSION
 from ..plugin_loader import load_presidio_plugin_config
-from ..task.analyzer import presidio_analyzer
-from ..task.utils import presidio_version
+from .. import defs
+from ..task.analyzer import presidio_analyzer, pruned_recognizers
+from ..task.utils import presidio_version, presidio_languages
 from ..task import PresidioTaskCollector
+from ..task.textfile import DEFAULT_CHUNK_SIZE
+from .profiler import PROFILERS, profile_run, stage_report
+from .memory import memory_report, sample_chunks
+
+
+def build_plugin_tasks(config: List[str] = None, lang: List[str] = None,
+                       debug: bool = False) -> Iterable[BasePiiTask]:
+    """
+    Build the task objects defined via the plugin
+      :param config: PIISA configuration file(s) to add
+      :param lang: languages to restrict the tasks to
+      :param debug: activate debug mode
+    """
+    config = load_presidio_plugin_config(config)
+
+    # Get the Presidio task descriptor
+    tc = PresidioTaskCollector(config, languages=lang, debug=debug)
+    raw_tdesc = tc.gather_tasks()
+
+    # Ensure it is normalized
+    reformat = RawTaskDefaults()
+    tdesc = reformat(raw_tdesc)
+
+    for td in tdesc:
+        # Create the task definition (inc. pii demultiplexing)
+        tdef = parse_task_descriptor(td)
+
+        # Filter by language
+        if lang:
+            tdef["piid"] = filter_piid(tdef["piid"], lang=set(lang))
+
+        # Build the task
+        yield build_task(tdef)
 
 
 class Processor:
@@ -40,6 +79,8 @@ class Processor:
         """
         #print("*** INIT")
         config = load_presidio_plugin_config(self.args.config)
+        if getattr(self.args, "prune", False):
+            config[defs.CFG_ENGINE][defs.CFG_PRUNE] = True
         #print("*** CONFIG", config)
         try:
             return presidio_analyzer(config, languages=self.args.lang,
@@ -68,7 +109,16 @@ class Processor:
         """
         analyzer = self._init_presidio()
         print(f". Recognizers available in Presidio (lang={self.args.lang})")
-        for rec in sorted(analyzer.get_recognizers(), key=attrgetter("name")):
+        self._print_recognizers(analyzer.get_recognizers())
+
+        pruned = pruned_recognizers(analyzer)
+        if pruned is not None:
+            print(f"\n. Recognizers pruned (no entity used in the PII list): {len(pruned)}")
+            self._print_recognizers(pruned)
+
+
+    def _print_recognizers(self, recognizers: Iterable):
+        for rec in sorted(recognizers, key=attrgetter("name")):
             rtype = "remote" if isinstance(rec, RemoteRecognizer) else \
                     "pattern" if isinstance(rec, PatternRecognizer) else \
                     "local"
@@ -90,34 +140,39 @@ class Processor:
             print("  ", ent)
 
 
-    def proc_pii_entities(self, out: TextIO):
+    def _build_tasks(self) -> Iterable[BasePiiTask]:
         """
-        Print entity recognizers in presidio
+        Build the task objects defined via the plugin
         """
-        config = load_presidio_plugin_config(self.args.config)
-
-        # Get the Presidio task descriptor
-        tc = PresidioTaskCollector(config, languages=self.args.lang,
-                                   debug=self.debug)
-        raw_tdesc = tc.gather_tasks()
+        return build_plugin_tasks(self.args.config, self.args.lang,
+                                  self.debug)
 
-        # Ensure it is normalized
-        reformat = RawTaskDefaults()
-        tdesc = reformat(raw_tdesc)
 
-        print(f". PII entities defined from Presidio (lang={self.args.lang})")
-        for td in tdesc:
-            # Create the task definition (inc. pii demultiplexing)
-            tdef = parse_task_descriptor(td)
-
-            # Filter by language
-            if self.args.lang:
-                lset = set(self.args.lang)
-                tdef["piid"] = filter_piid(tdef["piid"], lang=lset)
+    def _read_chunks(self, filename: str) -> List[DocumentChunk]:
+        """
+        Read a file with document chunks to process: either a JSONL file
+        (one chunk dict per line) or a plain text file (one chunk per
+        paragraph)
+        """
+        lang = self.args.lang[0] if self.args.lang and len(self.args.lang) == 1 else None
+        ctx = {"lang": lang} if lang else None
+        with open(filename, encoding="utf-8") as f:
+            if filename.endswith((".jsonl", ".ndjson")):
+                chunks = [json.loads(line) for line in f if line.strip()]
+                return [DocumentChunk(c["id"], c["data"],
+                                      c.get("context", ctx))
+                        for c in chunks]
+            paragraphs = re.split(r"\n\s*\n", f.read())
+            return [DocumentChunk(n, p, ctx)
+                    for n, p in enumerate(paragraphs) if p.strip()]
 
-            # Build the task
-            task = build_task(tdef)
 
+    def proc_pii_entities(self, out: TextIO):
+        """
+        Print entity recognizers in presidio
+        """
+        print(f". PII entities defined from Presidio (lang={self.args.lang})")
+        for task in self._build_tasks():
             # Now traverse the pii_info list
             for t in task.pii_info:
                 nam = f"{t.pii.name}, {t.subtype}" if t.subtype else t.pii.name
@@ -125,6 +180,73 @@ class Processor:
                 print(f"  {nam:40} {t.lang:5} {method}")
 
 
+    def proc_profile(self, out: TextIO):
+        """
+        Profile the Presidio task over a sample file, and report the time
+        spent in each processing stage
+        """
+        task = next(self._build_tasks())
+        chunks = self._read_chunks(self.args.infile)
+        if not self.args.cold:
+            task.warmup()
+
+        def detect(chunk: DocumentChunk):
+            for _ in task.find(chunk):
+                pass
+
+        kwargs = {"interval": self.args.interval} \
+            if self.args.profiler == "sampling" else {}
+        prof = profile_run(detect, chunks * self.args.repeat,
+                           self.args.profiler, **kwargs)
+
+        total = sum(prof.stages.values()) or 1
+        print(f". Profile ({self.args.profiler}): {len(chunks)} chunks x {self.args.repeat}, {prof.elapsed:.3f} s", file=out)
+        for stage, elapsed in stage_report(prof).items():
+            print(f"  {stage:40} {elapsed:9.4f} s  {100*elapsed/total:5.1f}%",
+                  file=out)
+
+        if self.args.collapsed:
+            with open(self.args.collapsed, "w", encoding="utf-8") as f:
+                prof.write_collapsed(f)
+            print(f". Collapsed stacks written to {self.args.collapsed}",
+                  file=out)
+
+
+    def proc_memory(self, out: TextIO):
+        """
+        Report the memory footprint of the analyzer engine for each model,
+        and its growth while analyzing a sample corpus, as JSON
+        """
+        config = load_presidio_plugin_config(self.args.config)
+        langs = self.args.lang or sorted(presidio_languages(config))
+        chunks = self._read_chunks(self.args.sample) if self.args.sample \
+            else sample_chunks(langs)
+        report = memory_report(config, langs, chunks, self.args.repeat,
+                               heap=not self.args.no_heap)
+        report = {"version": VERSION, "presidio": presidio_version(),
+                  "languages": langs, **report}
+        with open(self.args.outfile, "w", encoding="utf-8") \
+                if self.args.outfile else nullcontext(out) as f:
+            json.dump(report, f, indent=2)
+            print(file=f)
+
+
+    def proc_detect_file(self, out: TextIO):
+        """
+        Perform PII detection over a plain text file, and write the detected
+        PII entities as JSON lines
+        """
+        task = next(self._build_tasks())
+        lang = self.args.lang[0] if self.args.lang and len(self.args.lang) == 1 else None
+        pii_list = task.find_file(self.args.infile, lang=lang,
+                                  max_size=self.args.chunk_size,
+                                  mode=self.args.chunk_mode)
+        with open(self.args.outfile, "w", encoding="utf-8") \
+                if self.args.outfile else nullcontext(out) as f:
+            for pii in pii_list:
+                print(json.dumps(pii.asdict(), ensure_ascii=False), file=f)
+
+
 
 def parse_args(args: List[str]) -> argparse.Namespace:
     parser = argparse.ArgumentParser(
@@ -154,6 +276,8 @@ def parse_args(args: List[str]) -> argparse.Namespace:
                             help='information about recognizers available in presidio',
                             parents=[opt_com1, opt_com3])
     subp1.add_argument("--entities", action="store_true")
+    subp1.add_argument("--prune", action="store_true",
+                       help="prune recognizers for entities not in the PII list, and show the ones removed")
 
     subp1 = subp.add_parser('presidio-entities',
                             help='information about entities defined in presidio',
@@ -163,6 +287,44 @@ def parse_args(args: List[str]) -> argparse.Namespace:
                             help='information about PII tasks defined via Presidio',
                             parents=[opt_com1, opt_com3])
 
+    subp1 = subp.add_parser('profile',
+                            help='profile detection over a sample file, split by processing stage',
+                            parents=[opt_com1, opt_com3])
+    subp1.add_argument("infile",
+                       help="sample file: plain text, or JSONL with chunks")
+    subp1.add_argument("--profiler", choices=list(PROFILERS),
+                       default="sampling", help="profiler type")
+    subp1.add_argument("--interval", type=float, default=0.001,
+                       help="sampling interval in seconds (default: %(default)s)")
+    subp1.add_argument("--repeat", type=int, default=1,
+                       help="number of passes over the sample file")
+    subp1.add_argument("--cold", action="store_true",
+                       help="do not warm up the engine before profiling")
+    subp1.add_argument("--collapsed", metavar="FILENAME",
+                       help="write collapsed stacks (flamegraph format) to a file")
+
+    subp1 = subp.add_parser('memory',
+                            help='report memory used by each model/engine, as JSON',
+                            parents=[opt_com1, opt_com3])
+    subp1.add_argument("--sample",
+                       help="sample corpus to analyze: plain text, or JSONL with chunks (default: a short text per language)")
+    subp1.add_argument("--repeat", type=int, default=3,
+                       help="number of steady-state passes over the sample corpus (default: %(default)s)")
+    subp1.add_argument("--no-heap", action="store_true",
+                       help="do not measure the Python heap (faster model loading)")
+    subp1.add_argument("--outfile", help="output JSON file (default: stdout)")
+
+    subp1 = subp.add_parser('detect-file',
+                            help='detect PII in a plain text file (of any size)',
+                            parents=[opt_com1, opt_com3])
+    subp1.add_argument("infile", help="text file to process")
+    subp1.add_argument("outfile", nargs="?",
+                       help="output JSONL file (default: stdout)")
+    subp1.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                       help="maximum chunk size in bytes (default: %(default)s)")
+    subp1.add_argument("--chunk-mode", choices=("paragraph", "size"),
+                       default="paragraph", help="chunking mode")
+
     parsed = parser.parse_args(args)
     if not parsed.cmd:
         parser.print_usage()
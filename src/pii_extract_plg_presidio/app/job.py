@@ -0,0 +1,373 @@
+"""
+Command-line script to run resumable, sharded PII detection jobs over large
+corpora of document chunks
+
+The input corpus is a list of JSONL files, each line containing a chunk
+(a dict with `id`, `data` and optionally `context` fields). Records are
+numbered in order across all files, and grouped into segments of
+consecutive records; segment `k` belongs to shard `k % num_shards`.
+Each segment is processed in batches, and its output is written atomically
+(to a temporary file that is then renamed), so that a finished segment is
+never processed again when the job is restarted.
+
+Segment output is written either as JSON lines (one PII entity per line)
+or in the compact binary format of `task.serial` (one batch per detection
+batch).
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+from typing import Dict, List, Iterable, Tuple, Callable
+
+from pii_data.helper.exception import ProcException
+from pii_data.types.doc import DocumentChunk
+from pii_extract.build.task import BasePiiTask
+
+from .. import VERSION
+from ..task.serial import BatchWriter
+from .info import build_plugin_tasks
+
+
+MANIFEST = "job.json"
+SEGMENT_DIR = "segments"
+
+# Output formats, with their file extension
+OUTPUT_FORMATS = {"jsonl": "jsonl", "binary": "piib"}
+
+
+def _atomic_write_json(filename: Path, data: Dict):
+    """
+    Write a JSON file atomically
+    """
+    tmp = filename.with_name(f"{filename.name}.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+        f.write("\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, filename)
+
+
+def count_records(filename: str) -> int:
+    """
+    Count the records (non-empty lines) in a JSONL file
+    """
+    with open(filename, "rb") as f:
+        return sum(1 for line in f if line.strip())
+
+
+def read_records(inputs: List[str],
+                 wanted: Callable[[int], bool]) -> Iterable[Tuple[int, bytes]]:
+    """
+    Read the records in a list of JSONL files, returning only the ones whose
+    global index is wanted (the rest are skipped without being parsed)
+    """
+    index = 0
+    for name in inputs:
+        with open(name, "rb") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                if wanted(index):
+                    yield index, line
+                index += 1
+
+
+def fmt_time(secs: float) -> str:
+    secs = int(secs)
+    return f"{secs // 3600}:{secs // 60 % 60:02d}:{secs % 60:02d}"
+
+
+class ShardJob:
+    """
+    Process one shard of a detection job
+    """
+
+    def __init__(self, inputs: List[str], outdir: str, shard: int = 0,
+                 num_shards: int = 1, segment_size: int = 10000,
+                 batch_size: int = 64, lang: str = None,
+                 report_interval: float = 30, report: Callable = None,
+                 output_format: str = "jsonl"):
+        """
+          :param inputs: the input JSONL files
+          :param outdir: the output directory
+          :param shard: the shard to process (from 0 to `num_shards` - 1)
+          :param num_shards: the total number of shards
+          :param segment_size: number of records in each segment
+          :param batch_size: number of chunks sent to the task at once
+          :param lang: default language for chunks without one
+          :param report_interval: seconds between progress reports
+          :param report: function to call with progress report lines
+          :param output_format: format for the output segments, `jsonl` or
+             `binary`
+        """
+        if not 0 <= shard < num_shards:
+            raise ProcException("invalid shard {} for {} shards", shard,
+                                num_shards)
+        if output_format not in OUTPUT_FORMATS:
+            raise ProcException("invalid output format: {}", output_format)
+        self.inputs = list(inputs)
+        self.outdir = Path(outdir)
+        self.shard = shard
+        self.num_shards = num_shards
+        self.segment_size = segment_size
+        self.batch_size = batch_size
+        self.lang = lang
+        self.report_interval = report_interval
+        self.report = report or (lambda msg: print(msg, file=sys.stderr))
+        self.output_format = output_format
+        self.checkpoint = self.outdir / f"shard-{shard:04d}-of-{num_shards:04d}.json"
+
+        (self.outdir / SEGMENT_DIR).mkdir(parents=True, exist_ok=True)
+        self.total_records = self._manifest()
+
+
+    def __repr__(self) -> str:
+        return f"<ShardJob {self.shard}/{self.num_shards}>"
+
+
+    def _manifest(self) -> int:
+        """
+        Create the job manifest, or check that the job parameters & inputs
+        are the same as those of the existing one
+          :return: the total number of records in the input
+        """
+        inputs = [{"name": os.path.abspath(n), "size": os.stat(n).st_size}
+                  for n in self.inputs]
+        params = {"inputs": inputs, "num_shards": self.num_shards,
+                  "segment_size": self.segment_size}
+        if self.output_format != "jsonl":
+            params["output_format"] = self.output_format
+        name = self.outdir / MANIFEST
+        if name.exists():
+            with open(name, encoding="utf-8") as f:
+                manifest = json.load(f)
+            keys = set(params) | {"output_format"}
+            if {k: manifest.get(k) for k in keys if k in manifest} != params:
+                raise ProcException("job parameters or inputs differ from the ones in {}", name)
+        else:
+            manifest = dict(params, version=VERSION,
+                            records=sum(count_records(n) for n in self.inputs))
+            _atomic_write_json(name, manifest)
+        return manifest["records"]
+
+
+    def segment_file(self, segment: int) -> Path:
+        ext = OUTPUT_FORMATS[self.output_format]
+        return self.outdir / SEGMENT_DIR / f"segment-{segment:08d}.{ext}"
+
+
+    def segments(self) -> List[int]:
+        """
+        Return the list of segments belonging to this shard
+        """
+        num = -(-self.total_records // self.segment_size)
+        return list(range(self.shard, num, self.num_shards))
+
+
+    def _segment_records(self, segment: int) -> int:
+        start = segment*self.segment_size
+        return min(self.segment_size, self.total_records - start)
+
+
+    def _load_checkpoint(self) -> Dict:
+        """
+        Load the shard checkpoint. Segments with an output file are also
+        considered done (the checkpoint is written after the output file)
+        """
+        state = {"chunks": 0, "entities": 0, "elapsed": 0}
+        if self.checkpoint.exists():
+            with open(self.checkpoint, encoding="utf-8") as f:
+                state.update(json.load(f))
+        done = {s for s in self.segments() if self.segment_file(s).exists()}
+        state["chunks"] = sum(self._segment_records(s) for s in done)
+        state["segments"] = sorted(done)
+        return state
+
+
+    def _chunks(self, lines: List[bytes]) -> List[DocumentChunk]:
+        chunks = []
+        for line in lines:
+            c = json.loads(line)
+            ctx = c.get("context") or ({"lang": self.lang} if self.lang else None)
+            chunks.append(DocumentChunk(c["id"], c["data"], ctx))
+        return chunks
+
+
+    def _write_segment(self, task: BasePiiTask, segment: int,
+                       lines: List[bytes]) -> int:
+        """
+        Process a segment and write its output atomically
+          :return: the number of detected PII entities
+        """
+        name = self.segment_file(segment)
+        tmp = name.with_name(name.name + ".tmp")
+        binary = self.output_format == "binary"
+        num = 0
+        try:
+            with open(tmp, "wb" if binary else "w",
+                      encoding=None if binary else "utf-8") as out:
+                writer = BatchWriter(out) if binary else None
+                for n in range(0, len(lines), self.batch_size):
+                    chunks = self._chunks(lines[n:n+self.batch_size])
+                    results = task.find_batch(chunks)
+                    if binary:
+                        num += writer.write(pii for pii_list in results
+                                            for pii in pii_list)
+                        continue
+                    for pii_list in results:
+                        for pii in pii_list:
+                            print(json.dumps(pii.asdict(), ensure_ascii=False),
+                                  file=out)
+                            num += 1
+                out.flush()
+                os.fsync(out.fileno())
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+        os.replace(tmp, name)
+        return num
+
+
+    def _progress(self, state: Dict, total: int, start: float,
+                  chunks0: int) -> Dict:
+        """
+        Compute progress statistics for the shard
+        """
+        elapsed = time.monotonic() - start
+        rate = (state["chunks"] - chunks0)/elapsed if elapsed > 0 else 0
+        remaining = total - state["chunks"]
+        return {"total": total,
+                "throughput": rate,
+                "eta": remaining/rate if rate > 0 else None}
+
+
+    def run(self, task: BasePiiTask) -> Dict:
+        """
+        Process all pending segments in the shard
+          :param task: the detection task (it must have a `find_batch()`
+             method)
+          :return: the final shard state
+        """
+        segments = self.segments()
+        total = sum(self._segment_records(s) for s in segments)
+        state = self._load_checkpoint()
+        done = set(state["segments"])
+        pending = {s for s in segments if s not in done}
+        self.report(f". shard {self.shard}/{self.num_shards}: {len(segments)} segments ({total} chunks), {len(pending)} pending")
+
+        start = time.monotonic()
+        chunks0 = state["chunks"]
+        elapsed0 = state["elapsed"]
+        last_report = start
+
+        def flush_segment(segment: int, lines: List[bytes]):
+            nonlocal last_report
+            state["entities"] += self._write_segment(task, segment, lines)
+            state["chunks"] += len(lines)
+            done.add(segment)
+            state["segments"] = sorted(done)
+            state["elapsed"] = elapsed0 + time.monotonic() - start
+            state.update(self._progress(state, total, start, chunks0))
+            _atomic_write_json(self.checkpoint, state)
+
+            now = time.monotonic()
+            if now - last_report >= self.report_interval or not pending - done:
+                last_report = now
+                eta = fmt_time(state["eta"]) if state["eta"] is not None else "-"
+                self.report(f". shard {self.shard}/{self.num_shards}: {state['chunks']}/{total} chunks ({100*state['chunks']/(total or 1):.1f}%), {state['throughput']:.1f} chunks/s, ETA {eta}")
+
+        def wanted(index: int) -> bool:
+            return index // self.segment_size in pending
+
+        # Read the records of pending segments, & process them by segment
+        current, lines = None, []
+        for index, line in read_records(self.inputs, wanted):
+            segment = index // self.segment_size
+            if segment != current and lines:
+                flush_segment(current, lines)
+                lines = []
+            current = segment
+            lines.append(line)
+        if lines:
+            flush_segment(current, lines)
+
+        state["elapsed"] = elapsed0 + time.monotonic() - start
+        state.update(self._progress(state, total, start, chunks0))
+        state["finished"] = len(done) == len(segments)
+        _atomic_write_json(self.checkpoint, state)
+        return state
+
+
+# --------------------------------------------------------------------------
+
+
+def parse_args(args: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=f"Run a resumable, sharded Presidio PII detection job (version {VERSION})")
+
+    parser.add_argument("inputs", nargs="+",
+                        help="input JSONL files, with one document chunk per line")
+    parser.add_argument("--outdir", required=True, help="output directory")
+
+    c1 = parser.add_argument_group('Sharding options')
+    c1.add_argument("--shard", type=int, default=0,
+                    help="shard to process (default: %(default)s)")
+    c1.add_argument("--num-shards", type=int, default=1,
+                    help="total number of shards (default: %(default)s)")
+    c1.add_argument("--segment-size", type=int, default=10000,
+                    help="records per output segment (default: %(default)s)")
+    c1.add_argument("--batch-size", type=int, default=64,
+                    help="chunks per detection batch (default: %(default)s)")
+    c1.add_argument("--output-format", choices=list(OUTPUT_FORMATS),
+                    default="jsonl",
+                    help="format of the output segments (default: %(default)s)")
+
+    c2 = parser.add_argument_group('Configuration options')
+    c2.add_argument("--config", nargs="+",
+                    help="add PIISA configuration file(s)")
+    c2.add_argument("--lang", nargs='+', help="language(s) to select")
+
+    c3 = parser.add_argument_group("Other")
+    c3.add_argument("--report-interval", type=float, default=30,
+                    help="seconds between progress reports (default: %(default)s)")
+    c3.add_argument("--debug", action="store_true", help="debug mode")
+    c3.add_argument('--reraise', action='store_true',
+                    help='re-raise exceptions on errors')
+
+    return parser.parse_args(args)
+
+
+def main(args: List[str] = None):
+    if args is None:
+        args = sys.argv[1:]
+    args = parse_args(args)
+
+    try:
+        lang = args.lang[0] if args.lang and len(args.lang) == 1 else None
+        job = ShardJob(args.inputs, args.outdir, args.shard, args.num_shards,
+                       segment_size=args.segment_size,
+                       batch_size=args.batch_size, lang=lang,
+                       report_interval=args.report_interval,
+                       output_format=args.output_format)
+        task = next(build_plugin_tasks(args.config, args.lang, args.debug))
+        state = job.run(task)
+        print(f". shard {args.shard}/{args.num_shards}: {state['chunks']} chunks, {state['entities']} PII entities, {fmt_time(state['elapsed'])}",
+              file=sys.stderr)
+    except KeyboardInterrupt:
+        sys.exit(130)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        if args.reraise:
+            raise
+        else:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Memory utilities: measure the memory footprint of the analyzer engines
+(one per configured model) and its growth while analyzing a sample corpus
+"""
+
+import gc
+import time
+import tracemalloc
+
+from typing import Dict, List, Callable, Tuple, Any
+
+from pii_data.types.doc import DocumentChunk
+
+from .. import defs
+from ..task.analyzer import presidio_analyzer
+from ..task.utils import current_rss
+
+
+# Per-measurement heap peaks need tracemalloc.reset_peak() (Python 3.9+)
+HEAP_PEAK = hasattr(tracemalloc, "reset_peak")
+
+
+class MemoryProbe:
+    """
+    Measure the memory growth caused by a function: process RSS, and
+    (optionally) Python heap, as traced by tracemalloc (plus the heap peak,
+    in Python 3.9+)
+    """
+
+    def __init__(self, heap: bool = True):
+        self.heap = heap
+        self._started = heap and not tracemalloc.is_tracing()
+        if self._started:
+            tracemalloc.start()
+
+
+    def close(self):
+        if self._started:
+            tracemalloc.stop()
+
+
+    def snapshot(self) -> Dict[str, int]:
+        gc.collect()
+        out = {"rss": current_rss()}
+        if self.heap:
+            out["heap"] = tracemalloc.get_traced_memory()[0]
+        return out
+
+
+    def measure(self, func: Callable) -> Tuple[Any, Dict]:
+        """
+        Call a function, and measure the memory growth
+          :return: a tuple (function result, measurement dict)
+        """
+        before = self.snapshot()
+        if self.heap and HEAP_PEAK:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        after = self.snapshot()
+        out = {"elapsed": round(elapsed, 4),
+               "rss": after["rss"],
+               "rss_delta": after["rss"] - before["rss"]}
+        if self.heap:
+            out["heap_delta"] = after["heap"] - before["heap"]
+            if HEAP_PEAK:
+                out["heap_peak"] = tracemalloc.get_traced_memory()[1] - before["heap"]
+        return result, out
+
+
+def _model_name(config: Dict, lang: str) -> str:
+    models = config.get(defs.CFG_ENGINE, {}).get("models", [])
+    return next((str(m["model_name"]) for m in models
+                 if m["lang_code"] == lang), None)
+
+
+def memory_report(config: Dict, languages: List[str],
+                  chunks: List[DocumentChunk], repeat: int = 3,
+                  heap: bool = True) -> Dict:
+    """
+    Build the analyzer engines one language (i.e. one model) at a time, and
+    measure the memory growth for each one; then analyze a sample corpus
+    and measure the growth in the first pass (which includes lazy
+    initializations) and in the following ones (steady state)
+      :param config: the plugin config
+      :param languages: the languages to build engines for
+      :param chunks: the sample corpus (chunks must have a language)
+      :param repeat: number of passes over the sample corpus after the first
+      :param heap: measure also Python heap (slower)
+    """
+    probe = MemoryProbe(heap)
+    try:
+        report = {"baseline": probe.snapshot(), "models": []}
+
+        # Build an engine for each language
+        engines = {}
+        for lang in languages:
+            engine, mem = probe.measure(
+                lambda: presidio_analyzer(config, languages=[lang]))
+            registry = getattr(engine, "registry", None)
+            mem.update(lang=lang, model=_model_name(config, lang),
+                       recognizers=len(registry.recognizers) if registry else None)
+            report["models"].append(mem)
+            engines[lang] = engine
+
+        # Analyze the sample corpus
+        sample = [(c.data, c.context["lang"]) for c in chunks
+                  if (c.context or {}).get("lang") in engines]
+
+        def analyze(passes: int):
+            for _ in range(passes):
+                for text, lang in sample:
+                    engines[lang].analyze(text=text, language=lang)
+
+        _, mem = probe.measure(lambda: analyze(1))
+        mem.update(chunks=len(sample), skipped=len(chunks) - len(sample))
+        report["first_pass"] = mem
+        _, mem = probe.measure(lambda: analyze(repeat))
+        mem.update(passes=repeat)
+        report["steady_state"] = mem
+
+        final = probe.snapshot()
+        report["total"] = {"rss": final["rss"]}
+        for k in final:
+            report["total"][k + "_delta"] = final[k] - report["baseline"][k]
+        return report
+    finally:
+        probe.close()
+
+
+def sample_chunks(languages: List[str]) -> List[DocumentChunk]:
+    """
+    Build a default sample corpus, with the warm-up text for each language
+    """
+    return [DocumentChunk(lang, defs.WARMUP_TEXT.get(lang, defs.WARMUP_TEXT["en"]),
+                          {"lang": lang})
+            for lang in languages]
@@ -0,0 +1,258 @@
+"""
+Profiling utilities: run a detection task under a profiler, and split the
+elapsed time into processing stages
+"""
+
+import sys
+import time
+import cProfile
+import pstats
+import threading
+from pathlib import Path
+from collections import Counter
+
+from types import FrameType
+from typing import Dict, Iterable, Tuple, TextIO, Callable
+
+from pii_data.helper.exception import InvArgException
+
+
+# Processing stages
+STAGE_PLUGIN = "plugin"
+STAGE_SPACY = "spacy"
+STAGE_NLP = "nlp-engine"
+STAGE_RECOGNIZER = "recognizer"
+STAGE_CONTEXT = "context-enhancer"
+STAGE_PRESIDIO = "presidio"
+STAGE_OTHER = "other"
+
+# Package path fragments used to classify code
+_PKG_SPACY = ("/spacy/", "/thinc/")
+_PKG_PRESIDIO = "/presidio_analyzer/"
+_PKG_PLUGIN = "/pii_extract_plg_presidio/"
+_PKG_APP = "/pii_extract_plg_presidio/app/"
+
+# spaCy functions that run the tokenizer
+_SPACY_TOKENIZER = ("make_doc", "_ensure_doc")
+
+# Presidio functions that perform context enhancement
+_CONTEXT_FUNCS = ("enhance_using_context", "_enhance_using_context")
+
+
+def _path(filename: str) -> str:
+    return filename.replace("\\", "/")
+
+
+def _file_stage(filename: str) -> str:
+    """
+    Classify a source file into a processing stage
+    """
+    filename = _path(filename)
+    if any(p in filename for p in _PKG_SPACY):
+        return STAGE_SPACY
+    elif _PKG_PRESIDIO in filename:
+        if "/context_aware_enhancers/" in filename:
+            return STAGE_CONTEXT
+        elif "/nlp_engine/" in filename:
+            return STAGE_NLP
+        elif "/predefined_recognizers/" in filename:
+            return STAGE_RECOGNIZER + ":" + Path(filename).stem
+        elif filename.endswith(("pattern_recognizer.py", "pattern.py")):
+            return STAGE_RECOGNIZER + ":pattern"
+        return STAGE_PRESIDIO
+    elif _PKG_PLUGIN in filename and _PKG_APP not in filename:
+        return STAGE_PLUGIN
+    return STAGE_OTHER
+
+
+def frame_stage(frame: FrameType) -> str:
+    """
+    Classify a running stack into a processing stage, by walking from the
+    innermost frame outwards. Recognizers are identified by the object whose
+    `analyze()` method is being executed, and spaCy components by the name
+    of the pipeline component being applied
+    """
+    fallback = STAGE_OTHER
+    in_spacy = False
+    while frame is not None:
+        code = frame.f_code
+        stage = _file_stage(code.co_filename)
+        if stage == STAGE_SPACY:
+            if code.co_name in _SPACY_TOKENIZER:
+                return STAGE_SPACY + ":tokenizer"
+            elif code.co_name == "__call__" and "proc" in frame.f_locals:
+                return STAGE_SPACY + ":" + str(frame.f_locals.get("name"))
+            in_spacy = True
+        elif in_spacy:
+            return STAGE_SPACY
+        elif code.co_name in _CONTEXT_FUNCS:
+            return STAGE_CONTEXT
+        elif stage == STAGE_PRESIDIO or stage.startswith(STAGE_RECOGNIZER):
+            # Generic Presidio code: find out if it's running in a recognizer
+            obj = frame.f_locals.get("self")
+            if code.co_name == "analyze" and hasattr(obj, "supported_entities"):
+                return STAGE_RECOGNIZER + ":" + obj.name
+            if fallback == STAGE_OTHER:
+                fallback = stage
+        elif stage != STAGE_OTHER:
+            return stage if fallback == STAGE_OTHER else fallback
+        frame = frame.f_back
+    return fallback
+
+
+def frame_stack(frame: FrameType) -> Tuple[str, ...]:
+    """
+    Return the stack for a frame, as a tuple of function names (outermost
+    first)
+    """
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        module = frame.f_globals.get("__name__", "?")
+        stack.append(f"{module}:{code.co_name}")
+        frame = frame.f_back
+    return tuple(reversed(stack))
+
+
+# ----------------------------------------------------------------------
+
+
+class SamplingProfiler:
+    """
+    A statistical profiler: samples the stack of a thread at fixed intervals
+    """
+
+    def __init__(self, interval: float = 0.001):
+        """
+          :param interval: sampling interval, in seconds
+        """
+        self.interval = interval
+        self.stages = Counter()
+        self.stacks = Counter()
+        self.elapsed = 0
+        self._thread = None
+
+
+    def _sample(self, target: int, stop: threading.Event):
+        last = time.perf_counter()
+        while not stop.wait(self.interval):
+            now = time.perf_counter()
+            frame = sys._current_frames().get(target)
+            if frame is not None:
+                self.stages[frame_stage(frame)] += now - last
+                self.stacks[frame_stack(frame)] += 1
+            last = now
+
+
+    def __enter__(self) -> "SamplingProfiler":
+        # Make the interpreter switch threads often enough for the sampling
+        self._switch = sys.getswitchinterval()
+        sys.setswitchinterval(min(self._switch, self.interval/4))
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True,
+                                        args=(threading.get_ident(),
+                                              self._stop))
+        self._start = time.perf_counter()
+        self._thread.start()
+        return self
+
+
+    def __exit__(self, *args):
+        self._stop.set()
+        self._thread.join()
+        self.elapsed = time.perf_counter() - self._start
+        sys.setswitchinterval(self._switch)
+
+
+    def write_collapsed(self, out: TextIO):
+        """
+        Write the sampled stacks in collapsed (flamegraph-compatible) format
+        """
+        for stack, count in sorted(self.stacks.items()):
+            print(";".join(stack), count, file=out)
+
+
+
+class DeterministicProfiler:
+    """
+    A deterministic profiler, using cProfile. Stages are assigned according to
+    the source file of each function, hence it can't separate recognizers
+    that share code (e.g. all pattern recognizers)
+    """
+
+    def __init__(self):
+        self.stages = Counter()
+        self.elapsed = 0
+
+
+    def __enter__(self) -> "DeterministicProfiler":
+        self._prof = cProfile.Profile()
+        self._start = time.perf_counter()
+        self._prof.enable()
+        return self
+
+
+    def __exit__(self, *args):
+        self._prof.disable()
+        self.elapsed = time.perf_counter() - self._start
+        stats = pstats.Stats(self._prof).stats
+        stage = {}
+
+        def resolve(func: Tuple, visiting: set) -> str:
+            # Functions with no stage of their own (builtins, standard library)
+            # take the stage of their main caller
+            if func not in stage:
+                st = _file_stage(func[0])
+                callers = stats.get(func, (0, 0, 0, 0, {}))[4]
+                if st == STAGE_OTHER and callers and func not in visiting:
+                    visiting.add(func)
+                    main = max(callers, key=lambda c: callers[c][3])
+                    st = resolve(main, visiting)
+                stage[func] = st
+            return stage[func]
+
+        for func, (_, _, tottime, _, callers) in stats.items():
+            if _file_stage(func[0]) != STAGE_OTHER or not callers:
+                self.stages[resolve(func, set())] += tottime
+            else:
+                # Split the time according to the calling functions
+                for caller, (_, _, tt, _) in callers.items():
+                    self.stages[resolve(caller, set())] += tt
+
+
+    def write_collapsed(self, out: TextIO):
+        raise InvArgException("collapsed stacks need the sampling profiler")
+
+
+# ----------------------------------------------------------------------
+
+PROFILERS = {
+    "sampling": SamplingProfiler,
+    "deterministic": DeterministicProfiler
+}
+
+
+def profile_run(func: Callable, data: Iterable, profiler: str = "sampling",
+                **kwargs):
+    """
+    Run a function over a data iterable under a profiler
+     :param func: the function to execute for each data element
+     :param data: the data elements
+     :param profiler: profiler type
+     :return: the profiler object, containing the results
+    """
+    try:
+        prof = PROFILERS[profiler](**kwargs)
+    except KeyError:
+        raise InvArgException("unknown profiler: {}", profiler)
+    with prof:
+        for elem in data:
+            func(elem)
+    return prof
+
+
+def stage_report(prof) -> Dict[str, float]:
+    """
+    Return the time spent in each processing stage, in decreasing order
+    """
+    return dict(sorted(prof.stages.items(), key=lambda e: -e[1]))
@@ -8,7 +8,31 @@ CFG_ENGINE = "nlp_config"
 CFG_REUSE = "reuse_engine"
 CFG_PARAMS = "analyzer_params"
 CFG_MAP = "pii_list"
+CFG_DAEMON = "daemon"
+CFG_CASCADE = "cascade"
+CFG_PARALLEL = "parallel_load"
+CFG_PRUNE = "prune_recognizers"
+CFG_RECYCLE = "recycle"
+
+# Block in configuration containing task settings
+CFG_TASK = "task_config"
+# Elements in task settings
+CFG_OVERLAP = "overlap"
+CFG_COALESCE = "coalesce"
+CFG_TRACING = "tracing"
+CFG_LANGID = "langid"
+CFG_PRESCREEN = "prescreen"
+
+# Field in the document chunk context with a PII filter for the chunk
+CTX_FILTER = "pii_filter"
 
 # Default values for task info
 TASK_SOURCE = "piisa:pii-extract-plg-presidio"
 TASK_DESCRIPTION = "Presidio-based PII tasks for some languages and countries"
+
+# Dummy texts used to warm up the analyzer engines, by language
+WARMUP_TEXT = {
+    "en": "John Smith lives in London, he is British. His passport number is 912803456 and his driver license is A1234567.",
+    "es": "Juan García vive en Madrid y es español. Su pasaporte es el 12345678A.",
+    "it": "Mario Rossi abita a Roma ed è italiano. Il suo codice fiscale è RSSMRA85T10A562S e la carta d'identità CA00000AA."
+}
@@ -14,7 +14,8 @@ from . import VERSION, defs
 from .task import PresidioTaskCollector
 
 # Elements in the PIISA presidio config to read
-CFG_ELEM = defs.CFG_REUSE, defs.CFG_ENGINE, defs.CFG_PARAMS, defs.CFG_MAP
+CFG_ELEM = defs.CFG_REUSE, defs.CFG_ENGINE, defs.CFG_PARAMS, defs.CFG_MAP, \
+    defs.CFG_TASK
 
 
 def load_presidio_plugin_config(config: Union[Dict, str] = None) -> Dict:
@@ -72,3 +73,19 @@ class PiiExtractPluginLoader:
         Return an iterable of task definitions
         """
         yield from self.obj.gather_tasks(lang)
+
+
+    def warmup(self, lang: str = None) -> Dict[str, float]:
+        """
+        Build & warm up the Presidio analyzer engine, so that tasks created
+        afterwards are ready for use
+          :return: a dict with the warm-up time (in seconds) for each language
+        """
+        return self.obj.warmup(lang)
+
+
+    def ready(self, lang: str = None) -> bool:
+        """
+        Check if the Presidio analyzer engine has been built & warmed up
+        """
+        return self.obj.ready(lang)
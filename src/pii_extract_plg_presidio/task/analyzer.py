@@ -2,46 +2,308 @@
 Create a Presidio analyzer engine
 """
 
+import time
+import json
+import hashlib
+import threading
+import contextvars
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from weakref import WeakKeyDictionary
 
-from typing import Dict, Iterable
+from typing import Dict, Iterable, Tuple, Set, Optional, List
 
+from pii_data.helper.exception import ProcException, ConfigException
 from pii_extract.helper.logger import PiiLogger
 
-from presidio_analyzer.nlp_engine import NlpEngineProvider
+from presidio_analyzer.nlp_engine import NlpEngineProvider, NlpEngine
 from presidio_analyzer import AnalyzerEngine
 
 from .. import defs
 from .utils import presidio_languages
+from .context import IndexedContextEnhancer, context_enhancer
+from .registry import used_entities, entities_key, pruned_registry
+from .recycle import EngineRecycler
+from . import tracing
 
 
 # Cache for engine reuse
 ENGINE_CACHE = {}
 
+# Locks for the engine cache, and for the engine build of each cache key
+_CACHE_LOCK = threading.Lock()
+_BUILD_LOCKS = {}
 
-def presidio_analyzer(config: Dict, languages: Iterable[str] = None,
-                      logger: PiiLogger = None) -> AnalyzerEngine:
+# Languages for which each engine has been warmed up
+WARM_ENGINES = WeakKeyDictionary()
+
+# Recognizers removed from each engine with a pruned registry
+PRUNED_RECOGNIZERS = WeakKeyDictionary()
+
+# Recyclers for the cached engines, by cache key
+RECYCLERS = {}
+
+
+def _nlp_config(config: Dict,
+                languages: Iterable[str] = None) -> Tuple[Set[str], Dict]:
     """
-    Create a Presidio AnalyzerEngine object.
-    Will reuse an object with the same configuration if it's in the cache
-    and `reuse_engine` in the config is True (which is its default value)
-     :param config: the plugin config
-     :param languages: restrict languages loaded in the analyzer to this list
-     :param logger: a logger instance
+    Compute the language set & the Presidio NLP configuration to use
     """
-    # Fetch NLP engine configuration
     langset = presidio_languages(config)
-    #print("ANALYZER", langset, "&", languages, config)
     if languages:
         langset = langset.intersection(languages)
     config = config.get(defs.CFG_ENGINE)
 
-    # Prepare a configuration for the Presidio Analyzer
     # Keep only the language models we'll use
     nlp_config = {
         "nlp_engine_name": config.get("nlp_engine_name"),
         "models": [m for m in config.get("models")
                    if not langset or m["lang_code"] in langset]
     }
+    return langset, nlp_config
+
+
+def _pruned_entities(config: Dict, langset: Set[str],
+                     entities: Dict[str, Iterable[str]] = None) -> Optional[Dict[str, Set[str]]]:
+    """
+    Return the Presidio entities to keep in the recognizer registry, by
+    language, or None if the registry is not to be pruned. They are the
+    entities given, or else the ones mapped in the PII list of the config
+    """
+    if not langset or not config.get(defs.CFG_ENGINE, {}).get(defs.CFG_PRUNE):
+        return None
+    if entities is not None:
+        return {lang: set(elist) for lang, elist in entities.items()
+                if lang in langset}
+    if defs.CFG_MAP not in config:
+        raise ConfigException("pruning the recognizer registry needs the list of entities used")
+    return used_entities(config, langset)
+
+
+def _config_hash(value) -> str:
+    """
+    Compute a short hash identifying a configuration value
+    """
+    data = json.dumps(value, sort_keys=True, default=repr)
+    return hashlib.sha1(data.encode()).hexdigest()[:12]
+
+
+def _engine_key(langset: Set[str], nlp_config: Dict,
+                entities: Dict[str, Set[str]] = None,
+                config: Dict = None) -> str:
+    """
+    Compute the cache key for a language set & a Presidio NLP configuration
+    (plus the entities to keep, for a pruned registry, and the engine options
+    in the config that change the engine built)
+    """
+    key_l = "-".join(sorted(langset)) if langset else "-"
+    key_m = (m["lang_code"] + ":" + str(m["model_name"])
+             for m in nlp_config["models"])
+    key = [key_l, nlp_config['nlp_engine_name'], '-'.join(sorted(key_m))]
+    if entities is not None:
+        key.append("pruned:" + entities_key(entities))
+    # (parallel_load is left out: it changes only how the engine is built)
+    for name in (defs.CFG_PARAMS, defs.CFG_RECYCLE):
+        value = (config or {}).get(name)
+        if value:
+            key.append(f"{name}:{_config_hash(value)}")
+    return '/'.join(key)
+
+
+def engine_key(config: Dict, languages: Iterable[str] = None,
+               entities: Dict[str, Iterable[str]] = None) -> str:
+    """
+    Compute the key used to store an analyzer engine in the cache
+     :param config: the plugin config
+     :param languages: restrict languages loaded in the analyzer to this list
+     :param entities: the Presidio entities used, indexed by language (for
+        a pruned registry; default is the ones mapped in the config)
+    """
+    langset, nlp_config = _nlp_config(config, languages)
+    return _engine_key(langset, nlp_config,
+                       _pruned_entities(config, langset, entities),
+                       config.get(defs.CFG_ENGINE))
+
+
+def _load_model(model: Dict, nlp_config: Dict,
+                logger: PiiLogger = None) -> NlpEngine:
+    """
+    Create an NLP engine with a single model
+    """
+    name = f"{model['lang_code']}:{model['model_name']}"
+    with tracing.span("presidio.model.load", **{"presidio.model": name}):
+        start = time.perf_counter()
+        cfg = dict(nlp_config, models=[model])
+        engine = NlpEngineProvider(nlp_configuration=cfg).create_engine()
+    if logger:
+        logger(".. Presidio NLP model %s loaded: %.3f s", name,
+               time.perf_counter() - start)
+    return engine
+
+
+def _parallel_nlp_engine(nlp_config: Dict, workers,
+                         logger: PiiLogger = None) -> NlpEngine:
+    """
+    Create an NLP engine by loading its models concurrently, each one in a
+    separate engine, and then merging all of them into the first engine
+     :param nlp_config: the Presidio NLP configuration
+     :param workers: maximum number of loading threads (`True` for one thread
+        per model)
+    """
+    models = nlp_config["models"]
+    workers = len(models) if workers is True else min(int(workers), len(models))
+    with ThreadPoolExecutor(max_workers=workers,
+                            thread_name_prefix="presidio-load") as pool:
+        futures = [pool.submit(contextvars.copy_context().run,
+                               _load_model, m, nlp_config, logger)
+                   for m in models]
+
+    # Report all the models that failed
+    engines, errors = [], []
+    for model, future in zip(models, futures):
+        try:
+            engines.append(future.result())
+        except Exception as e:
+            errors.append(f"{model['lang_code']}:{model['model_name']}: {e}")
+    if errors:
+        raise ProcException("cannot load Presidio NLP models: {}",
+                            "; ".join(errors))
+
+    nlp_engine = engines[0]
+    for other in engines[1:]:
+        nlp_engine.nlp.update(other.nlp)
+    nlp_engine.models = list(models)
+    return nlp_engine
+
+
+def _build_engine(langset: Set[str], nlp_config: Dict, config: Dict,
+                  logger: PiiLogger = None,
+                  entities: Dict[str, Set[str]] = None) -> AnalyzerEngine:
+    """
+    Create a new Presidio AnalyzerEngine object
+     :param entities: if not None, restrict the recognizer registry to the
+        recognizers for these entities (indexed by language)
+    """
+    with tracing.span("presidio.engine.build",
+                      **{"presidio.languages": sorted(langset),
+                         "presidio.nlp_engine": str(nlp_config["nlp_engine_name"])}):
+
+        # Create an NLP engine, according to the configuration
+        if logger:
+            logger(".. Creating Presidio NLP engine")
+        workers = config.get(defs.CFG_PARALLEL)
+        if workers and len(nlp_config["models"]) > 1:
+            nlp_engine = _parallel_nlp_engine(nlp_config, workers, logger)
+        else:
+            provider = NlpEngineProvider(nlp_configuration=nlp_config)
+            nlp_engine = provider.create_engine()
+
+        # Set up the Presidio Analyzer engine
+        extra_params = dict(config.get(defs.CFG_PARAMS, {}))
+        enhancer = extra_params.get("context_aware_enhancer")
+        if isinstance(enhancer, dict):
+            extra_params["context_aware_enhancer"] = context_enhancer(enhancer)
+        pruned = None
+        if entities is not None and "registry" not in extra_params:
+            registry, pruned = pruned_registry(list(langset), entities,
+                                               nlp_engine)
+            extra_params["registry"] = registry
+            if logger:
+                logger(".. Presidio recognizers: %d kept, %d pruned",
+                       len(registry.recognizers), len(pruned))
+        engine = AnalyzerEngine(supported_languages=list(langset) or None,
+                                nlp_engine=nlp_engine, **extra_params)
+        if pruned is not None:
+            PRUNED_RECOGNIZERS[engine] = pruned
+
+        # Precompute the context index for the engine recognizers
+        enhancer = getattr(engine, "context_aware_enhancer", None)
+        if isinstance(enhancer, IndexedContextEnhancer):
+            enhancer.build_index(engine.registry.recognizers)
+        return engine
+
+
+def _cached_engine(key: str, langset: Set[str], nlp_config: Dict,
+                   config: Dict, logger: PiiLogger = None,
+                   entities: Dict[str, Set[str]] = None) -> Tuple[AnalyzerEngine, bool]:
+    """
+    Fetch an engine from the cache, or build it and store it there
+      :return: a tuple (engine, cache-hit)
+    """
+    # Fetch the engine from the cache, or the lock to build it
+    with _CACHE_LOCK:
+        engine = ENGINE_CACHE.get(key)
+        if engine is None:
+            lock = _BUILD_LOCKS.setdefault(key, threading.Lock())
+
+    # Single-flight build: only one thread builds the engine for a given key,
+    # concurrent requests for the same key wait for it and then reuse it
+    if engine is None:
+        with lock:
+            engine = ENGINE_CACHE.get(key)
+            if engine is None:
+                engine = _build_engine(langset, nlp_config, config, logger,
+                                       entities)
+                with _CACHE_LOCK:
+                    ENGINE_CACHE[key] = engine
+                recycle = config.get(defs.CFG_RECYCLE)
+                if recycle:
+                    RECYCLERS[key] = _recycler(key, engine, recycle, langset,
+                                               nlp_config, config, logger,
+                                               entities)
+                else:
+                    RECYCLERS.pop(key, None)
+                return engine, False
+
+    if logger:
+        logger(".. Reusing Presidio NLP engine")
+    return engine, True
+
+
+def _recycler(key: str, engine: AnalyzerEngine, recycle: Dict,
+              langset: Set[str], nlp_config: Dict, config: Dict,
+              logger: PiiLogger = None,
+              entities: Dict[str, Set[str]] = None) -> EngineRecycler:
+    """
+    Create the recycler for a cached engine. Its rebuilt engines are warmed
+    up for the languages the current engine was warmed up for
+    """
+    def rebuild(old: AnalyzerEngine) -> AnalyzerEngine:
+        new = _build_engine(langset, nlp_config, config, logger, entities)
+        warm = WARM_ENGINES.get(old, ())
+        if warm:
+            supported = list(new.get_supported_entities())
+            warmup_analyzer(new, {lang: supported for lang in warm}, logger)
+        return new
+
+    def install(new: AnalyzerEngine):
+        with _CACHE_LOCK:
+            ENGINE_CACHE[key] = new
+
+    return EngineRecycler(key, recycle, engine, rebuild, install, logger)
+
+
+def presidio_analyzer(config: Dict, languages: Iterable[str] = None,
+                      logger: PiiLogger = None,
+                      entities: Dict[str, Iterable[str]] = None) -> AnalyzerEngine:
+    """
+    Create a Presidio AnalyzerEngine object.
+    Will reuse an object with the same configuration if it's in the cache
+    and `reuse_engine` in the config is True (which is its default value).
+    It is thread-safe: concurrent calls for the same configuration will
+    build a single engine.
+    If `prune_recognizers` in the config is True, the engine will contain only
+    the recognizers for the Presidio entities used
+     :param config: the plugin config
+     :param languages: restrict languages loaded in the analyzer to this list
+     :param logger: a logger instance
+     :param entities: the Presidio entities used, indexed by language (for
+        a pruned registry; default is the ones mapped in the PII list of the
+        config)
+    """
+    # Prepare a configuration for the Presidio Analyzer
+    langset, nlp_config = _nlp_config(config, languages)
+    #print("ANALYZER", langset, "&", languages, config)
 
     #print("CONFIG", nlp_config)
     if logger:
@@ -49,30 +311,107 @@ def presidio_analyzer(config: Dict, languages: Iterable[str] = None,
         logger(".. Presidio NLP models: %s", nlp_config.get("models"))
 
     # Reuse the engine if we have one with the same parameters
-    reuse = config.get(defs.CFG_REUSE, True)
-    if reuse:
-        key_l = "-".join(sorted(langset)) if langset else "-"
-        key_m = (m["lang_code"] + ":" + str(m["model_name"])
-                 for m in nlp_config["models"])
-        key = [key_l, nlp_config['nlp_engine_name'], '-'.join(sorted(key_m))]
-        key = '/'.join(key)
-        #print("KEY", key)
-        engine = ENGINE_CACHE.get(key)
-        if key in ENGINE_CACHE:
-            if logger:
-                logger(".. Reusing Presidio NLP engine")
-            return engine
+    entities = _pruned_entities(config, langset, entities)
+    config = config.get(defs.CFG_ENGINE)
+    key = _engine_key(langset, nlp_config, entities, config)
+    with tracing.span("presidio.engine", **{"presidio.engine_key": key}) as sp:
+        if not config.get(defs.CFG_REUSE, True):
+            sp.set_attribute("presidio.cache", "disabled")
+            return _build_engine(langset, nlp_config, config, logger, entities)
+        engine, hit = _cached_engine(key, langset, nlp_config, config, logger,
+                                     entities)
+        sp.set_attribute("presidio.cache", "hit" if hit else "miss")
+        return engine
 
-    # Create an NLP engine, according to the configuration
-    if logger:
-        logger(".. Creating Presidio NLP engine")
-    provider = NlpEngineProvider(nlp_configuration=nlp_config)
-    nlp_engine = provider.create_engine()
-
-    # Set up the Presidio Analyzer engine
-    extra_params = config.get(defs.CFG_PARAMS, {})
-    engine = AnalyzerEngine(supported_languages=list(langset) or None,
-                            nlp_engine=nlp_engine, **extra_params)
-    if reuse:
-        ENGINE_CACHE[key] = engine
-    return engine
+
+def cached_analyzer(config: Dict, languages: Iterable[str] = None,
+                    entities: Dict[str, Iterable[str]] = None) -> AnalyzerEngine:
+    """
+    Return the cached analyzer engine for a configuration, or None if it has
+    not been built yet (this never builds an engine)
+    """
+    return ENGINE_CACHE.get(engine_key(config, languages, entities))
+
+
+def engine_recycler(config: Dict, languages: Iterable[str] = None,
+                    entities: Dict[str, Iterable[str]] = None) -> Optional[EngineRecycler]:
+    """
+    Return the recycler for the cached engine of a configuration, or None if
+    engine recycling is not configured
+    """
+    key = engine_key(config, languages, entities)
+    recycler = RECYCLERS.get(key)
+    if recycler is None or recycler.engine is not ENGINE_CACHE.get(key):
+        return None
+    return recycler
+
+
+def warmup_analyzer(engine: AnalyzerEngine, entities: Dict[str, Iterable[str]],
+                    logger: PiiLogger = None) -> Dict[str, float]:
+    """
+    Warm up an analyzer engine, by running some dummy texts through it for
+    each language, so that lazy initializations are done before real use
+     :param engine: the engine to warm up
+     :param entities: dict of Presidio entities to use, indexed by language
+     :param logger: a logger instance
+     :return: a dict with the warm-up time (in seconds) for each language
+    """
+    timings = {}
+    for lang, entlist in entities.items():
+        text = defs.WARMUP_TEXT.get(lang, defs.WARMUP_TEXT["en"])
+        start = time.perf_counter()
+        engine.analyze(text=text, language=lang, entities=list(entlist))
+        timings[lang] = time.perf_counter() - start
+        if logger:
+            logger(".. Presidio warm-up lang=%s: %.3f s", lang, timings[lang])
+    WARM_ENGINES.setdefault(engine, set()).update(timings)
+    return timings
+
+
+def analyze_batch(engine: AnalyzerEngine,
+                  requests: List[Tuple[str, str, List[str]]]) -> List[List]:
+    """
+    Analyze a batch of texts with an engine. The NLP pipeline is run once per
+    language, over all the texts in that language (using the batch processing
+    of the NLP engine), and then the recognizers are run over each text
+      :param engine: the analyzer engine
+      :param requests: list of (text, language, entities) tuples
+      :return: the list of analyzer results for each text
+    """
+    nlp_engine = getattr(engine, "nlp_engine", None)
+    if len(requests) < 2 or not hasattr(nlp_engine, "process_batch"):
+        return [engine.analyze(text=text, language=lang,
+                               entities=entities) or []
+                for text, lang, entities in requests]
+
+    bylang = defaultdict(list)
+    for n, (_, lang, _) in enumerate(requests):
+        bylang[lang].append(n)
+    artifacts = [None]*len(requests)
+    for lang, idx in bylang.items():
+        batch = nlp_engine.process_batch([requests[n][0] for n in idx], lang)
+        for n, (_, nlp_artifacts) in zip(idx, batch):
+            artifacts[n] = nlp_artifacts
+
+    return [engine.analyze(text=text, language=lang, entities=entities,
+                           nlp_artifacts=nlp_artifacts) or []
+            for (text, lang, entities), nlp_artifacts in zip(requests,
+                                                              artifacts)]
+
+
+def pruned_recognizers(engine: AnalyzerEngine) -> Optional[List]:
+    """
+    Return the recognizers removed from an engine with a pruned registry, or
+    None if its registry was not pruned
+    """
+    return PRUNED_RECOGNIZERS.get(engine)
+
+
+def is_warm(engine: AnalyzerEngine, languages: Iterable[str]) -> bool:
+    """
+    Check if an engine has been warmed up for a set of languages
+    """
+    if engine is None:
+        return False
+    warm = WARM_ENGINES.get(engine, set())
+    return all(lang in warm for lang in languages)
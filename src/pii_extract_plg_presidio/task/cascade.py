@@ -0,0 +1,123 @@
+"""
+Two-tier cascade detection: a cheap analyzer runs over all texts, and an
+expensive one only over the texts where the first one found candidates
+"""
+
+import threading
+
+from typing import Dict, List, Callable
+
+from pii_data.helper.exception import ConfigException
+
+from .. import defs
+from .daemon import TYPE_REQUEST
+
+
+# Trigger conditions for the second tier
+TRIGGERS = ("candidates", "low_score")
+
+
+def cascade_config(config: Dict) -> Dict:
+    """
+    Build the plugin configuration for the second-tier analyzer: the same
+    configuration, but with the NLP engine & models defined in the cascade
+    """
+    engine = config.get(defs.CFG_ENGINE, {})
+    cascade = engine[defs.CFG_CASCADE]
+    if not cascade.get("models"):
+        raise ConfigException("cascade configuration needs a list of models")
+    engine = {k: v for k, v in engine.items() if k != defs.CFG_CASCADE}
+    engine["nlp_engine_name"] = cascade.get("nlp_engine_name",
+                                            engine.get("nlp_engine_name"))
+    engine["models"] = cascade["models"]
+    return {**config, defs.CFG_ENGINE: engine}
+
+
+class Cascade:
+    """
+    Decide which texts go to the second tier, merge the results of both
+    tiers and keep statistics on how often the second tier is used
+    """
+
+    def __init__(self, config: Dict):
+        """
+          :param config: the cascade configuration
+        """
+        self.trigger = config.get("trigger", "candidates")
+        if self.trigger not in TRIGGERS:
+            raise ConfigException("unknown cascade trigger: {}", self.trigger)
+        self.min_score = config.get("min_score", 0.8)
+        entities = config.get("entities")
+        self.entities = set(entities) if entities else None
+        # Languages covered by the second-tier models (the others skip it)
+        self.languages = {m["lang_code"] for m in config.get("models") or []}
+        self._lock = threading.Lock()
+        self._chunks = self._triggered = 0
+
+
+    def __repr__(self) -> str:
+        return f"<Cascade {self.trigger}>"
+
+
+    def _tier2_entities(self, entities: List[str]) -> List[str]:
+        """
+        Select the entities to be detected by the second tier
+        """
+        if self.entities is None:
+            return entities
+        return [e for e in entities if e in self.entities]
+
+
+    def _triggers(self, results: List, entities: List[str]) -> bool:
+        """
+        Check if the first-tier results for a text call for the second tier
+        """
+        candidates = [r for r in results if r.entity_type in entities]
+        if self.trigger == "candidates":
+            return bool(candidates)
+        return any(r.score < self.min_score for r in candidates)
+
+
+    def run(self, requests: List[TYPE_REQUEST], results: List[List],
+            analyze: Callable) -> List[List]:
+        """
+        Run the second tier where needed, and merge the results
+          :param requests: list of (text, language, entities) tuples
+          :param results: the first-tier results for each request
+          :param analyze: the function to call the second-tier analyzer
+          :return: the merged results for each request: for texts that went
+            to the second tier, its results replace the first-tier results
+            for the second-tier entities. Texts in a language with no
+            second-tier model keep their first-tier results
+        """
+        selected = []
+        for n, ((text, lang, entities), res) in enumerate(zip(requests, results)):
+            if lang not in self.languages:
+                continue
+            tier2 = self._tier2_entities(entities)
+            if tier2 and self._triggers(res, tier2):
+                selected.append((n, (text, lang, tier2)))
+
+        with self._lock:
+            self._chunks += len(requests)
+            self._triggered += len(selected)
+        if not selected:
+            return results
+
+        results = list(results)
+        tier2_results = analyze([req for _, req in selected])
+        for (n, (_, _, tier2)), res2 in zip(selected, tier2_results):
+            results[n] = [r for r in results[n] if r.entity_type not in tier2]
+            results[n] += res2
+        return results
+
+
+    def stats(self) -> Dict:
+        """
+        Return the number of texts processed, and how many of them were
+        sent to the second tier
+        """
+        with self._lock:
+            chunks, triggered = self._chunks, self._triggered
+        return {"chunks": chunks, "triggered": triggered,
+                "rate": triggered/chunks if chunks else 0}
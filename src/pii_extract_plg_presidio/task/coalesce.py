@@ -0,0 +1,116 @@
+"""
+Coalescing of small texts: consecutive small texts are joined into a single
+text, so that they can be analyzed with a single analyzer call
+"""
+
+from bisect import bisect_right
+from collections import namedtuple
+
+from typing import Dict, List, Union, Callable
+
+from pii_data.helper.exception import ConfigException
+
+from .daemon import TYPE_REQUEST
+
+
+# An analyzer result remapped to its original text
+ChunkResult = namedtuple("ChunkResult", "start end entity_type score")
+
+DEFAULT_MAX_SIZE = 4096
+DEFAULT_SEPARATOR = "\n\n"
+
+
+class Coalescer:
+    """
+    Join consecutive small texts with the same language & entities into a
+    single text (up to a size limit), analyze it, and map the results back
+    to the original texts. Results crossing a separator are dropped.
+    """
+
+    def __init__(self, config: Union[bool, Dict]):
+        """
+          :param config: the coalescing configuration: either True (use
+            defaults) or a dict with `max_size` and `separator` fields
+        """
+        if not isinstance(config, dict):
+            config = {}
+        self.max_size = config.get("max_size", DEFAULT_MAX_SIZE)
+        self.sep = config.get("separator", DEFAULT_SEPARATOR)
+        if not self.sep or self.sep.strip():
+            raise ConfigException("coalescing separator must be non-empty whitespace")
+
+
+    def __repr__(self) -> str:
+        return f"<Coalescer {self.max_size}>"
+
+
+    def groups(self, requests: List[TYPE_REQUEST]) -> List[List[int]]:
+        """
+        Split a list of requests into groups of consecutive requests that
+        can be joined together
+          :return: a list of groups, each one a list of request indexes
+        """
+        groups = []
+        size = 0
+        prev = None
+        for n, (text, lang, entities) in enumerate(requests):
+            key = (lang, entities)
+            new_size = size + len(self.sep) + len(text)
+            if groups and key == prev and new_size <= self.max_size:
+                groups[-1].append(n)
+                size = new_size
+            else:
+                groups.append([n])
+                size = len(text)
+            prev = key
+        return groups
+
+
+    def _split(self, results: List, starts: List[int],
+               texts: List[str]) -> List[List[ChunkResult]]:
+        """
+        Map the results for a joined text back to the original texts
+        """
+        out = [[] for _ in starts]
+        for r in results:
+            n = bisect_right(starts, r.start) - 1
+            start = r.start - starts[n]
+            end = r.end - starts[n]
+            if end > len(texts[n]):
+                continue        # crosses a separator
+            out[n].append(ChunkResult(start, end, r.entity_type, r.score))
+        return out
+
+
+    def run(self, requests: List[TYPE_REQUEST],
+            analyze: Callable) -> List[List]:
+        """
+        Analyze a list of texts, coalescing small ones
+          :param requests: list of (text, language, entities) tuples
+          :param analyze: the function to analyze a list of requests
+          :return: the results for each request
+        """
+        groups = self.groups(requests)
+        joined = []
+        for group in groups:
+            if len(group) == 1:
+                joined.append(requests[group[0]])
+            else:
+                _, lang, entities = requests[group[0]]
+                text = self.sep.join(requests[n][0] for n in group)
+                joined.append((text, lang, entities))
+
+        results = [None] * len(requests)
+        for group, res in zip(groups, analyze(joined)):
+            if len(group) == 1:
+                results[group[0]] = res
+                continue
+            texts = [requests[n][0] for n in group]
+            starts = []
+            pos = 0
+            for t in texts:
+                starts.append(pos)
+                pos += len(t) + len(self.sep)
+            for n, r in zip(group, self._split(res, starts, texts)):
+                results[n] = r
+        return results
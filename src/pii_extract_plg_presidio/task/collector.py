@@ -2,6 +2,8 @@
 A collector for the Presidio detection task
 """
 
+from collections import defaultdict
+
 from pii_extract.helper.utils import taskd_field
 from pii_extract.helper.logger import PiiLogger
 
@@ -38,6 +40,22 @@ def pii_list(config: Dict, langset: Set[str]) -> Dict:
     return list(piimap.values())
 
 
+def presidio_entities(pii: Iterable[Dict],
+                      langset: Set[str] = None) -> Dict[str, Set[str]]:
+    """
+    Compute the set of Presidio entities used by a list of PII descriptors,
+    indexed by language
+      :param pii: list of raw PII descriptors
+      :param langset: restrict to a given set of languages
+    """
+    entities = defaultdict(set)
+    for p in pii:
+        for lang in taskd_field(p, "lang"):
+            if not langset or lang in langset:
+                entities[lang].add(p["extra"]["presidio"])
+    return dict(entities)
+
+
 # ---------------------------------------------------------------------
 
 class PresidioTaskCollector:
@@ -62,19 +80,28 @@ class PresidioTaskCollector:
                   self.model_lang)
 
 
+    def _task_lang(self, lang: Union[str, Iterable[str]] = None) -> Set[str]:
+        """
+        Compute the set of languages for the task
+        """
+        task_lang = self.model_lang
+        if lang:
+            task_lang = task_lang.intersection([lang] if isinstance(lang, str) else lang)
+        return task_lang
+
+
     def gather_tasks(self, lang: Union[str, Iterable[str]] = None) -> Iterable[Dict]:
         """
         Return the iterable of available PII Descriptors
         (in this case it is a single multi-task)
           :param lang: restrict the languages for the PII instances to a subset
         """
-        task_lang = self.model_lang
-        if lang:
-            task_lang = task_lang.intersection([lang] if isinstance(lang, str) else lang)
+        task_lang = self._task_lang(lang)
         self._log(".. Presidio gather tasks for lang=%s", task_lang)
 
         # The configuration to pass to to the task descriptor
-        cfg = {k: self.cfg[k] for k in (defs.CFG_ENGINE, defs.CFG_PARAMS)}
+        cfg = {k: self.cfg.get(k, {})
+               for k in (defs.CFG_ENGINE, defs.CFG_PARAMS, defs.CFG_TASK)}
 
         # Prepare the raw task descriptor
         task = {
@@ -87,3 +114,31 @@ class PresidioTaskCollector:
             "pii": pii_list(self.cfg, task_lang)
         }
         yield task
+
+
+    def warmup(self, lang: Union[str, Iterable[str]] = None) -> Dict[str, float]:
+        """
+        Build (or fetch from the cache) the Presidio analyzer engine that the
+        task will use, and warm it up
+          :param lang: restrict the languages to a subset (as in gather_tasks)
+          :return: a dict with the warm-up time (in seconds) for each language
+        """
+        from .analyzer import presidio_analyzer, warmup_analyzer
+        task_lang = self._task_lang(lang)
+        engine = presidio_analyzer(self.cfg, languages=task_lang,
+                                   logger=self._log)
+        entities = presidio_entities(pii_list(self.cfg, task_lang), task_lang)
+        return warmup_analyzer(engine, entities, logger=self._log)
+
+
+    def ready(self, lang: Union[str, Iterable[str]] = None) -> bool:
+        """
+        Check if the analyzer engine for the task has already been built and
+        warmed up for all its languages
+          :param lang: restrict the languages to a subset (as in gather_tasks)
+        """
+        from .analyzer import cached_analyzer, is_warm
+        task_lang = self._task_lang(lang)
+        engine = cached_analyzer(self.cfg, languages=task_lang)
+        entities = presidio_entities(pii_list(self.cfg, task_lang), task_lang)
+        return is_warm(engine, entities)
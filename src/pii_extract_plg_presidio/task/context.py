@@ -0,0 +1,217 @@
+"""
+A context-aware enhancer using a precomputed index from context words to
+recognizers. It gives the same results as the Presidio lemma-based
+enhancer, but each result needs only a lookup of the keywords in its window
+"""
+
+import copy
+import threading
+from bisect import bisect_left, bisect_right
+
+from typing import Dict, List, Optional, Iterable, FrozenSet
+
+from presidio_analyzer import EntityRecognizer, RecognizerResult
+from presidio_analyzer.context_aware_enhancers import (
+    ContextAwareEnhancer, LemmaContextAwareEnhancer)
+from presidio_analyzer.nlp_engine import NlpArtifacts
+
+from pii_data.helper.exception import ConfigException
+
+
+# Maximum number of lemmas to cache (per language), in substring mode
+MAX_CACHE = 100000
+
+_EMPTY = frozenset()
+
+
+class IndexedContextEnhancer(ContextAwareEnhancer):
+    """
+    Context-aware enhancer with a per-language index from context words to
+    the recognizers that use them. The index is built when the engine is
+    created (and updated if new recognizers appear).
+    """
+
+    def __init__(self, context_similarity_factor: float = 0.35,
+                 min_score_with_context_similarity: float = 0.4,
+                 context_prefix_count: int = 5,
+                 context_suffix_count: int = 0,
+                 context_matching_mode: str = "substring"):
+        """
+        Arguments are the same as for the Presidio `LemmaContextAwareEnhancer`
+          :param context_prefix_count: number of words before the entity to
+             look for context words
+          :param context_suffix_count: number of words after the entity to
+             look for context words
+          :param context_matching_mode: `substring` (a context word matches
+             any keyword containing it) or `whole_word`
+        """
+        super().__init__(
+            context_similarity_factor=context_similarity_factor,
+            min_score_with_context_similarity=min_score_with_context_similarity,
+            context_prefix_count=context_prefix_count,
+            context_suffix_count=context_suffix_count)
+        if context_matching_mode not in ("substring", "whole_word"):
+            raise ConfigException("invalid context matching mode: {}",
+                                  context_matching_mode)
+        self.substring = context_matching_mode == "substring"
+        self._lock = threading.Lock()
+        self._index = {}        # lang -> {context word -> set of recognizer ids}
+        self._words = {}        # recognizer id -> list of context words
+        self._cache = {}        # lang -> {lemma -> set of recognizer ids}
+
+
+    def __repr__(self) -> str:
+        return f"<IndexedContextEnhancer #{len(self._words)}>"
+
+
+    def build_index(self, recognizers: Iterable[EntityRecognizer]):
+        """
+        Add recognizers with context words to the index
+        """
+        with self._lock:
+            for rec in recognizers:
+                if not rec.context or rec.id in self._words:
+                    continue
+                words = [w.lower() for w in rec.context]
+                self._words[rec.id] = words
+                lang = rec.supported_language
+                index = self._index.setdefault(lang, {})
+                for w in words:
+                    index.setdefault(w, set()).add(rec.id)
+                self._cache.pop(lang, None)
+
+
+    def lookup(self, lang: str, keyword: str) -> FrozenSet[str]:
+        """
+        Return the ids of the recognizers for which a keyword matches one of
+        their context words
+        """
+        index = self._index.get(lang)
+        if not index:
+            return _EMPTY
+        if not self.substring:
+            return index.get(keyword, _EMPTY)
+        cache = self._cache.setdefault(lang, {})
+        ids = cache.get(keyword)
+        if ids is None:
+            ids = frozenset(r for w, rids in index.items() if w in keyword
+                            for r in rids)
+            if len(cache) < MAX_CACHE:
+                cache[keyword] = ids
+        return ids
+
+
+    def _matches(self, word: str, keyword: str) -> bool:
+        return word in keyword if self.substring else word == keyword
+
+
+    def enhance_using_context(self, text: str,
+                              raw_results: List[RecognizerResult],
+                              nlp_artifacts: NlpArtifacts,
+                              recognizers: List[EntityRecognizer],
+                              context: Optional[List[str]] = None) -> List[RecognizerResult]:
+        """
+        Increase the score of the results that have context words of their
+        recognizer in their surrounding keywords (or in the given context)
+        """
+        results = copy.deepcopy(raw_results)
+        if nlp_artifacts is None:
+            return results
+
+        recs = {}
+        pending = []
+        for rec in recognizers:
+            recs[rec.id] = rec
+            if rec.context and rec.id not in self._words:
+                pending.append(rec)
+        if pending:
+            self.build_index(pending)
+
+        # Window positions are computed only if there is a result to enhance
+        window = None
+        ext_context = [w.lower() for w in context] if context else []
+
+        for result in results:
+            meta = result.recognition_metadata or {}
+            rec = recs.get(meta.get(RecognizerResult.RECOGNIZER_IDENTIFIER_KEY))
+            if rec is None or not rec.context:
+                continue
+            if meta.get(RecognizerResult.IS_SCORE_ENHANCED_BY_CONTEXT_KEY):
+                continue
+
+            if window is None:
+                window = _Window(nlp_artifacts, self.context_prefix_count,
+                                 self.context_suffix_count)
+            lang = rec.supported_language
+            keywords = window.keywords(result.start) + ext_context
+            if not any(rec.id in self.lookup(lang, k) for k in keywords):
+                continue
+
+            word = next(w for w in rec.context
+                        if any(self._matches(w.lower(), k) for k in keywords))
+            result.score += self.context_similarity_factor
+            result.score = max(result.score,
+                               self.min_score_with_context_similarity)
+            result.score = min(result.score, ContextAwareEnhancer.MAX_SCORE)
+            if result.analysis_explanation:
+                result.analysis_explanation.set_supportive_context_word(word)
+                result.analysis_explanation.set_improved_score(result.score)
+
+        return results
+
+
+
+class _Window:
+    """
+    Find the keywords around a position in an analyzed text
+    """
+
+    def __init__(self, nlp_artifacts: NlpArtifacts, prefix: int, suffix: int):
+        self.prefix = prefix + 1    # as in Presidio, the entity token
+        self.suffix = suffix + 1    # itself is also considered
+        tokens = nlp_artifacts.tokens or []
+        self.ends = [idx + len(tok)
+                     for tok, idx in zip(tokens, nlp_artifacts.tokens_indices)]
+        keywords = set(nlp_artifacts.keywords or [])
+        self.lemmas = [lemma.lower() for lemma in nlp_artifacts.lemmas or []]
+        self.kw_pos = [n for n, lemma in enumerate(self.lemmas)
+                       if lemma in keywords]
+
+
+    def keywords(self, start: int) -> List[str]:
+        """
+        Return the keywords in the window around the token at a position
+        """
+        if not self.ends:
+            return []
+        token = min(bisect_right(self.ends, start), len(self.ends) - 1)
+        back = bisect_right(self.kw_pos, token)
+        fwd = bisect_left(self.kw_pos, token)
+        pos = self.kw_pos[max(0, back - self.prefix):back] + \
+            self.kw_pos[fwd:fwd + self.suffix]
+        return [self.lemmas[n] for n in pos]
+
+
+# --------------------------------------------------------------------------
+
+
+ENHANCERS = {
+    "indexed": IndexedContextEnhancer,
+    "lemma": LemmaContextAwareEnhancer
+}
+
+
+def context_enhancer(config: Dict) -> ContextAwareEnhancer:
+    """
+    Create a context-aware enhancer from its configuration: a dict with a
+    `type` field (`indexed` or `lemma`, the Presidio default), plus the
+    enhancer arguments
+    """
+    config = dict(config)
+    etype = config.pop("type", "indexed")
+    try:
+        return ENHANCERS[etype](**config)
+    except KeyError:
+        raise ConfigException("unknown context enhancer type: {}", etype)
+    except (TypeError, ValueError) as e:
+        raise ConfigException("invalid context enhancer config: {}", e) from e
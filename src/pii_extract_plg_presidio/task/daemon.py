@@ -0,0 +1,376 @@
+"""
+A local analyzer daemon: a long-lived process holding warmed-up Presidio
+analyzer engines, reachable over a Unix socket. And the client side, which
+lets Presidio tasks delegate analysis to the daemon.
+
+The protocol uses messages made of a 4-byte length header followed by a
+UTF-8 JSON payload. Each request message contains an `op` field:
+ * `ping`: check that the daemon is alive
+ * `init`: build (or reuse) & warm up an engine for a plugin config
+ * `analyze`: analyze a batch of texts with an engine
+"""
+
+import os
+import stat
+import json
+import queue
+import socket
+import struct
+import tempfile
+import threading
+import socketserver
+from collections import namedtuple
+
+from typing import Dict, List, Iterable, Tuple
+
+from pii_data.helper.exception import ProcException
+from pii_extract.helper.logger import PiiLogger
+
+from .. import defs
+
+
+# A Presidio-like analysis result, as delivered by the daemon
+DaemonResult = namedtuple("DaemonResult", "start end entity_type score")
+
+# An analysis request: text, language & list of entities
+TYPE_REQUEST = Tuple[str, str, List[str]]
+
+# Error code for a request using an engine not available in the daemon
+ERR_NOENGINE = "noengine"
+
+_HEADER = struct.Struct("!I")
+
+
+class DaemonUnavailable(ProcException):
+    """
+    The daemon cannot be reached
+    """
+    pass
+
+
+class DaemonError(ProcException):
+    """
+    The daemon returned an error
+    """
+    def __init__(self, code: str, msg: str):
+        super().__init__("Presidio daemon error: {}", msg)
+        self.code = code
+
+
+def default_socket() -> str:
+    """
+    Return the default path for the daemon socket
+    """
+    return os.path.join(tempfile.gettempdir(),
+                        f"pii-extract-presidio-{os.getuid()}.sock")
+
+
+def send_msg(sock: socket.socket, msg: Dict):
+    """
+    Send a message through a socket
+    """
+    data = json.dumps(msg).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < size:
+        data = sock.recv(size - len(buf))
+        if not data:
+            raise EOFError("connection closed")
+        buf += data
+    return bytes(buf)
+
+
+def recv_msg(sock: socket.socket) -> Dict:
+    """
+    Receive a message from a socket
+    """
+    size = _HEADER.unpack(_recv_exact(sock, _HEADER.size))[0]
+    return json.loads(_recv_exact(sock, size).decode("utf-8"))
+
+
+# ----------------------------------------------------------------------
+
+
+class _DaemonHandler(socketserver.BaseRequestHandler):
+    """
+    Process all the requests arriving through one client connection
+    """
+
+    def handle(self):
+        while True:
+            try:
+                msg = recv_msg(self.request)
+            except (EOFError, OSError):
+                return
+            send_msg(self.request, self.server.process(msg))
+
+
+
+class AnalyzerDaemon(socketserver.ThreadingMixIn,
+                     socketserver.UnixStreamServer):
+    """
+    The daemon server. It uses the standard engine cache, so engines are
+    shared across clients with the same configuration
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path: str = None, logger: PiiLogger = None):
+        """
+          :param socket_path: path for the Unix socket to listen on
+          :param logger: a logger instance
+        """
+        self.socket_path = socket_path or default_socket()
+        self._log = logger or PiiLogger(__name__, None)
+        self._remove_stale_socket()
+        umask = os.umask(0o177)
+        try:
+            super().__init__(self.socket_path, _DaemonHandler)
+        finally:
+            os.umask(umask)
+        self._inode = os.stat(self.socket_path).st_ino
+        self._log(".. Presidio daemon listening on: %s", self.socket_path)
+
+
+    def _remove_stale_socket(self):
+        """
+        Remove a socket left over by a daemon that is no longer running.
+        Refuse to take over the socket of a live daemon, or a path that is
+        not a socket
+        """
+        try:
+            mode = os.stat(self.socket_path).st_mode
+        except FileNotFoundError:
+            return
+        if not stat.S_ISSOCK(mode):
+            raise ProcException("Presidio daemon path exists and is not a socket: {}",
+                                self.socket_path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            self._log(".. Presidio daemon: removing stale socket %s",
+                      self.socket_path)
+            os.unlink(self.socket_path)
+            return
+        finally:
+            sock.close()
+        raise ProcException("a Presidio daemon is already running at {}",
+                            self.socket_path)
+
+
+    def __repr__(self) -> str:
+        return f"<AnalyzerDaemon {self.socket_path}>"
+
+
+    def add_engine(self, cfg: Dict, languages: Iterable[str] = None,
+                   entities: Dict[str, List[str]] = None) -> Dict:
+        """
+        Build (or fetch from the cache) an engine and warm it up
+          :param cfg: the plugin config
+          :param languages: languages to restrict the engine to
+          :param entities: Presidio entities to use & warm up, indexed by
+            language
+          :return: a dict with the engine key and its supported entities
+        """
+        from .analyzer import presidio_analyzer, engine_key, warmup_analyzer, \
+            is_warm
+
+        # Ensure the engine is kept in the cache
+        cfg = dict(cfg)
+        cfg[defs.CFG_ENGINE] = {**cfg.get(defs.CFG_ENGINE, {}),
+                                defs.CFG_REUSE: True}
+        engine = presidio_analyzer(cfg, languages=languages, logger=self._log,
+                                   entities=entities)
+
+        warmup = {}
+        if entities and not is_warm(engine, entities):
+            warmup = warmup_analyzer(engine, entities, logger=self._log)
+        return {"key": engine_key(cfg, languages, entities), "warmup": warmup,
+                "entities": sorted(engine.get_supported_entities())}
+
+
+    def process(self, msg: Dict) -> Dict:
+        """
+        Process a request message, and return the response message
+        """
+        from .analyzer import ENGINE_CACHE, RECYCLERS, analyze_batch
+        op = msg.get("op")
+        try:
+            if op == "ping":
+                return {"ok": True}
+            elif op == "init":
+                return self.add_engine(msg["cfg"], msg.get("languages"),
+                                       msg.get("entities"))
+            elif op == "analyze":
+                engine = ENGINE_CACHE.get(msg["key"])
+                if engine is None:
+                    return {"code": ERR_NOENGINE,
+                            "error": f"no engine for {msg['key']}"}
+                results = analyze_batch(engine, msg["requests"])
+                recycler = RECYCLERS.get(msg["key"])
+                if recycler:
+                    recycler.record(len(results))
+                return {"results": [[(r.start, r.end, r.entity_type, r.score)
+                                     for r in res or []]
+                                    for res in results]}
+            return {"code": "op", "error": f"unknown op: {op}"}
+        except Exception as e:
+            return {"code": "error", "error": f"{type(e).__name__}: {e}"}
+
+
+    def server_close(self):
+        super().server_close()
+        # Remove the socket, unless it is no longer ours
+        try:
+            if os.stat(self.socket_path).st_ino == self._inode:
+                os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+
+
+# ----------------------------------------------------------------------
+
+
+class DaemonClient:
+    """
+    A client for the analyzer daemon, with a pool of persistent connections
+    """
+
+    def __init__(self, socket_path: str = None, pool_size: int = 4,
+                 timeout: float = None):
+        """
+          :param socket_path: path of the daemon Unix socket
+          :param pool_size: maximum number of idle connections to keep
+          :param timeout: timeout for socket operations, in seconds
+        """
+        self.socket_path = socket_path or default_socket()
+        self.timeout = timeout
+        self._pool = queue.LifoQueue(pool_size)
+
+
+    def __repr__(self) -> str:
+        return f"<DaemonClient {self.socket_path}>"
+
+
+    def _connect(self) -> socket.socket:
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError as e:
+            sock.close()
+            raise DaemonUnavailable("cannot connect to Presidio daemon at {}: {}",
+                                    self.socket_path, e) from e
+        return sock
+
+
+    def request(self, msg: Dict) -> Dict:
+        """
+        Send a request to the daemon, and return its response
+        """
+        sock = self._connect()
+        try:
+            send_msg(sock, msg)
+            resp = recv_msg(sock)
+        except (OSError, EOFError, ValueError) as e:
+            sock.close()
+            raise DaemonUnavailable("Presidio daemon connection error: {}",
+                                    e) from e
+        try:
+            self._pool.put_nowait(sock)
+        except queue.Full:
+            sock.close()
+        if "error" in resp:
+            raise DaemonError(resp.get("code"), resp["error"])
+        return resp
+
+
+    def close(self):
+        """
+        Close all idle connections
+        """
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+# Clients, shared by all tasks using the same socket
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+def daemon_client(socket_path: str = None, **kwargs) -> DaemonClient:
+    """
+    Return the (shared) client for a daemon socket
+    """
+    socket_path = socket_path or default_socket()
+    with _CLIENTS_LOCK:
+        if socket_path not in _CLIENTS:
+            _CLIENTS[socket_path] = DaemonClient(socket_path, **kwargs)
+        return _CLIENTS[socket_path]
+
+
+
+class RemoteAnalyzer:
+    """
+    An analyzer that delegates to an engine in the daemon
+    """
+
+    def __init__(self, client: DaemonClient, cfg: Dict,
+                 languages: Iterable[str], entities: Dict[str, List[str]],
+                 batch_size: int = 32):
+        """
+          :param client: the daemon client
+          :param cfg: the plugin config
+          :param languages: languages to restrict the engine to
+          :param entities: Presidio entities to use, indexed by language
+          :param batch_size: maximum number of texts to send in one request
+        """
+        self.client = client
+        self.batch_size = batch_size
+        self._init = {"op": "init", "cfg": cfg,
+                      "languages": sorted(languages) if languages else None,
+                      "entities": {k: sorted(v) for k, v in entities.items()}}
+        self._init_engine()
+
+
+    def _init_engine(self):
+        resp = self.client.request(self._init)
+        self.key = resp["key"]
+        self.entities = resp["entities"]
+        self.warmup = resp["warmup"]
+
+
+    def get_supported_entities(self) -> List[str]:
+        return self.entities
+
+
+    def analyze_batch(self, requests: List[TYPE_REQUEST]) -> List[List[DaemonResult]]:
+        """
+        Analyze a list of texts, sending them in batches to the daemon
+        """
+        results = []
+        for n in range(0, len(requests), self.batch_size):
+            msg = {"op": "analyze", "key": self.key,
+                   "requests": requests[n:n+self.batch_size]}
+            try:
+                resp = self.client.request(msg)
+            except DaemonError as e:
+                if e.code != ERR_NOENGINE:
+                    raise
+                # The daemon was restarted: create the engine again
+                self._init_engine()
+                msg["key"] = self.key
+                resp = self.client.request(msg)
+            results += [[DaemonResult(*r) for r in res]
+                        for res in resp["results"]]
+        return results
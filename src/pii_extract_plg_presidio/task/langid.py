@@ -0,0 +1,146 @@
+"""
+A fast, model-free language identifier, using character n-gram profiles.
+It is used to decide the analyzer language for document chunks that do not
+define one
+"""
+
+import re
+import math
+import threading
+from pathlib import Path
+from collections import Counter
+
+from typing import Dict, Iterable, Tuple, Union
+
+from pii_data.helper.exception import ConfigException
+
+
+# Directory with the sample texts used to build the default profiles
+PROFILE_DIR = Path(__file__).parents[1] / "resources" / "langid"
+
+DEFAULT_MAX_CHARS = 1000
+DEFAULT_CACHE_SIZE = 10000
+NGRAM_SIZES = (1, 2, 3)
+
+_NONLETTER = re.compile(r"[\W\d_]+")
+
+
+def ngrams(text: str) -> Counter:
+    """
+    Count the character n-grams in a text (letters only, with words padded
+    with spaces)
+    """
+    out = Counter()
+    for word in _NONLETTER.sub(" ", text.lower()).split():
+        word = f" {word} "
+        for n in NGRAM_SIZES:
+            out.update(word[i:i+n] for i in range(len(word) - n + 1))
+    del out[" "]
+    return out
+
+
+class LangProfile:
+    """
+    The n-gram log-probabilities for a language (with add-one smoothing)
+    """
+
+    def __init__(self, counts: Counter):
+        total = sum(counts.values()) + len(counts) + 1
+        self.logp = {g: math.log((c + 1)/total) for g, c in counts.items()}
+        self.unseen = math.log(1/total)
+
+
+    def score(self, grams: Counter) -> float:
+        logp, unseen = self.logp, self.unseen
+        return sum(c*logp.get(g, unseen) for g, c in grams.items())
+
+
+def load_profiles(languages: Iterable[str],
+                  directory: Union[str, Path] = None) -> Dict[str, LangProfile]:
+    """
+    Build the profiles for a list of languages, from the `<lang>.txt` sample
+    texts in a directory (or the default one)
+    """
+    directory = Path(directory or PROFILE_DIR)
+    profiles = {}
+    for lang in languages:
+        name = directory / f"{lang}.txt"
+        if not name.is_file():
+            raise ConfigException("no language identification profile for '{}'",
+                                  lang)
+        with open(name, encoding="utf-8") as f:
+            profiles[lang] = LangProfile(ngrams(f.read()))
+    return profiles
+
+
+class LangIdentifier:
+    """
+    Identify the language of a text among a set of candidate languages, with
+    a naive Bayes classifier over character n-grams. Decisions are cached
+    """
+
+    def __init__(self, languages: Iterable[str], config: Union[bool, Dict]):
+        """
+          :param languages: the candidate languages
+          :param config: either True (use defaults) or a dict with optional
+            `min_confidence`, `default`, `max_chars`, `cache_size` and
+            `profiles` fields
+        """
+        if not isinstance(config, dict):
+            config = {}
+        self.languages = sorted(languages)
+        if not self.languages:
+            raise ConfigException("no languages for language identification")
+        self.min_confidence = config.get("min_confidence", 0)
+        self.default = config.get("default")
+        self.max_chars = config.get("max_chars", DEFAULT_MAX_CHARS)
+        self.cache_size = config.get("cache_size", DEFAULT_CACHE_SIZE)
+        self._profiles = load_profiles(self.languages, config.get("profiles"))
+        self._cache = {}
+        self._lock = threading.Lock()
+
+
+    def __repr__(self) -> str:
+        return f"<LangIdentifier {','.join(self.languages)}>"
+
+
+    def scores(self, text: str) -> Dict[str, float]:
+        """
+        Return the probability of each candidate language for a text
+        """
+        grams = ngrams(text[:self.max_chars])
+        if not grams:
+            p = 1/len(self.languages)
+            return {lang: p for lang in self.languages}
+        # The n-grams of different sizes overlap, so they are not independent
+        # evidence: temper the log-likelihoods to get a calibrated confidence
+        logp = {lang: prof.score(grams)/len(NGRAM_SIZES)
+                for lang, prof in self._profiles.items()}
+        top = max(logp.values())
+        exp = {lang: math.exp(v - top) for lang, v in logp.items()}
+        total = sum(exp.values())
+        return {lang: v/total for lang, v in exp.items()}
+
+
+    def identify(self, text: str) -> Tuple[str, float]:
+        """
+        Identify the language of a text
+          :return: a tuple (language, confidence). The language is the
+            default one (or None) if confidence is below the threshold
+        """
+        key = text[:self.max_chars]
+        out = self._cache.get(key)
+        if out is None:
+            if len(self.languages) == 1:
+                out = self.languages[0], 1.0
+            else:
+                scores = self.scores(key)
+                lang = max(scores, key=scores.get)
+                out = lang, scores[lang]
+            with self._lock:
+                if len(self._cache) >= self.cache_size:
+                    self._cache.clear()
+                self._cache[key] = out
+        if out[1] < self.min_confidence:
+            return self.default, out[1]
+        return out
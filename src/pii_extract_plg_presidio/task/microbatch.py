@@ -0,0 +1,195 @@
+"""
+A micro-batching front end for a Presidio task: single-chunk detection
+requests from many threads (or coroutines) are queued, and a worker thread
+runs them in batches through the task `find_batch()` method
+"""
+
+import time
+import queue
+import asyncio
+import threading
+from concurrent.futures import Future
+
+from typing import Dict, List
+
+from pii_data.types import PiiEntity
+from pii_data.types.doc import DocumentChunk
+
+
+DEFAULT_MAX_BATCH = 32
+DEFAULT_MAX_WAIT = 0.005
+
+_STOP = object()
+
+
+class MicroBatcher:
+    """
+    Collect detection requests into batches, bounded by size and by waiting
+    time, and hand each caller its own results.
+
+    The batch size adapts to the load: the worker takes all the requests
+    already queued, and waits (up to `max_wait`) for more only while the
+    recent batches have been larger than the current one. Under light
+    traffic requests are then processed as soon as they arrive; under load,
+    requests accumulate while a batch is processed and batches grow.
+    """
+
+    def __init__(self, task, max_batch: int = DEFAULT_MAX_BATCH,
+                 max_wait: float = DEFAULT_MAX_WAIT, alpha: float = 0.2):
+        """
+          :param task: the task object (it must have a `find_batch()` method)
+          :param max_batch: maximum number of chunks in a batch
+          :param max_wait: maximum time (in seconds) to wait for more
+            requests once a batch has started
+          :param alpha: smoothing factor for the average batch size
+        """
+        self.task = task
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.alpha = alpha
+        self._load = 1.0
+        self._queue = queue.SimpleQueue()
+        self._stats = {"requests": 0, "batches": 0, "max_size": 0}
+        self._lock = threading.Lock()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, daemon=True,
+                                        name="presidio-microbatch")
+        self._worker.start()
+
+
+    def __repr__(self) -> str:
+        return f"<MicroBatcher {self.max_batch}/{self.max_wait}>"
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+
+
+    def target(self) -> int:
+        """
+        Return the current target batch size (the size up to which the worker
+        will wait for more requests)
+        """
+        return min(self.max_batch, max(1, round(self._load)))
+
+
+    def submit(self, chunk: DocumentChunk) -> Future:
+        """
+        Queue a chunk for detection
+          :return: a future that will hold the list of detected PII entities
+        """
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("micro-batcher is closed")
+            future = Future()
+            self._queue.put((chunk, future))
+        return future
+
+
+    def find(self, chunk: DocumentChunk,
+             timeout: float = None) -> List[PiiEntity]:
+        """
+        Perform PII detection on a document chunk, waiting for the result
+        """
+        return self.submit(chunk).result(timeout)
+
+
+    async def find_async(self, chunk: DocumentChunk) -> List[PiiEntity]:
+        """
+        Perform PII detection on a document chunk, from a coroutine
+        """
+        return await asyncio.wrap_future(self.submit(chunk))
+
+
+    def stats(self) -> Dict:
+        """
+        Return statistics: number of requests & batches, mean and maximum
+        batch size, and current target batch size
+        """
+        st = dict(self._stats)
+        st["mean_size"] = st["requests"]/st["batches"] if st["batches"] else 0
+        st["target"] = self.target()
+        return st
+
+
+    def close(self):
+        """
+        Stop the worker, once all queued requests have been processed
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._worker.join()
+
+
+    def _collect(self, first) -> List:
+        """
+        Collect a batch, starting with its first request
+        """
+        batch = [first]
+        target = self.target()
+        deadline = None
+        while len(batch) < self.max_batch:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                # Nothing queued: wait for more only if we expect them
+                if len(batch) >= target or self.max_wait <= 0:
+                    break
+                if deadline is None:
+                    deadline = time.monotonic() + self.max_wait
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if item is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+
+    def _process(self, batch: List):
+        """
+        Process a batch and hand the results to each caller. If the batch
+        fails, chunks are processed one by one, so that each caller gets
+        its own result or exception
+        """
+        batch = [(c, f) for c, f in batch if f.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        chunks = [chunk for chunk, _ in batch]
+        try:
+            results = self.task.find_batch(chunks)
+        except Exception:
+            for chunk, future in batch:
+                try:
+                    future.set_result(list(self.task.find(chunk)))
+                except Exception as e:
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+            batch = self._collect(first)
+            n = len(batch)
+            self._load = self.alpha*n + (1 - self.alpha)*self._load
+            self._stats["requests"] += n
+            self._stats["batches"] += 1
+            self._stats["max_size"] = max(n, self._stats["max_size"])
+            self._process(batch)
@@ -0,0 +1,138 @@
+"""
+Resolution of overlapping analyzer results
+"""
+
+from bisect import bisect_left
+from operator import attrgetter
+
+from typing import List, Dict, Union, Callable, Iterable
+
+from pii_data.helper.exception import ConfigException
+
+
+def _policy_key(policy: str, priority: List[str] = None) -> Callable:
+    """
+    Return the sort key implementing an overlap resolution policy (results
+    sorting first are preferred)
+    """
+    if policy == "score":
+        return lambda r: (-r.score, r.start - r.end, r.start)
+    elif policy == "length":
+        return lambda r: (r.start - r.end, -r.score, r.start)
+    elif policy == "priority":
+        if not priority:
+            raise ConfigException("overlap policy 'priority' needs a priority list")
+        rank = {e: n for n, e in enumerate(priority)}
+        last = len(rank)
+        return lambda r: (rank.get(r.entity_type, last), -r.score,
+                          r.start - r.end, r.start)
+    raise ConfigException("unknown overlap policy: {}", policy)
+
+
+class _SpanIndex:
+    """
+    A set of disjoint spans, indexed by start position. Start positions are
+    known in advance, so they are compressed into a Fenwick tree: both adding
+    a span and checking for an overlap take O(log n)
+    """
+
+    def __init__(self, positions: Iterable[int]):
+        self._pos = sorted(set(positions))
+        self._size = len(self._pos)
+        self._tree = [0]*(self._size + 1)
+        self._end = [None]*self._size
+        self._top = 1 << self._size.bit_length()
+
+
+    def _count(self, idx: int) -> int:
+        """
+        Number of spans starting at the first `idx` positions
+        """
+        num = 0
+        while idx > 0:
+            num += self._tree[idx]
+            idx -= idx & -idx
+        return num
+
+
+    def _find(self, k: int) -> int:
+        """
+        Position index of the k-th span (1-based), by start position
+        """
+        idx, step = 0, self._top
+        while step:
+            nxt = idx + step
+            if nxt <= self._size and self._tree[nxt] < k:
+                idx = nxt
+                k -= self._tree[nxt]
+            step >>= 1
+        return idx
+
+
+    def overlaps(self, start: int, end: int) -> bool:
+        """
+        Check if a span overlaps any span in the index. Since they are
+        disjoint, only the last one starting before `end` needs checking
+        """
+        k = self._count(bisect_left(self._pos, max(end, start + 1)))
+        return k > 0 and self._end[self._find(k)] > start
+
+
+    def add(self, start: int, end: int):
+        """
+        Add a span to the index
+        """
+        idx = bisect_left(self._pos, start)
+        prev = self._end[idx]
+        self._end[idx] = end if prev is None else max(prev, end)
+        idx += 1
+        while idx <= self._size:
+            self._tree[idx] += 1
+            idx += idx & -idx
+
+
+def resolve_overlaps(results: List, policy: str = "score",
+                     priority: List[str] = None) -> List:
+    """
+    Remove overlapping results, keeping the preferred one in each conflict
+     :param results: analyzer results (objects with `start`, `end`, `score`
+       and `entity_type` attributes)
+     :param policy: the preference policy:
+        - `score`: highest score wins (ties are resolved by length)
+        - `length`: longest span wins (ties are resolved by score)
+        - `priority`: the entity type that comes first in the priority list
+          wins (ties are resolved by score, then by length)
+     :param priority: list of entity types, by decreasing priority
+     :return: the surviving results, sorted by position
+
+    Results are considered in order of preference, and each one is kept if it
+    does not overlap the ones already kept. Kept spans are held in an index
+    with logarithmic checks & insertions, so the whole process is O(n log n).
+    """
+    if len(results) < 2:
+        return list(results)
+
+    index = _SpanIndex(r.start for r in results)
+    kept = []
+    for r in sorted(results, key=_policy_key(policy, priority)):
+        if not index.overlaps(r.start, r.end):
+            index.add(r.start, r.end)
+            kept.append(r)
+
+    return sorted(kept, key=attrgetter("start"))
+
+
+def overlap_resolver(config: Union[str, Dict, None]) -> Callable:
+    """
+    Create an overlap resolution function from its configuration, which can
+    be either a policy name or a dict with `policy` & `priority` fields.
+    Return None if there is no configuration
+    """
+    if not config:
+        return None
+    if isinstance(config, str):
+        config = {"policy": config}
+    policy = config.get("policy", "score")
+    priority = config.get("priority")
+    _policy_key(policy, priority)       # validate the configuration
+    return lambda results: resolve_overlaps(results, policy, priority)
@@ -0,0 +1,150 @@
+"""
+Cheap pre-screening of texts: each Presidio entity has a necessary condition
+on the text (e.g. a capitalized word for NER entities, a digit for ID
+numbers), and texts where no condition holds for any of the requested
+entities skip analysis
+"""
+
+import re
+import threading
+
+from typing import Dict, List, Callable, Union, Iterable, Tuple
+
+from pii_data.helper.exception import ConfigException
+
+from .daemon import TYPE_REQUEST
+
+
+_DIGIT = re.compile(r"\d")
+_ALNUM = re.compile(r"[^\W\d_]\d|\d[^\W\d_]")
+_LETTERS = re.compile(r"[^\W\d_]{2}")
+
+# The available conditions
+CONDITIONS = {
+    "always": lambda text: True,
+    "capitalized": lambda text: text != text.lower(),
+    "letters": lambda text: _LETTERS.search(text) is not None,
+    "digits": lambda text: _DIGIT.search(text) is not None,
+    "alnum": lambda text: _ALNUM.search(text) is not None,
+    "email": lambda text: "@" in text,
+}
+
+# Default condition for each Presidio entity (entities not here are
+# always analyzed)
+DEFAULT_CONDITIONS = {
+    "PERSON": "capitalized",
+    "LOCATION": "capitalized",
+    "ORGANIZATION": "capitalized",
+    "NRP": "capitalized",
+    "EMAIL_ADDRESS": "email",
+    "PHONE_NUMBER": "digits",
+    "CREDIT_CARD": "digits",
+    "IBAN_CODE": "alnum",
+    "US_PASSPORT": "digits",
+    "US_DRIVER_LICENSE": "digits",
+    "US_SSN": "digits",
+    "IT_FISCAL_CODE": "alnum",
+    "IT_IDENTITY_CARD": "digits",
+    "IT_DRIVER_LICENSE": "alnum",
+    "ES_NIF": "digits",
+    "ES_NIE": "digits",
+}
+
+
+def run_selected(requests: List[TYPE_REQUEST], selected: List[int],
+                 analyze: Callable) -> List[List]:
+    """
+    Analyze only a selection of the requests
+      :param requests: list of (text, language, entities) tuples
+      :param selected: the indexes of the requests to analyze
+      :param analyze: the function to call the analyzer
+      :return: the results for each request (an empty list for the ones
+        not selected)
+    """
+    if len(selected) == len(requests):
+        return analyze(requests)
+    results = [[] for _ in requests]
+    if selected:
+        for n, res in zip(selected, analyze([requests[n] for n in selected])):
+            results[n] = res
+    return results
+
+
+class Prescreen:
+    """
+    Skip the analysis of texts that cannot contain any of their entities,
+    and keep statistics on the skip rate
+    """
+
+    def __init__(self, config: Union[bool, Dict]):
+        """
+          :param config: the pre-screening configuration: either True (use
+            the default conditions) or a dict with a `conditions` field,
+            a dict of conditions by entity that update the defaults
+        """
+        if not isinstance(config, dict):
+            config = {}
+        self.conditions = {**DEFAULT_CONDITIONS,
+                           **config.get("conditions", {})}
+        for ent, cond in self.conditions.items():
+            if cond not in CONDITIONS:
+                raise ConfigException("unknown prescreen condition for {}: {}",
+                                      ent, cond)
+        self._checks = {}
+        self._lock = threading.Lock()
+        self._chunks = self._skipped = 0
+
+
+    def __repr__(self) -> str:
+        return f"<Prescreen #{len(self.conditions)}>"
+
+
+    def checks(self, entities: Iterable[str]) -> Tuple[Callable, ...]:
+        """
+        Return the condition functions for a list of entities (an empty
+        tuple if some entity must always be analyzed)
+        """
+        key = tuple(entities)
+        checks = self._checks.get(key)
+        if checks is None:
+            names = {self.conditions.get(e, "always") for e in key}
+            checks = () if "always" in names else \
+                tuple(CONDITIONS[n] for n in sorted(names))
+            self._checks[key] = checks
+        return checks
+
+
+    def keep(self, text: str, entities: Iterable[str]) -> bool:
+        """
+        Check if a text needs analysis for a list of entities
+        """
+        checks = self.checks(entities)
+        return not checks or any(check(text) for check in checks)
+
+
+    def run(self, requests: List[TYPE_REQUEST],
+            analyze: Callable) -> List[List]:
+        """
+        Analyze the texts that pass the screening
+          :param requests: list of (text, language, entities) tuples
+          :param analyze: the function to call the analyzer
+          :return: the results for each request (an empty list for the
+            skipped ones)
+        """
+        selected = [n for n, (text, _, entities) in enumerate(requests)
+                    if self.keep(text, entities)]
+        with self._lock:
+            self._chunks += len(requests)
+            self._skipped += len(requests) - len(selected)
+        return run_selected(requests, selected, analyze)
+
+
+    def stats(self) -> Dict:
+        """
+        Return the number of texts processed, and how many of them were
+        skipped
+        """
+        with self._lock:
+            chunks, skipped = self._chunks, self._skipped
+        return {"chunks": chunks, "skipped": skipped,
+                "rate": skipped/chunks if chunks else 0}
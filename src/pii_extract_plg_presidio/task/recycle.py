@@ -0,0 +1,255 @@
+"""
+Recycling of cached analyzer engines, to bound memory growth in long-running
+processes: the spaCy vocabulary (and its StringStore) keeps every new token
+seen, so an engine grows for as long as it is used. After a number of
+analyzed texts, a growth in StringStore size, or a growth in process RSS,
+the engine is rebuilt (by default in a background thread) and the new one
+is swapped into the engine cache
+"""
+
+import gc
+import time
+import threading
+from collections import deque
+
+from typing import Dict, List, Callable, Optional, Union
+
+from pii_data.helper.exception import ConfigException
+from pii_extract.helper.logger import PiiLogger
+
+from .utils import current_rss
+from . import tracing
+
+
+# Configuration fields, and their default values
+_DEFAULTS = {
+    "max_chunks": None,
+    "max_strings": None,
+    "max_rss": None,
+    "check_interval": 100,
+    "background": True,
+    "max_events": 100
+}
+
+
+def string_store_size(engine) -> Optional[int]:
+    """
+    Return the total number of entries in the StringStores of the spaCy
+    pipelines in an engine, or None if it does not use spaCy pipelines
+    """
+    try:
+        return sum(len(nlp.vocab.strings)
+                   for nlp in engine.nlp_engine.nlp.values())
+    except (AttributeError, TypeError):
+        return None
+
+
+class EngineRecycler:
+    """
+    Track the use of a cached engine, and replace it with a fresh one when
+    the recycling policy says so
+    """
+
+    def __init__(self, key: str, config: Union[bool, Dict], engine,
+                 rebuild: Callable, install: Callable,
+                 logger: PiiLogger = None):
+        """
+          :param key: the engine cache key
+          :param config: the recycling configuration: a dict with the
+            thresholds (`max_chunks`, `max_strings`, `max_rss`, in MB; the
+            last two are growths since the engine was built) and options
+            (`check_interval`, `background`, `max_events`)
+          :param engine: the current engine
+          :param rebuild: a function that builds a new engine (it receives
+            the current engine as argument)
+          :param install: a function that installs a new engine in the cache
+          :param logger: a logger instance
+        """
+        if not isinstance(config, dict):
+            raise ConfigException("invalid engine recycling config: {}", config)
+        unknown = set(config) - set(_DEFAULTS)
+        if unknown:
+            raise ConfigException("unknown engine recycling fields: {}",
+                                  sorted(unknown))
+        self.cfg = {**_DEFAULTS, **config}
+        if not any(self.cfg[k] for k in ("max_chunks", "max_strings", "max_rss")):
+            raise ConfigException("engine recycling needs max_chunks, max_strings or max_rss")
+
+        self.key = key
+        self._rebuild = rebuild
+        self._install = install
+        self._log = logger or PiiLogger(__name__, None)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.events = deque(maxlen=self.cfg["max_events"])
+        self.recycles = 0
+        self._reset(engine)
+
+
+    def __repr__(self) -> str:
+        return f"<EngineRecycler {self.key} #{self.recycles}>"
+
+
+    def _reset(self, engine):
+        self.engine = engine
+        self.chunks = 0
+        self._next_check = self.cfg["check_interval"]
+        self._strings0 = string_store_size(engine)
+        self._rss0 = current_rss() if self.cfg["max_rss"] else None
+
+
+    def strings_growth(self) -> Optional[int]:
+        """
+        Return the growth in StringStore entries since the engine was built
+        """
+        size = string_store_size(self.engine)
+        if size is None or self._strings0 is None:
+            return None
+        return size - self._strings0
+
+
+    def rss_growth(self) -> Optional[int]:
+        """
+        Return the growth in process RSS (in bytes) since the engine was
+        built, or None if the RSS threshold is not used
+        """
+        if self._rss0 is None:
+            return None
+        return current_rss() - self._rss0
+
+
+    def check(self) -> Optional[str]:
+        """
+        Check the recycling thresholds. The RSS threshold is relative to the
+        RSS after the last (re)build, since the RSS of the process does not
+        drop below what the interpreter and other engines hold: an absolute
+        limit, once passed, would trigger a rebuild at every check
+          :return: the reason for recycling, or None if not needed
+        """
+        cfg = self.cfg
+        if cfg["max_chunks"] and self.chunks >= cfg["max_chunks"]:
+            return "chunks"
+        if cfg["max_strings"]:
+            growth = self.strings_growth()
+            if growth is not None and growth >= cfg["max_strings"]:
+                return "strings"
+        if cfg["max_rss"] and self.rss_growth() >= cfg["max_rss"]*1024*1024:
+            return "rss"
+        return None
+
+
+    def record(self, chunks: int):
+        """
+        Record the analysis of a number of texts with the engine, and start a
+        recycle if a threshold has been reached. The StringStore and RSS
+        thresholds are checked only every `check_interval` texts
+        """
+        with self._lock:
+            self.chunks += chunks
+            if self._thread is not None:
+                return
+            max_chunks = self.cfg["max_chunks"]
+            if self.chunks < self._next_check \
+               and not (max_chunks and self.chunks >= max_chunks):
+                return
+            self._next_check = self.chunks + self.cfg["check_interval"]
+        reason = self.check()
+        if reason:
+            self.recycle(reason)
+
+
+    def recycle(self, reason: str = "manual", wait: bool = False):
+        """
+        Rebuild the engine and swap it in. Unless configured otherwise,
+        the rebuild happens in a background thread, and the current engine
+        keeps being used until the new one is ready
+          :param reason: the reason for recycling, for the event record
+          :param wait: wait for the new engine to be in place
+        """
+        with self._lock:
+            if self._thread is not None:
+                thread = self._thread
+            else:
+                thread = self._thread = threading.Thread(
+                    target=self._run, args=(reason,), daemon=True,
+                    name="presidio-recycle")
+                if self.cfg["background"]:
+                    thread.start()
+                else:
+                    thread = None
+        if thread is None:
+            self._run(reason)
+        elif wait:
+            thread.join()
+
+
+    def wait(self, timeout: float = None):
+        """
+        Wait for an ongoing recycle, if any, to finish
+        """
+        thread = self._thread
+        if thread is not None and thread.ident is not None:
+            thread.join(timeout)
+
+
+    def _run(self, reason: str):
+        """
+        Rebuild the engine, install it, and record the event
+        """
+        event = {"time": time.time(), "reason": reason, "chunks": self.chunks,
+                 "strings_growth": self.strings_growth(),
+                 "rss_before": current_rss()}
+        start = time.perf_counter()
+        try:
+            with tracing.span("presidio.engine.recycle",
+                              **{"presidio.engine_key": self.key,
+                                 "presidio.recycle_reason": reason}):
+                engine = self._rebuild(self.engine)
+                with self._lock:
+                    self._install(engine)
+                    self._reset(engine)
+                    self.recycles += 1
+            del engine
+            gc.collect()
+            event["rss_after"] = current_rss()
+            with self._lock:
+                if self._rss0 is not None:
+                    self._rss0 = event["rss_after"]
+        except Exception as e:
+            # Keep the current engine, and try again after another full period
+            event["error"] = f"{type(e).__name__}: {e}"
+            self._log(".. Presidio engine recycle failed: %s", event["error"])
+            with self._lock:
+                self._reset(self.engine)
+        finally:
+            event["elapsed"] = time.perf_counter() - start
+            with self._lock:
+                self.events.append(event)
+                self._thread = None
+        if "rss_after" in event:
+            self._log(".. Presidio engine recycled (%s): RSS %.1f MB -> %.1f MB",
+                      reason, event["rss_before"]/2**20, event["rss_after"]/2**20)
+
+
+    def stats(self) -> Dict:
+        """
+        Return the recycling statistics: number of recycles, usage of the
+        current engine, and the recent recycle events (with the process RSS
+        before and after each one)
+        """
+        with self._lock:
+            return {"key": self.key,
+                    "recycles": self.recycles,
+                    "chunks": self.chunks,
+                    "strings_growth": self.strings_growth(),
+                    "rss_growth": self.rss_growth(),
+                    "pending": self._thread is not None,
+                    "events": list(self.events)}
+
+
+def recycler_stats(recyclers: List[EngineRecycler]) -> Optional[List[Dict]]:
+    """
+    Return the statistics for a list of recyclers (None if there are none)
+    """
+    recyclers = [r for r in recyclers if r]
+    return [r.stats() for r in recyclers] if recyclers else None
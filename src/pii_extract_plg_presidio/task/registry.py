@@ -0,0 +1,76 @@
+"""
+Build a Presidio recognizer registry restricted to the Presidio entities
+actually used in the plugin configuration
+"""
+
+import hashlib
+
+from typing import Dict, Set, List, Tuple
+
+from presidio_analyzer import EntityRecognizer, RecognizerRegistry
+from presidio_analyzer.nlp_engine import NlpEngine
+
+from .collector import pii_list, presidio_entities
+
+
+def used_entities(config: Dict, langset: Set[str]) -> Dict[str, Set[str]]:
+    """
+    Compute the Presidio entities mapped in the plugin config, by language
+      :param config: the plugin config
+      :param langset: the languages loaded in the engine
+    """
+    return presidio_entities(pii_list(config, langset), langset)
+
+
+def entities_key(entities: Dict[str, Set[str]]) -> str:
+    """
+    Compute a short key identifying a set of entities by language
+    """
+    items = sorted(f"{lang}:{ent}" for lang, elist in entities.items()
+                   for ent in elist)
+    return hashlib.sha1(" ".join(items).encode()).hexdigest()[:12]
+
+
+def predefined_registry(languages: List[str],
+                        nlp_engine: NlpEngine) -> RecognizerRegistry:
+    """
+    Create a recognizer registry with all the predefined recognizers for a
+    set of languages, plus the NLP-based recognizer
+    """
+    try:
+        from presidio_analyzer.recognizer_registry import \
+            RecognizerRegistryProvider
+    except ImportError:
+        # Presidio versions before the registry provider
+        registry = RecognizerRegistry()
+        registry.load_predefined_recognizers(languages=languages,
+                                             nlp_engine=nlp_engine)
+        return registry
+    provider = RecognizerRegistryProvider(
+        registry_configuration={"supported_languages": languages})
+    registry = provider.create_recognizer_registry()
+    registry.add_nlp_recognizer(nlp_engine=nlp_engine)
+    return registry
+
+
+def pruned_registry(languages: List[str], entities: Dict[str, Set[str]],
+                    nlp_engine: NlpEngine) -> Tuple[RecognizerRegistry,
+                                                    List[EntityRecognizer]]:
+    """
+    Create a recognizer registry for a set of languages with only the
+    recognizers that can detect some of the given entities
+      :param languages: the languages supported by the registry
+      :param entities: the entities to keep, indexed by language
+      :param nlp_engine: the NLP engine (for the NLP-based recognizer)
+      :return: a tuple (registry, removed recognizers)
+    """
+    registry = predefined_registry(languages, nlp_engine)
+    keep, pruned = [], []
+    for rec in registry.recognizers:
+        wanted = entities.get(rec.supported_language, ())
+        if wanted and not wanted.isdisjoint(rec.supported_entities):
+            keep.append(rec)
+        else:
+            pruned.append(rec)
+    registry.recognizers = keep
+    return registry, pruned
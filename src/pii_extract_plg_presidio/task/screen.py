@@ -0,0 +1,110 @@
+"""
+Fast PII screening: decide if a text contains any PII, running the cheapest
+recognizers first and stopping at the first hit
+"""
+
+import time
+import threading
+
+from typing import Dict, List, Iterable
+
+from presidio_analyzer import AnalyzerEngine, EntityRecognizer
+from presidio_analyzer.predefined_recognizers import SpacyRecognizer
+
+
+def needs_nlp(recognizer: EntityRecognizer) -> bool:
+    """
+    Check if a recognizer needs the NLP artifacts (i.e. an NLP pipeline run)
+    """
+    return isinstance(recognizer, SpacyRecognizer)
+
+
+class RecognizerCosts:
+    """
+    Learn the cost of each recognizer, as an exponentially weighted moving
+    average of its execution time per character of text. Before having any
+    measurement, recognizers not needing NLP are assumed to be cheaper.
+    """
+
+    def __init__(self, alpha: float = 0.2):
+        """
+          :param alpha: weight of each new measurement in the average
+        """
+        self.alpha = alpha
+        self._cost = {}
+        self._lock = threading.Lock()
+
+
+    def __repr__(self) -> str:
+        return f"<RecognizerCosts #{len(self._cost)}>"
+
+
+    def cost(self, recognizer: EntityRecognizer) -> float:
+        """
+        Return the estimated cost (seconds/char) for a recognizer
+        """
+        cost = self._cost.get(recognizer.id)
+        if cost is None:
+            return float("inf") if needs_nlp(recognizer) else 0
+        return cost
+
+
+    def update(self, recognizer: EntityRecognizer, elapsed: float, size: int):
+        """
+        Add a new measurement for a recognizer
+          :param elapsed: the execution time, in seconds
+          :param size: the size of the processed text, in characters
+        """
+        value = elapsed / max(size, 1)
+        with self._lock:
+            old = self._cost.get(recognizer.id)
+            self._cost[recognizer.id] = value if old is None else \
+                old + self.alpha*(value - old)
+
+
+    def order(self, recognizers: Iterable[EntityRecognizer]) -> List[EntityRecognizer]:
+        """
+        Sort a list of recognizers by increasing cost
+        """
+        return sorted(recognizers, key=lambda r: (self.cost(r), r.name))
+
+
+    def asdict(self) -> Dict[str, float]:
+        return dict(self._cost)
+
+
+
+def contains_pii(analyzer: AnalyzerEngine, text: str, language: str,
+                 entities: List[str], costs: RecognizerCosts,
+                 min_score: float = 0) -> bool:
+    """
+    Check if a text contains any of a list of entities. Recognizers are run
+    by increasing cost, and the check stops at the first result with a score
+    of at least `min_score`. Note that scores are taken before context
+    enhancement (which can only increase them)
+      :param analyzer: the Presidio analyzer engine
+      :param text: the text to check
+      :param language: the text language
+      :param entities: the Presidio entities to look for
+      :param costs: the learnt recognizer costs (it will be updated)
+      :param min_score: the minimum score to consider a result as a hit
+    """
+    entset = set(entities)
+    recognizers = [r for r in analyzer.get_recognizers(language=language)
+                   if entset.intersection(r.supported_entities)]
+
+    nlp_artifacts = None
+    for rec in costs.order(recognizers):
+        start = time.perf_counter()
+        if not rec.is_loaded:
+            rec.load()
+            rec.is_loaded = True
+        if needs_nlp(rec) and nlp_artifacts is None:
+            nlp_artifacts = analyzer.nlp_engine.process_text(text, language)
+        results = rec.analyze(text=text, entities=entities,
+                              nlp_artifacts=nlp_artifacts)
+        costs.update(rec, time.perf_counter() - start, len(text))
+        if any(r.entity_type in entset and r.score >= min_score
+               for r in results or []):
+            return True
+    return False
@@ -0,0 +1,350 @@
+"""
+Compact binary serialization of batches of PII entities, for detection
+results that leave the process (to disk, to a process pool, to a socket).
+
+A batch is encoded as:
+  * a header: number of strings, number of entities, and sizes of the
+    string table, value and extra data blocks
+  * a string table, holding each distinct string used in the batch (entity
+    types, chunk ids, languages, etc) once, as length-prefixed UTF-8
+  * a fixed-size record for each entity, with indices into the string table,
+    position (64 bits, so that offsets in files larger than 4 GB fit),
+    score & language confidence (as doubles) and data lengths
+  * the entity values, as concatenated UTF-8
+  * the entity fields that do not fit the record (if any), as JSON
+
+A stream is a magic string (which includes the format version) followed by
+a sequence of length-prefixed batches. All integers are little-endian.
+"""
+
+import io
+import json
+import math
+import struct
+from pathlib import Path
+
+from typing import Dict, List, Iterable, Iterator, Union, BinaryIO, Tuple
+
+from pii_data.helper.exception import ProcException, InvArgException
+from pii_data.types import PiiEntity
+from pii_data.types.piientity import PiiEntityInfo, FIELDS_OPTIONAL
+from pii_data.types.piienum import PiiEnum
+
+
+MAGIC = b"PIIB\x02"
+
+_FRAME = struct.Struct("<I")
+_HEADER = struct.Struct("<5I")
+_STRLEN = struct.Struct("<I")
+# type, chunkid, lang, country, subtype, docid, detector, stage (string
+# table indices, 0 means None), pos, score, lang confidence, value size,
+# extra size
+_RECORD = struct.Struct("<8IQ2d2I")
+
+_NONE = float("nan")
+_PROCESS_KEYS = ("stage", "score", "lang_confidence")
+_RECORD_FIELDS = ("type", "value", "chunkid", "docid", "detector", "process")
+
+
+def _compact_process(process: Dict) -> bool:
+    """
+    Check if a process field can be stored in the entity record
+    """
+    keys = tuple(process)
+    if keys != _PROCESS_KEYS[:len(keys)] or not keys:
+        return False
+    if not isinstance(process["stage"], str):
+        return False
+    return all(isinstance(process[k], float) and not math.isnan(process[k])
+               for k in keys[1:])
+
+
+class _StringTable:
+
+    def __init__(self):
+        self.index = {}
+
+    def __call__(self, value: str) -> int:
+        if value is None:
+            return 0
+        idx = self.index.get(value)
+        if idx is None:
+            idx = self.index[value] = len(self.index) + 1
+        return idx
+
+    def tobytes(self) -> bytes:
+        out = bytearray()
+        for s in self.index:
+            data = s.encode("utf-8")
+            out += _STRLEN.pack(len(data))
+            out += data
+        return bytes(out)
+
+
+def pack_batch(entities: Iterable[PiiEntity]) -> bytes:
+    """
+    Encode a batch of PII entities
+      :param entities: the entities to encode
+      :return: the encoded batch
+    """
+    strings = _StringTable()
+    records = bytearray()
+    values = bytearray()
+    extra = bytearray()
+    num = 0
+    for pii in entities:
+        info, fields = pii.info, pii.fields
+        value = fields["value"].encode("utf-8")
+        rest = {k: v for k, v in fields.items() if k not in _RECORD_FIELDS}
+
+        # Process field: in the record, if it has the usual keys
+        process = fields.get("process")
+        stage, score, lconf = None, _NONE, _NONE
+        if process is not None:
+            if _compact_process(process):
+                stage = process["stage"]
+                score = process.get("score", _NONE)
+                lconf = process.get("lang_confidence", _NONE)
+            else:
+                rest["process"] = process
+
+        # Detector field: in the string table, as JSON
+        detector = fields.get("detector")
+        if detector is not None:
+            detector = json.dumps(detector, ensure_ascii=False)
+
+        # Non-string ids go to the extra data, to keep their type
+        chunkid, docid = fields["chunkid"], fields.get("docid")
+        if not isinstance(chunkid, str):
+            rest["chunkid"], chunkid = chunkid, None
+        if docid is not None and not isinstance(docid, str):
+            rest["docid"], docid = docid, None
+
+        rest = json.dumps(rest, ensure_ascii=False).encode("utf-8") if rest else b""
+        try:
+            records += _RECORD.pack(
+                strings(info.pii.name), strings(chunkid),
+                strings(info.lang), strings(info.country),
+                strings(info.subtype), strings(docid), strings(detector),
+                strings(stage), pii.pos, score, lconf, len(value), len(rest))
+        except struct.error as e:
+            raise ProcException("cannot encode PII entity at pos={}: {}",
+                                pii.pos, e) from e
+        values += value
+        extra += rest
+        num += 1
+
+    table = strings.tobytes()
+    try:
+        header = _HEADER.pack(len(strings.index), num, len(table),
+                              len(values), len(extra))
+    except struct.error as e:
+        raise ProcException("PII entity batch too large: {}", e) from e
+    return b"".join((header, table, records, values, extra))
+
+
+def unpack_batch(data: bytes) -> List[PiiEntity]:
+    """
+    Decode a batch of PII entities
+      :param data: the encoded batch
+      :return: the list of entities
+    """
+    try:
+        return list(_unpack(memoryview(data)))
+    except (struct.error, UnicodeDecodeError, ValueError, KeyError) as e:
+        raise ProcException("invalid PII entity batch: {}", e) from e
+
+
+def _unpack(data: memoryview) -> Iterator[PiiEntity]:
+    num_str, num, size_str, size_val, size_ext = _HEADER.unpack_from(data)
+    pos = _HEADER.size
+    size_rec = num*_RECORD.size
+    if len(data) != pos + size_str + size_rec + size_val + size_ext:
+        raise ValueError("size mismatch")
+
+    # String table
+    strings = [None]
+    end = pos + size_str
+    while pos < end:
+        n, = _STRLEN.unpack_from(data, pos)
+        pos += _STRLEN.size
+        strings.append(str(data[pos:pos+n], "utf-8"))
+        pos += n
+    if len(strings) != num_str + 1:
+        raise ValueError("string table mismatch")
+
+    # Records, values & extra fields
+    records = data[pos:pos+size_rec]
+    values = bytes(data[pos+size_rec:pos+size_rec+size_val])
+    extra = bytes(data[pos+size_rec+size_val:])
+    info_cache = {}
+    vpos = epos = 0
+    for (ptype, chunkid, lang, country, subtype, docid, detector, stage,
+         start, score, lconf, vsize, esize) in _RECORD.iter_unpack(records):
+
+        key = ptype, lang, country, subtype
+        info = info_cache.get(key)
+        if info is None:
+            info = info_cache[key] = PiiEntityInfo(
+                PiiEnum[strings[ptype]], strings[lang], strings[country],
+                strings[subtype])
+
+        value = values[vpos:vpos+vsize].decode("utf-8")
+        vpos += vsize
+        kwargs = {}
+        if docid:
+            kwargs["docid"] = strings[docid]
+        if detector:
+            kwargs["detector"] = json.loads(strings[detector])
+        if stage:
+            process = {"stage": strings[stage]}
+            if not math.isnan(score):
+                process["score"] = score
+            if not math.isnan(lconf):
+                process["lang_confidence"] = lconf
+            kwargs["process"] = process
+        if esize:
+            kwargs.update(json.loads(extra[epos:epos+esize]))
+            epos += esize
+
+        pii = PiiEntity(info, value, strings[chunkid], start, **kwargs)
+        for k, v in kwargs.items():
+            if k not in FIELDS_OPTIONAL:
+                pii.add_field(k, v)
+        yield pii
+
+
+# --------------------------------------------------------------------------
+
+
+def _open(dest: Union[str, Path, BinaryIO], mode: str) -> Tuple[BinaryIO, bool]:
+    if isinstance(dest, (str, Path)):
+        return open(dest, mode), True
+    return dest, False
+
+
+class BatchWriter:
+    """
+    Write a stream of PII entity batches to a binary file
+    """
+
+    def __init__(self, dest: Union[str, Path, BinaryIO]):
+        """
+          :param dest: a filename, or a binary file object
+        """
+        self._out, self._owned = _open(dest, "wb")
+        self._out.write(MAGIC)
+        self.batches = self.entities = 0
+
+
+    def __repr__(self) -> str:
+        return f"<BatchWriter #{self.batches}>"
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+
+
+    def write(self, entities: Iterable[PiiEntity]) -> int:
+        """
+        Write a batch of entities
+          :return: the number of entities written
+        """
+        if not isinstance(entities, (list, tuple)):
+            entities = list(entities)
+        data = pack_batch(entities)
+        self._out.write(_FRAME.pack(len(data)))
+        self._out.write(data)
+        self.batches += 1
+        self.entities += len(entities)
+        return len(entities)
+
+
+    def close(self):
+        if self._owned:
+            self._out.close()
+        else:
+            self._out.flush()
+
+
+class BatchReader:
+    """
+    Read a stream of PII entity batches from a binary file
+    """
+
+    def __init__(self, src: Union[str, Path, BinaryIO]):
+        """
+          :param src: a filename, or a binary file object
+        """
+        self._in, self._owned = _open(src, "rb")
+        magic = self._in.read(len(MAGIC))
+        if magic != MAGIC:
+            self.close()
+            if magic[:-1] == MAGIC[:-1]:
+                raise InvArgException("unsupported PII entity batch stream version: {}",
+                                      magic[-1])
+            raise InvArgException("not a PII entity batch stream")
+
+
+    def __repr__(self) -> str:
+        return "<BatchReader>"
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+
+
+    def __iter__(self) -> Iterator[List[PiiEntity]]:
+        """
+        Iterate over the batches in the stream
+        """
+        while True:
+            head = self._in.read(_FRAME.size)
+            if not head:
+                return
+            if len(head) != _FRAME.size:
+                raise ProcException("truncated PII entity batch stream")
+            size, = _FRAME.unpack(head)
+            data = self._in.read(size)
+            if len(data) != size:
+                raise ProcException("truncated PII entity batch stream")
+            yield unpack_batch(data)
+
+
+    def entities(self) -> Iterator[PiiEntity]:
+        """
+        Iterate over all the entities in the stream
+        """
+        for batch in self:
+            yield from batch
+
+
+    def close(self):
+        if self._owned:
+            self._in.close()
+
+
+def dumps(batches: Iterable[Iterable[PiiEntity]]) -> bytes:
+    """
+    Encode a sequence of batches as a stream, in memory
+    """
+    buf = io.BytesIO()
+    writer = BatchWriter(buf)
+    for batch in batches:
+        writer.write(batch)
+    return buf.getvalue()
+
+
+def loads(data: bytes) -> List[List[PiiEntity]]:
+    """
+    Decode a stream of batches from memory
+    """
+    return list(BatchReader(io.BytesIO(data)))
@@ -3,20 +3,28 @@ The Presidio-based PiiTask
 """
 
 import logging
+import threading
+from functools import partial
 from operator import attrgetter
 from collections import defaultdict
 
 from pii_data.helper.exception import ProcException, ConfigException
 from pii_data.types import PiiEntity, PiiEntityInfo
+from pii_data.types.piienum import PiiEnum
 from pii_data.types.doc import DocumentChunk
 from pii_extract.build.task import BaseMultiPiiTask
 from pii_extract.helper.utils import taskd_field
 from pii_extract.helper.logger import PiiLogger
 
-from typing import Iterable, Dict, List
+from typing import Iterable, Dict, List, Union, Tuple, Optional, Callable
 
-from .. import VERSION
+from .. import VERSION, defs
 from .utils import hf_cachedir
+from .daemon import TYPE_REQUEST
+from .overlap import overlap_resolver
+from .coalesce import Coalescer
+from .prescreen import Prescreen, run_selected
+from . import tracing
 
 
 
@@ -28,6 +36,17 @@ def einfo(p: Dict) -> PiiEntityInfo:
                          p.get("subtype"))
 
 
+# A PII filter: PII type names and/or Presidio entity names
+TYPE_FILTER = Union[str, Iterable[str]]
+
+# Maximum number of PII filters to keep resolved
+MAX_FILTERS = 1024
+
+# Task attributes kept when pickling a task (the rest are rebuilt from them)
+_PICKLED = ("task_info", "context", "method", "_pii_info", "_ent_map", "lang",
+            "_log", "_cfg", "_model_lang")
+
+
 # ---------------------------------------------------------------------
 
 
@@ -76,27 +95,361 @@ class PresidioTask(BaseMultiPiiTask):
         self._log(".. PresidioTask (%s): lang=%s tasks=#%d", VERSION,
                   self.lang, len(pii))
 
+        # Set up the task components
+        self._cfg = cfg
+        self._model_lang = model_lang
+        self._setup_components(cfg)
+
+        # Set up the Presidio Analyzer engine(s)
+        with tracing.span("presidio.task.init",
+                          **{"presidio.languages": sorted(pii_lang),
+                             "presidio.entity_count": len(self)}):
+            self._setup_engines(cfg)
+
+
+    def _setup_components(self, cfg: Dict):
+        """
+        Set up the task components, other than the analyzer engines, as
+        defined by the plugin configuration
+        """
         # Define cache directory for HuggingFace, just in case we use Transformers
         cachedir = cfg.get("cachedir")
         if cachedir is not False:
             hf_cachedir(cachedir)
 
-        # Set up the Presidio Analyzer engine
+        # Optional tracing
+        task_cfg = cfg.get(defs.CFG_TASK) or {}
+        tracing.configure_tracing(task_cfg.get(defs.CFG_TRACING))
+
+        # Optional postprocessing of analyzer results
+        self._overlap = overlap_resolver(task_cfg.get(defs.CFG_OVERLAP))
+
+        # Optional coalescing of small chunks in batch processing
+        coalesce = task_cfg.get(defs.CFG_COALESCE)
+        self._coalesce = Coalescer(coalesce) if coalesce else None
+
+        # Optional pre-screening, to skip texts that cannot contain PII
+        prescreen = task_cfg.get(defs.CFG_PRESCREEN)
+        self._prescreen = Prescreen(prescreen) if prescreen else None
+
+        # Optional language identification, for chunks without a language
+        langid = task_cfg.get(defs.CFG_LANGID)
+        self._langid = None
+        if langid and self.lang is None:
+            from .langid import LangIdentifier
+            self._langid = LangIdentifier(self._engine_entities(), langid)
+
+        # Names accepted in PII filters: PII types, plus the Presidio entities
+        # in the task (for any language)
+        self._filter_names = frozenset(
+            [p.name for p in PiiEnum] +
+            [pname for emap in self._ent_map.values() for pname in emap])
+
+        # Lazily built state: recognizer costs & resolved PII filters (with
+        # a lock for their updates)
+        self._costs = None
+        self._filters = {}
+        self._lock = threading.Lock()
+        # Lock to bind the engines of an unpickled task (None when bound)
+        self._bind_lock = None
+
+
+    def _setup_engines(self, cfg: Dict):
+        """
+        Set up the Presidio Analyzer engine: either in the analyzer daemon,
+        if configured & available, or in-process. Plus the second-tier
+        engine, if there is a cascade
+        """
+        self.analyzer = self._remote = None
+        self._recycler = self._recycler2 = None
+        daemon_cfg = cfg.get(defs.CFG_ENGINE, {}).get(defs.CFG_DAEMON)
+        if daemon_cfg:
+            self._remote = self._remote_analyzer(daemon_cfg, cfg)
+        if self._remote is None:
+            self.analyzer = self._local_analyzer(cfg)
+            self._recycler = self._engine_recycler(cfg)
+
+        # Check that all Presidio entities we want are actually supported
+        self._check_entities(self._remote or self.analyzer)
+
+        # Optional second-tier analyzer, for cascade detection
+        self._cascade = self._cfg2 = self.analyzer2 = self._remote2 = None
+        cascade_cfg = cfg.get(defs.CFG_ENGINE, {}).get(defs.CFG_CASCADE)
+        if cascade_cfg:
+            from .cascade import Cascade, cascade_config
+            self._cascade = Cascade(cascade_cfg)
+            self._cfg2 = cascade_config(cfg)
+            if self._remote:
+                self._remote2 = self._remote_analyzer(daemon_cfg, self._cfg2)
+            if self._remote2 is None:
+                self.analyzer2 = self._local_analyzer(self._cfg2)
+                self._recycler2 = self._engine_recycler(self._cfg2)
+            self._check_entities(self._remote2 or self.analyzer2,
+                                 self._cascade.entities,
+                                 self._cascade.languages)
+
+
+    def __getstate__(self) -> Dict:
+        """
+        Pickle the task as a lightweight handle: the engine key, the entity
+        map, the language and the config. Analyzer engines (and connections
+        to the daemon) are left out, and are rebound on first use in the
+        destination process
+        """
+        from .analyzer import engine_key
+        state = {k: self.__dict__[k] for k in _PICKLED}
+        state["_engine_key"] = engine_key(self._cfg, self._model_lang,
+                                          self._engine_entities())
+        return state
+
+
+    def __setstate__(self, state: Dict):
+        """
+        Restore a pickled task. Components are rebuilt from the config, but
+        engines are bound lazily
+        """
+        self.__dict__.update(state)
+        self._setup_components(self._cfg)
+        self.analyzer = self.analyzer2 = self._remote = self._remote2 = None
+        self._cascade = self._cfg2 = self._recycler = self._recycler2 = None
+        self._bind_lock = threading.Lock()
+
+
+    def _bind(self, cached: bool = False) -> bool:
+        """
+        Bind an unpickled task to the analyzer engine(s) in this process: the
+        engine in the engine cache, if there is one, or else new engines
+          :param cached: bind only to an engine already in the cache
+          :return: True if the task is bound
+        """
+        lock = self._bind_lock
+        if lock is None:
+            return True
+        with lock:
+            if self._bind_lock is None:
+                return True
+            engine_cfg = self._cfg.get(defs.CFG_ENGINE, {})
+            engine = None
+            if not (engine_cfg.get(defs.CFG_DAEMON)
+                    or engine_cfg.get(defs.CFG_CASCADE)):
+                from .analyzer import ENGINE_CACHE
+                engine = ENGINE_CACHE.get(self._engine_key)
+            if engine is not None:
+                self._log(".. PresidioTask: bound to cached engine %s",
+                          self._engine_key)
+                self.analyzer = engine
+                self._recycler = self._engine_recycler(self._cfg)
+            elif cached:
+                return False
+            else:
+                self._setup_engines(self._cfg)
+            self._bind_lock = None
+        return True
+
+
+    def _check_entities(self, engine, entities: Iterable[str] = None,
+                        languages: Iterable[str] = None):
+        """
+        Check that the Presidio entities used by the task (or a subset of them)
+        are supported by an analyzer engine
+          :param entities: check only these entities
+          :param languages: check only the entities for these languages
+        """
+        supported = set(engine.get_supported_entities())
+        missing = {pname for lang, edict in self._ent_map.items()
+                   if languages is None or lang in languages
+                   for pname in edict
+                   if pname not in supported
+                   and (entities is None or pname in entities)}
+        if missing:
+            raise ProcException("recognizer for {} not found in Presidio",
+                                missing)
+
+
+    def _local_analyzer(self, cfg: Dict):
+        """
+        Create (or fetch from the cache) an in-process analyzer engine
+        """
         try:
             from .analyzer import presidio_analyzer
-            self.analyzer = presidio_analyzer(cfg, languages=model_lang,
-                                              logger=self._log)
+            return presidio_analyzer(cfg, languages=self._model_lang,
+                                     logger=self._log,
+                                     entities=self._engine_entities())
         except Exception as e:
             raise ProcException("cannot create Presidio Analyzer engine: {}",
                                 e) from e
 
-        # Check that all Presidio entities we want are actually supported
-        entities = set(self.analyzer.get_supported_entities())
-        missing = {pname for edict in self._ent_map.values() for pname in edict
-                   if pname not in entities}
-        if missing:
-            raise ProcException("recognizer for {} not found in Presidio",
-                                missing)
+
+    def _engine_recycler(self, cfg: Dict):
+        """
+        Return the recycler for the in-process engine of a configuration, if
+        engine recycling is configured
+        """
+        from .analyzer import engine_recycler
+        return engine_recycler(cfg, self._model_lang, self._engine_entities())
+
+
+    def _remote_analyzer(self, daemon_cfg: Union[bool, Dict], cfg: Dict):
+        """
+        Connect to an engine in the analyzer daemon. Return None if the
+        daemon is not available
+        """
+        from .daemon import daemon_client, RemoteAnalyzer, DaemonUnavailable
+        if not isinstance(daemon_cfg, dict):
+            daemon_cfg = {}
+        client = daemon_client(daemon_cfg.get("socket"),
+                               pool_size=daemon_cfg.get("pool_size", 4),
+                               timeout=daemon_cfg.get("timeout"))
+        try:
+            remote = RemoteAnalyzer(client, cfg, self._model_lang,
+                                    self._engine_entities(),
+                                    daemon_cfg.get("batch_size", 32))
+            self._log(".. Using Presidio daemon at %s", client.socket_path)
+            return remote
+        except DaemonUnavailable as e:
+            self._log(".. Presidio daemon not available, using in-process engine: %s", e)
+            return None
+
+
+    def _engine_entities(self) -> Dict[str, List[str]]:
+        """
+        Return the Presidio entities used by the task, indexed by language
+        (only for the languages loaded in the engine)
+        """
+        return {lang: list(emap) for lang, emap in self._ent_map.items()
+                if not self._model_lang or lang in self._model_lang}
+
+
+    def _analyze(self, requests: List[TYPE_REQUEST],
+                 tier2: bool = False) -> List[List]:
+        """
+        Call the analyzer over a list of texts
+          :param requests: list of (text, language, entities) tuples
+          :param tier2: use the second-tier analyzer of the cascade
+          :return: the list of analyzer results for each text
+        """
+        remote = self._remote2 if tier2 else self._remote
+        if remote:
+            from .daemon import DaemonUnavailable
+            try:
+                with tracing.span("presidio.daemon",
+                                  **{"presidio.chunk_count": len(requests)}):
+                    return remote.analyze_batch(requests)
+            except DaemonUnavailable as e:
+                self._log(".. Presidio daemon lost, using in-process engine: %s", e)
+                if self._remote:
+                    self.analyzer = self._local_analyzer(self._cfg)
+                    self._recycler = self._engine_recycler(self._cfg)
+                if self._remote2:
+                    self.analyzer2 = self._local_analyzer(self._cfg2)
+                    self._recycler2 = self._engine_recycler(self._cfg2)
+                self._remote = self._remote2 = None
+        analyzer, recycler = self._current_engine(tier2)
+        if tracing.enabled():
+            results = [self._analyze_traced(analyzer, *req) for req in requests]
+        else:
+            from .analyzer import analyze_batch
+            results = analyze_batch(analyzer, requests)
+        if recycler:
+            recycler.record(len(requests))
+        return results
+
+
+    def _current_engine(self, tier2: bool = False) -> Tuple:
+        """
+        Return the in-process analyzer engine to use, and its recycler (if
+        any). If the engine has been recycled, switch to the new one
+        """
+        analyzer = self.analyzer2 if tier2 else self.analyzer
+        recycler = self._recycler2 if tier2 else self._recycler
+        if recycler and recycler.engine is not analyzer:
+            analyzer = recycler.engine
+            if tier2:
+                self.analyzer2 = analyzer
+            else:
+                self.analyzer = analyzer
+        return analyzer, recycler
+
+
+    @staticmethod
+    def _analyze_traced(analyzer, text: str, lang: str,
+                        entities: List[str]) -> List:
+        """
+        Call an in-process analyzer, with separate tracing spans for the NLP
+        pipeline and for the recognizers
+        """
+        attr = {"presidio.lang": lang, "presidio.chunk_length": len(text)}
+        with tracing.span("presidio.nlp", **attr):
+            artifacts = analyzer.nlp_engine.process_text(text, lang)
+        with tracing.span("presidio.recognizers", **attr) as sp:
+            results = analyzer.analyze(text=text, language=lang,
+                                       entities=entities,
+                                       nlp_artifacts=artifacts) or []
+            sp.set_attribute("presidio.result_count", len(results))
+        return results
+
+
+    def _detect(self, requests: List[TYPE_REQUEST]) -> List[List]:
+        """
+        Perform detection over a list of texts, using the cascade if defined
+        """
+        self._bind()
+        try:
+            results = self._analyze(requests)
+            if self._cascade:
+                results = self._cascade.run(
+                    requests, results, lambda r: self._analyze(r, tier2=True))
+            return results
+        except Exception as e:
+            raise ProcException("Presidio exception: {}: {}", type(e).__name__,
+                                e) from e
+
+
+    def _prescreened(self, requests: List[TYPE_REQUEST],
+                     detect: Callable) -> List[List]:
+        """
+        Perform detection over a list of texts, skipping the ones with no
+        entities to detect (after PII filtering) and the ones that do not
+        pass pre-screening (if configured)
+        """
+        analyze = partial(self._prescreen.run, analyze=detect) \
+            if self._prescreen else detect
+        selected = [n for n, (_, _, entities) in enumerate(requests)
+                    if entities]
+        return run_selected(requests, selected, analyze)
+
+
+    def _request_entities(self, chunk: DocumentChunk, lang: str,
+                          pii_filter: TYPE_FILTER = None) -> List[str]:
+        """
+        Return the Presidio entities to detect in a chunk: the ones mapped for
+        its language, restricted by the PII filter given as argument and by
+        the one in the chunk context (if any). A filter is a list of Presidio
+        entity names and/or PII type names; unknown names raise an error
+        """
+        ctx_filter = (chunk.context or {}).get(defs.CTX_FILTER)
+        if pii_filter is None and ctx_filter is None:
+            return list(self._ent_map[lang])
+
+        filters = tuple(None if f is None else
+                        frozenset([f] if isinstance(f, str) else f)
+                        for f in (pii_filter, ctx_filter))
+        key = (lang,) + filters
+        entities = self._filters.get(key)
+        if entities is None:
+            unknown = {name for f in filters if f
+                       for name in f} - self._filter_names
+            if unknown:
+                raise ProcException("unknown PII type or Presidio entity in PII filter: {}",
+                                    ", ".join(sorted(unknown)))
+            entities = [pname for pname, info in self._ent_map[lang].items()
+                        if all(f is None or pname in f or info.pii.name in f
+                               for f in filters)]
+            with self._lock:
+                if len(self._filters) >= MAX_FILTERS:
+                    self._filters.clear()
+                self._filters[key] = entities
+        return list(entities)
 
 
     def __repr__(self) -> str:
@@ -107,38 +460,242 @@ class PresidioTask(BaseMultiPiiTask):
         return sum(len(k) for k in self._ent_map.values())
 
 
-    def find(self, chunk: DocumentChunk) -> Iterable[PiiEntity]:
+    def warmup(self) -> Dict[str, float]:
         """
-        Perform PII detection on a document chunk
+        Warm up the analyzer engine by running dummy texts through it, for
+        all the languages & entities in the task
+          :return: a dict with the warm-up time (in seconds) for each language
+        """
+        from .analyzer import warmup_analyzer
+        self._bind()
+        timings = {}
+        for remote, analyzer in ((self._remote, self.analyzer),
+                                 (self._remote2, self.analyzer2)):
+            if remote:
+                t = remote.warmup      # the daemon warms up its engines
+            elif analyzer:
+                t = warmup_analyzer(analyzer, self._engine_entities(),
+                                    logger=self._log)
+            else:
+                continue
+            for lang, secs in t.items():
+                timings[lang] = timings.get(lang, 0) + secs
+        return timings
+
+
+    def ready(self) -> bool:
+        """
+        Check if the analyzer engine has been warmed up for all task languages
+        """
+        from .analyzer import is_warm
+        if not self._bind(cached=True):
+            return False
+        langs = self._engine_entities()
+        return all(remote or is_warm(analyzer, langs)
+                   for remote, analyzer in ((self._remote, self.analyzer),
+                                            (self._remote2, self.analyzer2))
+                   if remote or analyzer)
+
+
+    def chunk_language(self, chunk: DocumentChunk) -> Tuple[str, Optional[float]]:
+        """
+        Decide the language we'll pass to Presidio: chunk language, or task
+        default, or (if configured) the language identified from the text
+          :return: a tuple (language, confidence), where confidence is None
+            if the language was not identified from the text
         """
-        # Decide the language we'll pass to Presidio: chunk language or default
         ctx = chunk.context or {}
         lang = ctx.get("lang", self.lang)
+        confidence = None
+        if lang is None and self._langid:
+            lang, confidence = self._langid.identify(chunk.data)
+            if lang is None:
+                raise ProcException("Presidio task exception: cannot identify language for chunk {} (confidence={:.3f})",
+                                    chunk.id, confidence)
         if lang is None:
             raise ProcException("Presidio task exception: no language defined in task or document chunk")
         elif lang not in self._ent_map:
             raise ProcException("Presidio task exception: no tasks for lang: {}",
                                 lang)
+        return lang, confidence
 
-        # Take the entity map for our language
-        entity_map = self._ent_map[lang]
-        #print("LANG", lang, "DATA", chunk.data, entity_map)
 
-        # Call Presidio analyzer to get results
-        try:
-            results = self.analyzer.analyze(text=chunk.data, language=lang,
-                                            entities=list(entity_map))
-        except Exception as e:
-            raise ProcException("Presidio exception: {}: {}", type(e).__name__,
-                                e) from e
+    def _lang(self, chunk: DocumentChunk) -> str:
+        return self.chunk_language(chunk)[0]
 
+
+    def _entities(self, results: List, chunk: DocumentChunk,
+                  lang: str, lang_conf: float = None) -> Iterable[PiiEntity]:
+        """
+        Convert Presidio results into PiiEntity objects
+        """
         self._log("... Presidio results: %s", results if results else "NONE",
                   level=logging.DEBUG)
         #print("\n**** PRESIDIO", lang, list(self._ent_map), chunk.data, "=>", results, sep="\n")
 
-        # Convert results into PiEntity objects
+        # Remove overlapping results, if so configured
+        if self._overlap:
+            results = self._overlap(results)
+
+        # Take the entity map for our language
+        entity_map = self._ent_map[lang]
         for r in sorted(results, key=attrgetter("start")):
             v = chunk.data[r.start:r.end]
             process = {"stage": "detection", "score": r.score}
+            if lang_conf is not None:
+                process["lang_confidence"] = lang_conf
             yield PiiEntity(entity_map[r.entity_type],
                             v, chunk.id, r.start, process=process)
+
+
+    def find(self, chunk: DocumentChunk,
+             pii_filter: TYPE_FILTER = None) -> Iterable[PiiEntity]:
+        """
+        Perform PII detection on a document chunk
+          :param chunk: the document chunk to analyze
+          :param pii_filter: detect only these PII types or Presidio entities
+            (in addition to the filter in the chunk context, if any)
+        """
+        lang, lang_conf = self.chunk_language(chunk)
+        with tracing.span("presidio.find",
+                          **{"presidio.lang": lang,
+                             "presidio.chunk_length": len(chunk.data)}) as sp:
+
+            # Call Presidio analyzer to get results
+            entities = self._request_entities(chunk, lang, pii_filter)
+            results = self._prescreened([(chunk.data, lang, entities)],
+                                        self._detect)[0]
+
+            # Convert results into PiEntity objects
+            with tracing.span("presidio.convert"):
+                entities = list(self._entities(results, chunk, lang,
+                                               lang_conf))
+            sp.set_attribute("presidio.entity_count", len(entities))
+
+        yield from entities
+
+
+    def find_batch(self, chunks: Iterable[DocumentChunk],
+                   pii_filter: TYPE_FILTER = None) -> List[List[PiiEntity]]:
+        """
+        Perform PII detection on a list of document chunks. When using the
+        analyzer daemon, chunks are sent to it in batches. If coalescing is
+        configured, consecutive small chunks are joined and analyzed together
+          :param chunks: the document chunks to analyze
+          :param pii_filter: detect only these PII types or Presidio entities
+            (in addition to the filter in each chunk context, if any)
+          :return: a list with the detected PII entities for each chunk
+        """
+        chunks = list(chunks)
+        langs = [self.chunk_language(c) for c in chunks]
+        requests = [(c.data, lang, self._request_entities(c, lang, pii_filter))
+                    for c, (lang, _) in zip(chunks, langs)]
+        with tracing.span("presidio.find_batch",
+                          **{"presidio.chunk_count": len(chunks)}) as sp:
+            if self._coalesce:
+                results = self._prescreened(
+                    requests, lambda r: self._coalesce.run(r, self._detect))
+            else:
+                results = self._prescreened(requests, self._detect)
+            with tracing.span("presidio.convert"):
+                entities = [list(self._entities(r, c, lang, conf))
+                            for r, c, (lang, conf) in zip(results, chunks, langs)]
+            sp.set_attribute("presidio.entity_count",
+                             sum(len(e) for e in entities))
+        return entities
+
+
+    def cascade_stats(self) -> Dict:
+        """
+        Return statistics on the use of the cascade: number of texts analyzed,
+        number of them sent to the second tier, and the trigger rate. Return
+        None if there is no cascade defined
+        """
+        return self._cascade.stats() if self._cascade else None
+
+
+    def recycle_stats(self) -> Optional[List[Dict]]:
+        """
+        Return statistics on engine recycling: for each in-process engine
+        with recycling configured, the number of recycles, the usage of the
+        current engine, and the recent recycle events (with process memory
+        before and after each one). Return None if there is no recycling
+        """
+        from .recycle import recycler_stats
+        return recycler_stats([self._recycler, self._recycler2])
+
+
+    def prescreen_stats(self) -> Dict:
+        """
+        Return statistics on pre-screening: number of texts processed, number
+        of them that skipped analysis, and the skip rate. Return None if
+        pre-screening is not configured
+        """
+        return self._prescreen.stats() if self._prescreen else None
+
+
+    def contains_pii(self, chunk: DocumentChunk, min_score: float = 0,
+                     pii_filter: TYPE_FILTER = None) -> bool:
+        """
+        Check if a document chunk contains any PII entity, without doing full
+        detection. Recognizers are run by increasing (learnt) cost, so that
+        cheap pattern recognizers run before the NLP pipeline, and the check
+        stops at the first hit
+          :param chunk: the document chunk to check
+          :param min_score: minimum score for a result to count as PII (the
+            score is taken before context enhancement)
+          :param pii_filter: check only these PII types or Presidio entities
+        """
+        lang = self._lang(chunk)
+        entities = self._request_entities(chunk, lang, pii_filter)
+        if not entities:
+            return False
+        if self._prescreen and not self._prescreen.keep(chunk.data, entities):
+            return False
+        self._bind()
+        if self._remote:
+            # No early exit in the daemon: do full analysis
+            results = self._analyze([(chunk.data, lang, entities)])[0]
+            return any(r.score >= min_score for r in results)
+
+        from .screen import contains_pii, RecognizerCosts
+        if self._costs is None:
+            with self._lock:
+                if self._costs is None:
+                    self._costs = RecognizerCosts()
+        analyzer, recycler = self._current_engine()
+        try:
+            found = contains_pii(analyzer, chunk.data, lang, entities,
+                                 self._costs, min_score)
+        except Exception as e:
+            raise ProcException("Presidio exception: {}: {}", type(e).__name__,
+                                e) from e
+        if recycler:
+            recycler.record(1)
+        return found
+
+
+    def contains_pii_batch(self, chunks: Iterable[DocumentChunk],
+                           min_score: float = 0,
+                           pii_filter: TYPE_FILTER = None) -> List[bool]:
+        """
+        Check a list of document chunks for PII, as in `contains_pii()`
+          :return: a list of booleans, one for each chunk
+        """
+        return [self.contains_pii(c, min_score, pii_filter) for c in chunks]
+
+
+    def find_file(self, filename: str, **kwargs) -> Iterable[PiiEntity]:
+        """
+        Perform PII detection on a (possibly very large) plain text file. The
+        file is memory-mapped and split into chunks lazily
+          :param filename: the file to process
+          :param kwargs: chunking options (`max_size`, `mode`, `lang`,
+            `encoding`), see `textfile.text_chunks()`
+          :return: an iterable of PII entities, with positions relative to the
+            start of the file
+        """
+        from .textfile import find_file
+        if "lang" not in kwargs:
+            kwargs["lang"] = self.lang
+        return find_file(self, filename, **kwargs)
@@ -0,0 +1,119 @@
+"""
+Detection over large plain text files: the file is memory-mapped and split
+lazily into chunks, so memory use does not depend on the file size
+"""
+
+import mmap
+from pathlib import Path
+
+from typing import Iterable, Union
+
+from pii_data.helper.exception import InvArgException
+from pii_data.types import PiiEntity
+from pii_data.types.doc import DocumentChunk
+from pii_extract.build.task import BasePiiTask
+
+
+# Default maximum chunk size, in bytes
+DEFAULT_CHUNK_SIZE = 64*1024
+
+# Separators to cut chunks at, in order of preference
+_SEP_PARAGRAPH = b"\n\n"
+_SEP_SIZE = (b"\n", b" ")
+
+
+def _utf8_boundary(mm: mmap.mmap, pos: int, end: int) -> int:
+    """
+    Move a cut position back so that it does not split a UTF-8 character
+    """
+    cut = end
+    while cut > pos and (mm[cut] & 0xC0) == 0x80:
+        cut -= 1
+    return cut if cut > pos else end
+
+
+def _chunk_end(mm: mmap.mmap, pos: int, max_size: int, paragraph: bool) -> int:
+    """
+    Find the end position for the chunk starting at a given position
+    """
+    size = len(mm)
+    limit = min(pos + max_size, size)
+
+    # One chunk per paragraph
+    if paragraph:
+        end = mm.find(_SEP_PARAGRAPH, pos, limit)
+        if end >= 0:
+            return end + len(_SEP_PARAGRAPH)
+    if limit == size:
+        return size
+
+    # Size-bounded chunk: cut at the last separator
+    for sep in _SEP_SIZE:
+        end = mm.rfind(sep, pos, limit)
+        if end >= 0:
+            return end + len(sep)
+    return _utf8_boundary(mm, pos, limit)
+
+
+def text_chunks(filename: Union[str, Path], max_size: int = DEFAULT_CHUNK_SIZE,
+                mode: str = "paragraph", lang: str = None,
+                encoding: str = "utf-8") -> Iterable[DocumentChunk]:
+    """
+    Split a text file into document chunks, lazily
+     :param filename: the file to read
+     :param max_size: maximum size of a chunk, in bytes
+     :param mode: chunking mode:
+        - `paragraph`: one chunk per paragraph (text separated by blank lines),
+          with paragraphs longer than `max_size` split into several chunks
+        - `size`: chunks as large as possible, up to `max_size`
+     :param lang: language to add to the chunk context
+     :param encoding: file encoding (it must be UTF-8 or ASCII-compatible)
+     :return: an iterable of chunks. The context of each chunk contains the
+       position of the chunk in the file, both as bytes (`byte_offset`) and
+       as characters (`char_offset`)
+    """
+    if mode not in ("paragraph", "size"):
+        raise InvArgException("invalid chunking mode: {}", mode)
+
+    with open(filename, "rb") as f:
+        if Path(filename).stat().st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos = char_pos = 0
+            num = 0
+            while pos < len(mm):
+                end = _chunk_end(mm, pos, max_size, mode == "paragraph")
+                data = mm[pos:end].decode(encoding, errors="replace")
+                if data.strip():
+                    ctx = {"byte_offset": pos, "char_offset": char_pos}
+                    if lang:
+                        ctx["lang"] = lang
+                    yield DocumentChunk(num, data, ctx)
+                    num += 1
+                pos = end
+                char_pos += len(data)
+
+
+def find_file(task: BasePiiTask, filename: Union[str, Path],
+              encoding: str = "utf-8", **kwargs) -> Iterable[PiiEntity]:
+    """
+    Perform PII detection over a text file
+     :param task: the task to use for detection
+     :param filename: the file to read
+     :param encoding: file encoding (it must be UTF-8 or ASCII-compatible)
+     :param kwargs: chunking options, as for `text_chunks()`
+     :return: an iterable of PII entities, with positions relative to the
+       start of the file. Positions are characters; the byte positions are
+       also added, in the `extra` field
+    """
+    for chunk in text_chunks(filename, encoding=encoding, **kwargs):
+        byte_offset = chunk.context["byte_offset"]
+        char_offset = chunk.context["char_offset"]
+        for pii in task(chunk):
+            value = pii.fields["value"]
+            start = byte_offset + len(chunk.data[:pii.pos].encode(encoding))
+            extra = {"byte_start": start,
+                     "byte_end": start + len(value.encode(encoding))}
+            yield PiiEntity(pii.info, value, chunk.id, char_offset + pii.pos,
+                            process=pii.fields.get("process"),
+                            detector=pii.fields.get("detector"), extra=extra)
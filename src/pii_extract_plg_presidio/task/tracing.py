@@ -0,0 +1,225 @@
+"""
+Optional tracing of engine creation & detection. Spans are exported either
+through OpenTelemetry (if installed) or to a local JSON-lines file.
+When tracing is not enabled, spans are a shared no-op object
+"""
+
+import os
+import json
+import time
+import threading
+from contextvars import ContextVar
+
+from typing import Dict, Union
+
+from pii_data.helper.exception import ConfigException
+
+
+class NullSpan:
+    """
+    A span that does nothing (used when tracing is disabled)
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def set_attribute(self, key: str, value):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+# The active tracer (None means tracing is disabled)
+_TRACER = None
+
+
+def span(name: str, **attributes):
+    """
+    Create a span, to be used as a context manager. The span object has a
+    `set_attribute()` method to add attributes before it ends
+    """
+    if _TRACER is None:
+        return NULL_SPAN
+    return _TRACER.span(name, attributes)
+
+
+def enabled() -> bool:
+    """
+    Check if tracing is enabled
+    """
+    return _TRACER is not None
+
+
+# --------------------------------------------------------------------------
+
+
+_CURRENT = ContextVar("presidio_span", default=None)
+
+
+class JsonlSpan:
+    """
+    A span exported to a JSON-lines file
+    """
+
+    def __init__(self, tracer: "JsonlTracer", name: str, attributes: Dict):
+        self._tracer = tracer
+        self.name = name
+        self.attributes = dict(attributes)
+
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+
+    def __enter__(self):
+        parent = _CURRENT.get()
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.span_id = os.urandom(8).hex()
+        self._token = _CURRENT.set(self)
+        self.start = time.time_ns()
+        return self
+
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.time_ns()
+        _CURRENT.reset(self._token)
+        record = {"name": self.name, "trace_id": self.trace_id,
+                  "span_id": self.span_id, "parent_id": self.parent_id,
+                  "start": self.start, "end": end,
+                  "duration_ms": (end - self.start)/1e6,
+                  "attributes": self.attributes}
+        if exc_type is not None:
+            record["error"] = f"{exc_type.__name__}: {exc}"
+        self._tracer.export(record)
+        return False
+
+
+
+class JsonlTracer:
+    """
+    A tracer writing finished spans to a local JSON-lines file
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._out = open(filename, "a", encoding="utf-8")
+
+
+    def __repr__(self) -> str:
+        return f"<JsonlTracer {self.filename}>"
+
+
+    def span(self, name: str, attributes: Dict) -> JsonlSpan:
+        return JsonlSpan(self, name, attributes)
+
+
+    def export(self, record: Dict):
+        line = json.dumps(record, default=str)
+        with self._lock:
+            print(line, file=self._out, flush=True)
+
+
+    def close(self):
+        with self._lock:
+            self._out.close()
+
+
+
+class OtelTracer:
+    """
+    A tracer creating OpenTelemetry spans, exported by whatever tracer
+    provider the application has configured
+    """
+
+    def __init__(self, provider=None, name: str = __name__):
+        """
+          :param provider: the OpenTelemetry tracer provider to use (default
+            is the global one)
+          :param name: the instrumentation name
+        """
+        try:
+            from opentelemetry import trace
+        except ImportError as e:
+            raise ConfigException("OpenTelemetry tracing needs the 'opentelemetry-api' package") from e
+        self._tracer = trace.get_tracer(name, tracer_provider=provider)
+
+
+    def __repr__(self) -> str:
+        return "<OtelTracer>"
+
+
+    def span(self, name: str, attributes: Dict):
+        return self._tracer.start_as_current_span(name, attributes=attributes)
+
+
+    def close(self):
+        pass
+
+
+# --------------------------------------------------------------------------
+
+
+def set_tracer(tracer) -> None:
+    """
+    Set the active tracer (an object with a `span(name, attributes)` method),
+    or disable tracing (with None)
+    """
+    global _TRACER
+    old = _TRACER
+    _TRACER = tracer
+    if old is not None and old is not tracer:
+        old.close()
+
+
+def _otel_collector() -> bool:
+    """
+    Check if OpenTelemetry is installed and the application has configured
+    a tracer provider (i.e. spans will actually be collected)
+    """
+    try:
+        from opentelemetry import trace
+    except ImportError:
+        return False
+    provider = trace.get_tracer_provider()
+    return not isinstance(provider, (trace.ProxyTracerProvider,
+                                     trace.NoOpTracerProvider))
+
+
+def configure_tracing(config: Union[bool, str, Dict, None]) -> None:
+    """
+    Set up tracing from its configuration, which can be:
+      - an exporter name: `otel`, `jsonl` or `auto` (OpenTelemetry if it is
+        installed and there is a tracer provider, else a JSON-lines file)
+      - True, equivalent to `auto`
+      - a dict with `exporter` and `file` (for the `jsonl` exporter) fields
+    If there is no configuration, the current tracer (if any) is kept
+    """
+    if not config:
+        return
+    if isinstance(config, str):
+        config = {"exporter": config}
+    elif not isinstance(config, dict):
+        config = {}
+    exporter = config.get("exporter", "auto")
+    filename = config.get("file", "presidio-trace.jsonl")
+
+    if exporter == "auto":
+        exporter = "otel" if _otel_collector() else "jsonl"
+
+    if isinstance(_TRACER, JsonlTracer) and exporter == "jsonl" \
+       and _TRACER.filename == filename:
+        return
+    elif isinstance(_TRACER, OtelTracer) and exporter == "otel":
+        return
+
+    if exporter == "otel":
+        set_tracer(OtelTracer())
+    elif exporter == "jsonl":
+        set_tracer(JsonlTracer(filename))
+    else:
+        raise ConfigException("unknown tracing exporter: {}", exporter)
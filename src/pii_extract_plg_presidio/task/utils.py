@@ -2,6 +2,7 @@
 Some configuration utilities
 """
 
+import os
 import sys
 from pathlib import Path
 from os import environ
@@ -51,3 +52,17 @@ def presidio_version() -> str:
     Return the version of the Presidio package
     """
     return version("presidio_analyzer")
+
+
+def current_rss() -> int:
+    """
+    Return the resident set size of the process, in bytes. Where /proc is
+    not available, return the peak RSS instead
+    """
+    try:
+        with open("/proc/self/statm", encoding="ascii") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == "darwin" else rss*1024
@@ -0,0 +1,236 @@
+"""
+Micro-benchmarks for the overhead added by the plugin itself (configuration
+loading, PII list filtering, task construction, and conversion of analyzer
+results into PiiEntity objects), isolated from Presidio by using the
+analyzer mock
+
+Usage (from the repository root):
+
+    PYTHONPATH=src:test python -m bench.overhead run [--save FILE]
+    PYTHONPATH=src:test python -m bench.overhead compare [--baseline FILE]
+
+Timings depend on the machine, so the baseline should be regenerated (with
+`run --save`) when changing the machine it is compared on.
+"""
+
+import sys
+import json
+import time
+import platform
+import argparse
+from pathlib import Path
+
+import pytest
+
+from typing import Dict, List, Callable, Tuple
+
+from pii_data.types import PiiEnum
+from pii_data.types.doc import DocumentChunk
+
+from pii_extract_plg_presidio import defs
+from pii_extract_plg_presidio.plugin_loader import (PiiExtractPluginLoader,
+                                                    load_presidio_plugin_config)
+from pii_extract_plg_presidio.task.collector import pii_list
+
+from taux.monkey_patch import patch_presidio_analyzer
+from taux.taskproc import pii_build_tasks
+
+
+DEFAULT_BASELINE = Path(__file__).parent / "baseline.json"
+DEFAULT_TOLERANCE = 0.25
+
+# Size of the synthetic configuration & results
+NUM_PII = 600
+NUM_HITS = 2000
+NUM_CHUNKS = 200
+HITS_PER_CHUNK = 10
+
+MODELS = [{"lang_code": "en", "model_name": "en_core_web_lg"},
+          {"lang_code": "es", "model_name": "es_core_news_md"}]
+LANGS = [["en"], ["es"], ["en", "es"], ["it"], ["en", "es", "it"]]
+
+
+# --------------------------------------------------------------------------
+
+
+def synthetic_config(num_pii: int = NUM_PII) -> Dict:
+    """
+    Build a plugin configuration with a large PII list, mapping to synthetic
+    Presidio entities (some of them for languages without a model)
+    """
+    types = list(PiiEnum)
+    pii = [{"type": types[n % len(types)].name, "subtype": f"sub{n}",
+            "lang": LANGS[n % len(LANGS)], "method": "model",
+            "extra": {"presidio": f"ENTITY_{n}"}}
+           for n in range(num_pii)]
+    return {defs.FMT_CONFIG: {
+        defs.CFG_ENGINE: {"nlp_engine_name": "spacy", "models": MODELS},
+        defs.CFG_MAP: pii
+    }}
+
+
+def synthetic_results(text_size: int, num_hits: int,
+                      entities: List[str]) -> Tuple[str, List[Dict]]:
+    """
+    Build a text and a list of analyzer results over it
+    """
+    text = ("lorem ipsum dolor sit amet " * (text_size // 27 + 1))[:text_size]
+    step = max(text_size // num_hits, 1)
+    results = [{"start": n*step, "end": n*step + max(step - 1, 1),
+                "entity_type": entities[n % len(entities)],
+                "score": 0.5 + (n % 50)/100}
+               for n in range(num_hits)]
+    return text, results
+
+
+def _task(config: Dict):
+    tdesc = list(PiiExtractPluginLoader(config).get_plugin_tasks("en"))
+    return list(pii_build_tasks(tdesc))[0]
+
+
+# --------------------------------------------------------------------------
+
+
+def benchmarks(monkeypatch) -> Dict[str, Callable]:
+    """
+    Set up the benchmarks, and return a dict of functions to time
+    """
+    config = synthetic_config()
+    cfg = load_presidio_plugin_config(config)
+    entities = sorted({p["extra"]["presidio"] for p in cfg[defs.CFG_MAP]
+                       if "en" in p["lang"]})
+
+    # A large text with many hits, and many small texts with a few hits
+    text, results = synthetic_results(40000, NUM_HITS, entities)
+    mock_results = {text: results}
+    chunks = []
+    for n in range(NUM_CHUNKS):
+        t, r = synthetic_results(200 + n, HITS_PER_CHUNK, entities)
+        chunks.append(DocumentChunk(str(n), t, {"lang": "en"}))
+        mock_results[t] = r
+
+    patch_presidio_analyzer(monkeypatch, mock_results, pres_entities=entities)
+    loader = PiiExtractPluginLoader(config)
+    tdesc = list(loader.get_plugin_tasks("en"))
+    task = _task(config)
+    chunk = DocumentChunk("0", text, {"lang": "en"})
+
+    ovl_config = synthetic_config()
+    ovl_config[defs.FMT_CONFIG][defs.CFG_TASK] = {defs.CFG_OVERLAP: "score"}
+    ovl_task = _task(ovl_config)
+
+    return {
+        "config_load": lambda: load_presidio_plugin_config(synthetic_config()),
+        "pii_list": lambda: pii_list(cfg, {"en"}),
+        "gather_tasks": lambda: list(loader.get_plugin_tasks("en")),
+        "task_build": lambda: list(pii_build_tasks(tdesc)),
+        "find_hits": lambda: list(task.find(chunk)),
+        "find_batch": lambda: task.find_batch(chunks),
+        "find_overlap": lambda: list(ovl_task.find(chunk)),
+    }
+
+
+def timeit(func: Callable, repeat: int = 5, min_time: float = 0.2) -> float:
+    """
+    Time a function: return the best time per call (in seconds) over a number
+    of repetitions, each one running for at least `min_time` seconds
+    """
+    func()          # warm-up
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number *= 2
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def run(names: List[str] = None, repeat: int = 5,
+        min_time: float = 0.2) -> Dict:
+    """
+    Run the benchmarks
+      :return: a dict with the benchmark results & some environment info
+    """
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        funcs = benchmarks(monkeypatch)
+        results = {name: timeit(f, repeat, min_time)
+                   for name, f in funcs.items() if not names or name in names}
+    return {"python": platform.python_version(),
+            "machine": platform.machine(),
+            "results": results}
+
+
+def compare(current: Dict, baseline: Dict,
+            tolerance: float = DEFAULT_TOLERANCE) -> Dict[str, Tuple[float, bool]]:
+    """
+    Compare benchmark results against a baseline
+      :return: a dict with the (current/baseline) time ratio for each
+        benchmark present in both, and a flag for ratios exceeding
+        `1 + tolerance` (slowdowns)
+    """
+    base = baseline["results"]
+    return {name: (t/base[name], t/base[name] > 1 + tolerance)
+            for name, t in current["results"].items() if name in base}
+
+
+# --------------------------------------------------------------------------
+
+
+def parse_args(args: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Plugin overhead micro-benchmarks")
+    parser.add_argument("--bench", action="append",
+                        help="run only this benchmark (can be repeated)")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="number of timing repetitions")
+    parser.add_argument("--min-time", type=float, default=0.2,
+                        help="minimum time per repetition (seconds)")
+    subp = parser.add_subparsers(title="command", dest="cmd", required=True)
+
+    c1 = subp.add_parser("run", help="run the benchmarks")
+    c1.add_argument("--save", metavar="FILE",
+                    help="store the results in a JSON file (e.g. a new baseline)")
+
+    c2 = subp.add_parser("compare", help="run the benchmarks and compare "
+                         "them against a baseline")
+    c2.add_argument("--baseline", default=DEFAULT_BASELINE,
+                    help="baseline file (default: %(default)s)")
+    c2.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                    help="maximum allowed slowdown, as a fraction (default: %(default)s)")
+    return parser.parse_args(args)
+
+
+def main(args: List[str] = None):
+    args = parse_args(args)
+    current = run(args.bench, args.repeat, args.min_time)
+
+    if args.cmd == "run":
+        for name, t in current["results"].items():
+            print(f"{name:16} {t*1e3:10.3f} ms")
+        if args.save:
+            with open(args.save, "w", encoding="utf-8") as f:
+                json.dump(current, f, indent=2)
+                f.write("\n")
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    slow = False
+    for name, (ratio, flag) in compare(current, baseline, args.tolerance).items():
+        t = current["results"][name]
+        print(f"{name:16} {t*1e3:10.3f} ms  x{ratio:5.2f}",
+              "  ** SLOWDOWN" if flag else "")
+        slow = slow or flag
+    return 1 if slow else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
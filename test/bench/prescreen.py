@@ -0,0 +1,119 @@
+"""
+Accuracy & speed of pre-screening: run detection over a corpus with and
+without pre-screening, and compare the detected entities
+
+Usage (from the repository root):
+
+    PYTHONPATH=src:test python -m bench.prescreen [--corpus FILE] [--config FILE ...]
+
+Unlike the overhead benchmarks, this uses the real Presidio engine, so the
+NLP models in the configuration must be installed.
+"""
+
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+from typing import Dict, List, Union
+
+from pii_data.types.doc import DocumentChunk
+
+from pii_extract_plg_presidio import defs
+from pii_extract_plg_presidio.plugin_loader import load_presidio_plugin_config
+from pii_extract_plg_presidio.task import PresidioTaskCollector
+
+from taux.taskproc import pii_build_tasks
+
+
+DEFAULT_CORPUS = Path(__file__).parent / "corpus.jsonl"
+
+
+def load_corpus(filename: str = DEFAULT_CORPUS) -> List[DocumentChunk]:
+    """
+    Read a corpus of document chunks from a JSONL file
+    """
+    with open(filename, encoding="utf-8") as f:
+        chunks = [json.loads(line) for line in f if line.strip()]
+    return [DocumentChunk(c["id"], c["data"], c.get("context"))
+            for c in chunks]
+
+
+def build_task(config: Dict, prescreen: Union[bool, Dict] = None):
+    """
+    Build a task for all the configured languages, optionally with
+    pre-screening
+    """
+    config = dict(config)
+    config[defs.CFG_TASK] = dict(config.get(defs.CFG_TASK) or {})
+    config[defs.CFG_TASK][defs.CFG_PRESCREEN] = prescreen
+    tdesc = list(PresidioTaskCollector(config).gather_tasks())
+    return list(pii_build_tasks(tdesc))[0]
+
+
+def _detect(task, chunks: List[DocumentChunk]):
+    start = time.perf_counter()
+    found = {(str(pii.fields["chunkid"]), pii.pos, pii.info.pii.name)
+             for plist in task.find_batch(chunks) for pii in plist}
+    return found, time.perf_counter() - start
+
+
+def compare(full_task, screened_task, chunks: List[DocumentChunk]) -> Dict:
+    """
+    Compare detection with and without pre-screening
+      :return: a dict with the skip rate, the entities found by the full
+        path and the ones missed when pre-screening, the recall and the
+        elapsed times
+    """
+    full_task.find_batch(chunks[:1])        # warm up
+    screened_task.find_batch(chunks[:1])
+    stats0 = screened_task.prescreen_stats()
+
+    full, t_full = _detect(full_task, chunks)
+    screened, t_screened = _detect(screened_task, chunks)
+    stats = screened_task.prescreen_stats()
+    skipped = stats["skipped"] - stats0["skipped"]
+
+    missed = sorted(full - screened)
+    return {"chunks": len(chunks),
+            "skipped": skipped,
+            "skip_rate": skipped/len(chunks) if chunks else 0,
+            "entities": len(full),
+            "missed": missed,
+            "recall": 1 - len(missed)/len(full) if full else 1,
+            "time_full": t_full,
+            "time_prescreen": t_screened}
+
+
+# --------------------------------------------------------------------------
+
+
+def parse_args(args: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Pre-screening accuracy benchmark")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS,
+                        help="JSONL corpus file (default: %(default)s)")
+    parser.add_argument("--config", nargs="+",
+                        help="add PIISA configuration file(s)")
+    return parser.parse_args(args)
+
+
+def main(args: List[str] = None):
+    args = parse_args(args)
+    config = load_presidio_plugin_config(args.config)
+    chunks = load_corpus(args.corpus)
+    got = compare(build_task(config), build_task(config, True), chunks)
+
+    print(f"chunks       {got['chunks']:8}")
+    print(f"skipped      {got['skipped']:8}   ({100*got['skip_rate']:.1f}%)")
+    print(f"entities     {got['entities']:8}")
+    print(f"missed       {len(got['missed']):8}   (recall {got['recall']:.3f})")
+    print(f"time full    {got['time_full']:8.3f} s")
+    print(f"time screen  {got['time_prescreen']:8.3f} s")
+    for chunkid, start, ptype in got["missed"]:
+        print(f"  missed: chunk {chunkid} @{start} {ptype}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
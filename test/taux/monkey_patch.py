@@ -57,7 +57,7 @@ class AnalyzerEngineMock:
     def get_supported_entities(self):
         return self.data.get("entities")
 
-    def get_recognizers(self):
+    def get_recognizers(self, language: str = None):
         return self.data.get("recognizers")
 
     def analyze(self, text: str, **kwargs):
@@ -91,3 +91,32 @@ def patch_presidio_analyzer(monkeypatch, results: Dict,
     monkeypatch.setattr(mod_an, 'ENGINE_CACHE', {})
 
     return mock_class
+
+
+# ---------------------------------------------------------------------
+
+
+class BlankNlpEngineProvider:
+    """
+    Build real spaCy NLP engines, but with blank pipelines (no models needed)
+    """
+
+    def __init__(self, nlp_configuration):
+        self.models = nlp_configuration["models"]
+
+    def create_engine(self):
+        import spacy
+        from presidio_analyzer.nlp_engine import SpacyNlpEngine
+        engine = SpacyNlpEngine(models=self.models)
+        engine.nlp = {m["lang_code"]: spacy.blank(m["lang_code"])
+                      for m in self.models}
+        return engine
+
+
+def patch_blank_nlp(monkeypatch):
+    """
+    Monkey patch engine creation to use real Presidio analyzer engines, with
+    blank spaCy pipelines
+    """
+    monkeypatch.setattr(mod_an, "NlpEngineProvider", BlankNlpEngineProvider)
+    monkeypatch.setattr(mod_an, "ENGINE_CACHE", {})
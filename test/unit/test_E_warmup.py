@@ -0,0 +1,79 @@
+"""
+Test the warm-up & readiness API
+"""
+
+from pii_extract.gather.collection import get_task_collection
+
+from pii_extract_plg_presidio import defs
+import pii_extract_plg_presidio.plugin_loader as mod
+
+from taux.monkey_patch import patch_entry_points, patch_presidio_analyzer
+
+
+# ---------------------------------------------------------------------------
+
+
+def test10_loader_warmup(monkeypatch):
+    """
+    Check warm-up from the plugin loader
+    """
+    mck = patch_presidio_analyzer(monkeypatch, {})
+
+    ep = mod.PiiExtractPluginLoader()
+    assert ep.ready() is False
+
+    got = ep.warmup()
+    assert sorted(got) == ["en", "es", "it"]
+    assert all(isinstance(v, float) for v in got.values())
+    assert ep.ready() is True
+
+    # The dummy texts have been sent to the engine, with the config entities
+    analyzer = mck.return_value
+    args = analyzer.call_args[defs.WARMUP_TEXT["it"]]
+    assert args["language"] == "it"
+    assert sorted(args["entities"]) == ["IT_FISCAL_CODE", "IT_IDENTITY_CARD",
+                                        "LOCATION", "NRP", "PERSON"]
+
+
+def test11_loader_warmup_lang(monkeypatch):
+    """
+    Check warm-up from the plugin loader, for a language subset
+    """
+    patch_presidio_analyzer(monkeypatch, {})
+
+    ep = mod.PiiExtractPluginLoader()
+    got = ep.warmup("en")
+    assert list(got) == ["en"]
+    assert ep.ready("en") is True
+    assert ep.ready() is False
+
+
+def test20_task_reuse(monkeypatch):
+    """
+    Check that a task created after the loader warm-up uses the warm engine
+    """
+    patch_entry_points(monkeypatch)
+    mck = patch_presidio_analyzer(monkeypatch, {})
+
+    mod.PiiExtractPluginLoader().warmup()
+
+    piic = get_task_collection(debug=False)
+    task = list(piic.build_tasks())[0]
+    assert mck.call_count == 1
+    assert task.ready() is True
+
+
+def test21_task_warmup(monkeypatch):
+    """
+    Check warm-up from the task
+    """
+    patch_entry_points(monkeypatch)
+    patch_presidio_analyzer(monkeypatch, {})
+
+    piic = get_task_collection(debug=False)
+    task = list(piic.build_tasks("en"))[0]
+    assert task.ready() is False
+
+    got = task.warmup()
+    assert list(got) == ["en"]
+    assert task.ready() is True
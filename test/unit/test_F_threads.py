@@ -0,0 +1,158 @@
+"""
+Test concurrent use of the analyzer engine cache & the Presidio task
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pii_data.types.doc import DocumentChunk
+
+from pii_extract_plg_presidio import defs
+import pii_extract_plg_presidio.task.analyzer as mod_an
+import pii_extract_plg_presidio.task.task as mod_task
+from pii_extract_plg_presidio.plugin_loader import load_presidio_plugin_config
+from pii_extract_plg_presidio.plugin_loader import PiiExtractPluginLoader
+
+from taux.monkey_patch import patch_presidio_analyzer, patch_blank_nlp
+from taux.taskproc import pii_build_tasks
+
+
+NUM_THREADS = 16
+
+
+def _slow_build(mck):
+    """
+    Make the analyzer engine constructor take some time
+    """
+    engine = mck.return_value
+
+    def build(*args, **kwargs):
+        time.sleep(0.05)
+        return engine
+    mck.side_effect = build
+
+
+# ---------------------------------------------------------------------------
+
+
+def test10_single_flight(monkeypatch):
+    """
+    Check that concurrent engine requests for the same config build only once
+    """
+    mck = patch_presidio_analyzer(monkeypatch, {})
+    _slow_build(mck)
+
+    config = load_presidio_plugin_config()
+    with ThreadPoolExecutor(NUM_THREADS) as pool:
+        fut = [pool.submit(mod_an.presidio_analyzer, config, ["en"])
+               for _ in range(NUM_THREADS)]
+        engines = [f.result() for f in fut]
+
+    assert mck.call_count == 1
+    assert all(e is engines[0] for e in engines)
+
+
+def test11_single_flight_keys(monkeypatch):
+    """
+    Check that concurrent engine requests for different configs are not
+    serialized into a single engine
+    """
+    mck = patch_presidio_analyzer(monkeypatch, {})
+    _slow_build(mck)
+
+    config = load_presidio_plugin_config()
+    langs = [["en"], ["es"], ["it"]] * 4
+    with ThreadPoolExecutor(NUM_THREADS) as pool:
+        list(pool.map(lambda lang: mod_an.presidio_analyzer(config, lang),
+                      langs))
+
+    assert mck.call_count == 3
+    assert len(mod_an.ENGINE_CACHE) == 3
+
+
+def test20_task_build(monkeypatch):
+    """
+    Check concurrent task creation
+    """
+    mck = patch_presidio_analyzer(monkeypatch, {})
+    _slow_build(mck)
+
+    tdesc = list(PiiExtractPluginLoader().get_plugin_tasks())
+    with ThreadPoolExecutor(NUM_THREADS) as pool:
+        fut = [pool.submit(lambda: list(pii_build_tasks(tdesc))[0])
+               for _ in range(NUM_THREADS)]
+        tasks = [f.result() for f in fut]
+
+    assert mck.call_count == 1
+    assert all(t.analyzer is tasks[0].analyzer for t in tasks)
+
+
+def test30_find_stress(monkeypatch):
+    """
+    Stress test: concurrent detection calls over a shared task & engine
+    """
+    num_docs = 200
+    docs = [f"document number {n} about Alan Turing" for n in range(num_docs)]
+    results = {
+        d: [{"start": len(d) - 11, "end": len(d), "entity_type": "PERSON",
+             "score": 0.85},
+            {"start": 0, "end": 8, "entity_type": "NRP", "score": n/num_docs}]
+        for n, d in enumerate(docs)
+    }
+    patch_presidio_analyzer(monkeypatch, results)
+
+    tdesc = list(PiiExtractPluginLoader().get_plugin_tasks())
+    task = list(pii_build_tasks(tdesc))[0]
+
+    def detect(n: int):
+        chunk = DocumentChunk(str(n), docs[n], {"lang": "en"})
+        return n, list(task.find(chunk))
+
+    with ThreadPoolExecutor(NUM_THREADS) as pool:
+        got = list(pool.map(detect, list(range(num_docs)) * 5))
+
+    assert len(got) == 5*num_docs
+    for n, pii in got:
+        assert [p.fields["type"] for p in pii] == ["NORP", "PERSON"]
+        assert pii[0].fields["chunkid"] == str(n)
+        assert pii[0].fields["process"]["score"] == n/num_docs
+        assert pii[1].fields["value"] == "Alan Turing"
+
+
+def test40_task_state_stress(monkeypatch):
+    """
+    Stress test: concurrent detection & screening calls, with different PII
+    filters, over a shared task with a real analyzer engine and stateful
+    components (pre-screening, PII filter cache, recognizer costs)
+    """
+    patch_blank_nlp(monkeypatch)
+    monkeypatch.setattr(mod_task, "MAX_FILTERS", 3)
+    config = {defs.FMT_CONFIG: {defs.CFG_TASK: {defs.CFG_PRESCREEN: True,
+                                                defs.CFG_OVERLAP: "score"}}}
+    tdesc = list(PiiExtractPluginLoader(config).get_plugin_tasks("en"))
+    task = list(pii_build_tasks(tdesc))[0]
+
+    texts = [f"my passport number is {912803450 + n}" for n in range(10)] + \
+        [f"nothing to see here {n}" for n in range(10)] + \
+        [f"Driving license A{1234560 + n} for Mr. Smith" for n in range(10)]
+    filters = [None, "GOV_ID", ["PERSON", "US_PASSPORT"], ["LOCATION"],
+               "NORP"]
+    work = [(n, f) for n in range(len(texts)) for f in range(len(filters))]
+
+    def run(item):
+        n, f = item
+        chunk = DocumentChunk(str(n), texts[n], {"lang": "en"})
+        found = [(p.info.pii.name, p.pos, p.fields["value"])
+                 for p in task.find(chunk, pii_filter=filters[f])]
+        return found, task.contains_pii(chunk, pii_filter=filters[f])
+
+    exp = [run(item) for item in work]
+    assert any(found for found, _ in exp)
+    assert any(has_pii for _, has_pii in exp)
+
+    with ThreadPoolExecutor(NUM_THREADS) as pool:
+        got = list(pool.map(run, work * 10))
+
+    assert got == exp * 10
+    assert task.prescreen_stats()["chunks"] == 11*len(work)
+    assert len(task._filters) <= 3
@@ -0,0 +1,94 @@
+"""
+Test the profiling utilities
+"""
+
+import io
+import time
+
+import pytest
+
+from pii_data.types.doc import DocumentChunk
+from pii_data.helper.exception import InvArgException
+
+from pii_extract_plg_presidio.plugin_loader import PiiExtractPluginLoader
+import pii_extract_plg_presidio.app.profiler as mod
+
+from taux.monkey_patch import patch_presidio_analyzer
+from taux.taskproc import pii_build_tasks
+
+
+TEXT = "The English mathematician Alan Turing is considered the father of AI"
+
+
+def _task(monkeypatch):
+    """
+    Build a Presidio task, with a mock engine that takes some time to analyze
+    """
+    results = {TEXT: [{"start": 26, "end": 37, "entity_type": "PERSON",
+                       "score": 0.85}]}
+    mck = patch_presidio_analyzer(monkeypatch, results)
+    analyzer = mck.return_value
+    analyze = analyzer.analyze
+
+    def slow_analyze(text, **kwargs):
+        time.sleep(0.002)
+        return analyze(text, **kwargs)
+    analyzer.analyze = slow_analyze
+
+    tdesc = list(PiiExtractPluginLoader().get_plugin_tasks())
+    return list(pii_build_tasks(tdesc))[0]
+
+
+def _detect(task):
+    return lambda chunk: list(task.find(chunk))
+
+
+# ---------------------------------------------------------------------------
+
+
+@pytest.mark.parametrize("profiler", ["sampling", "deterministic"])
+def test10_profile(monkeypatch, profiler):
+    """
+    Check profiling a task: the time is charged to the plugin code, since
+    the engine is a mock
+    """
+    task = _task(monkeypatch)
+    chunks = [DocumentChunk(str(n), TEXT, {"lang": "en"}) for n in range(20)]
+
+    prof = mod.profile_run(_detect(task), chunks, profiler)
+    got = mod.stage_report(prof)
+    assert list(got)[0] == mod.STAGE_PLUGIN
+    assert got[mod.STAGE_PLUGIN] > 0.02
+    assert prof.elapsed >= got[mod.STAGE_PLUGIN]
+
+
+def test20_collapsed(monkeypatch):
+    """
+    Check writing collapsed stacks
+    """
+    task = _task(monkeypatch)
+    chunks = [DocumentChunk(str(n), TEXT, {"lang": "en"}) for n in range(20)]
+
+    prof = mod.profile_run(_detect(task), chunks, "sampling")
+    out = io.StringIO()
+    prof.write_collapsed(out)
+
+    lines = out.getvalue().splitlines()
+    assert lines
+    for line in lines:
+        stack, count = line.rsplit(" ", 1)
+        assert int(count) > 0
+    assert any("pii_extract_plg_presidio.task.task:find" in line
+               for line in lines)
+
+
+def test30_profiler_error():
+    """
+    Check profiler errors
+    """
+    with pytest.raises(InvArgException):
+        mod.profile_run(print, [], "unknown")
+
+    prof = mod.profile_run(print, [], "deterministic")
+    with pytest.raises(InvArgException):
+        prof.write_collapsed(io.StringIO())
@@ -0,0 +1,162 @@
+"""
+Test the analyzer daemon & its use from the Presidio task
+"""
+
+import os
+import socket
+import threading
+
+import pytest
+
+from pii_data.helper.exception import ProcException
+from pii_data.types.doc import DocumentChunk
+
+from pii_extract_plg_presidio import defs
+from pii_extract_plg_presidio.plugin_loader import PiiExtractPluginLoader
+from pii_extract_plg_presidio.task.daemon import AnalyzerDaemon, DaemonClient
+
+from taux.monkey_patch import patch_presidio_analyzer
+from taux.taskproc import pii_build_tasks
+
+
+TEXT = "The English mathematician Alan Turing is considered the father of AI"
+
+RESULTS = {
+    TEXT: [{"start": 4, "end": 11, "entity_type": "NRP", "score": 0.85},
+           {"start": 26, "end": 37, "entity_type": "PERSON", "score": 0.85}]
+}
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    """
+    Launch an analyzer daemon in a thread
+    """
+    server = AnalyzerDaemon(str(tmp_path / "daemon.sock"))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def _task(socket_path: str):
+    config = {defs.FMT_CONFIG: {
+        defs.CFG_ENGINE: {defs.CFG_DAEMON: {"socket": socket_path,
+                                            "batch_size": 2}}
+    }}
+    tdesc = list(PiiExtractPluginLoader(config).get_plugin_tasks("en"))
+    return list(pii_build_tasks(tdesc))[0]
+
+
+def _chunk(n: int = 1) -> DocumentChunk:
+    return DocumentChunk(str(n), TEXT, {"lang": "en"})
+
+
+# ---------------------------------------------------------------------------
+
+
+def test10_daemon(monkeypatch, daemon):
+    """
+    Check detection through the daemon
+    """
+    mck = patch_presidio_analyzer(monkeypatch, RESULTS)
+
+    task = _task(daemon.socket_path)
+    assert task.analyzer is None
+    assert task.ready() is True
+    assert mck.call_count == 1
+
+    got = [p.asdict() for p in task.find(_chunk())]
+    assert [(p["type"], p["value"]) for p in got] == \
+        [("NORP", "English"), ("PERSON", "Alan Turing")]
+
+    # The request was processed by the engine in the daemon
+    analyzer = mck.return_value
+    assert analyzer.call_args[TEXT] == {"language": "en",
+                                        "entities": list(task._ent_map["en"])}
+
+
+def test11_daemon_shared(monkeypatch, daemon):
+    """
+    Check that tasks share the engine in the daemon
+    """
+    mck = patch_presidio_analyzer(monkeypatch, RESULTS)
+    _task(daemon.socket_path)
+    _task(daemon.socket_path)
+    assert mck.call_count == 1
+
+
+def test20_daemon_batch(monkeypatch, daemon):
+    """
+    Check batch detection through the daemon
+    """
+    patch_presidio_analyzer(monkeypatch, RESULTS)
+
+    task = _task(daemon.socket_path)
+    got = task.find_batch([_chunk(n) for n in range(5)])
+    assert len(got) == 5
+    for n, pii in enumerate(got):
+        assert [p.fields["chunkid"] for p in pii] == [str(n), str(n)]
+        assert [p.fields["value"] for p in pii] == ["English", "Alan Turing"]
+
+
+def test30_no_daemon(monkeypatch, tmp_path):
+    """
+    Check the fallback to in-process analysis when there is no daemon
+    """
+    mck = patch_presidio_analyzer(monkeypatch, RESULTS)
+
+    task = _task(str(tmp_path / "none.sock"))
+    assert task.analyzer is mck.return_value
+
+    got = list(task.find(_chunk()))
+    assert len(got) == 2
+
+
+def test31_daemon_lost(monkeypatch, daemon):
+    """
+    Check the fallback to in-process analysis when the daemon goes away
+    """
+    patch_presidio_analyzer(monkeypatch, RESULTS)
+
+    task = _task(daemon.socket_path)
+    assert task.analyzer is None
+    task._remote.client.close()
+    daemon.shutdown()
+    daemon.server_close()
+
+    got = list(task.find(_chunk()))
+    assert len(got) == 2
+    assert task.analyzer is not None
+
+
+def test40_daemon_running(daemon):
+    """
+    Check that a second daemon cannot take over the socket of a live one
+    """
+    with pytest.raises(ProcException):
+        AnalyzerDaemon(daemon.socket_path)
+    client = DaemonClient(daemon.socket_path)
+    assert client.request({"op": "ping"}) == {"ok": True}
+    client.close()
+
+
+def test41_daemon_stale(tmp_path):
+    """
+    Check that a daemon replaces a stale socket, but not other files
+    """
+    path = str(tmp_path / "daemon.sock")
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    sock.close()
+    server = AnalyzerDaemon(path)
+    server.server_close()
+    assert not os.path.exists(path)
+
+    with open(path, "w") as f:
+        f.write("data")
+    with pytest.raises(ProcException):
+        AnalyzerDaemon(path)
+    assert os.path.exists(path)
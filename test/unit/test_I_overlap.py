@@ -0,0 +1,131 @@
+"""
+Test the resolution of overlapping results
+"""
+
+import random
+
+import pytest
+
+from pii_data.helper.exception import ConfigException
+from pii_data.types.doc import DocumentChunk
+
+from pii_extract_plg_presidio import defs
+from pii_extract_plg_presidio.plugin_loader import PiiExtractPluginLoader
+from pii_extract_plg_presidio.task.overlap import resolve_overlaps, _policy_key
+
+from taux.monkey_patch import Result, patch_presidio_analyzer
+from taux.taskproc import pii_build_tasks
+
+
+TEXT = "Mr. John Smith of New York City, English"
+
+RESULTS = [
+    {"start": 4, "end": 14, "entity_type": "PERSON", "score": 0.85},
+    {"start": 4, "end": 8, "entity_type": "PERSON", "score": 0.9},
+    {"start": 9, "end": 31, "entity_type": "LOCATION", "score": 0.6},
+    {"start": 18, "end": 31, "entity_type": "LOCATION", "score": 0.85},
+    {"start": 18, "end": 31, "entity_type": "NRP", "score": 0.85},
+    {"start": 33, "end": 40, "entity_type": "NRP", "score": 0.7}
+]
+
+
+def _spans(results):
+    return [(r.start, r.end, r.entity_type) for r in results]
+
+
+# ---------------------------------------------------------------------------
+
+
+def test10_score():
+    """
+    Check the highest score policy
+    """
+    results = [Result(**r) for r in RESULTS]
+    got = resolve_overlaps(results, "score")
+    assert _spans(got) == [(4, 8, "PERSON"), (18, 31, "LOCATION"),
+                           (33, 40, "NRP")]
+
+
+def test11_length():
+    """
+    Check the longest span policy
+    """
+    results = [Result(**r) for r in RESULTS]
+    got = resolve_overlaps(results, "length")
+    assert _spans(got) == [(4, 8, "PERSON"), (9, 31, "LOCATION"),
+                           (33, 40, "NRP")]
+
+
+def test12_priority():
+    """
+    Check the entity priority policy
+    """
+    results = [Result(**r) for r in RESULTS]
+    got = resolve_overlaps(results, "priority", ["NRP", "PERSON"])
+    assert _spans(got) == [(4, 8, "PERSON"), (18, 31, "NRP"),
+                           (33, 40, "NRP")]
+
+
+def test13_errors():
+    """
+    Check invalid configurations
+    """
+    with pytest.raises(ConfigException):
+        resolve_overlaps([Result(**r) for r in RESULTS], "unknown")
+    with pytest.raises(ConfigException):
+        resolve_overlaps([Result(**r) for r in RESULTS], "priority")
+
+
+def test14_dense():
+    """
+    Check a large set of overlapping results: the kept spans are disjoint,
+    and each discarded span overlaps a kept one with a better score
+    """
+    results = [Result(n, n + 1 + n % 7, "PERSON", (n * 37 % 101) / 101)
+               for n in range(2000)]
+    got = resolve_overlaps(results, "score")
+    for r1, r2 in zip(got, got[1:]):
+        assert r1.end <= r2.start
+    kept = set(_spans(got))
+    for r in results:
+        if (r.start, r.end, r.entity_type) not in kept:
+            assert any(k.start < r.end and r.start < k.end
+                       and k.score >= r.score for k in got)
+
+
+def test15_greedy():
+    """
+    Check against a direct implementation of the greedy selection, with
+    random results (including repeated starts and empty spans)
+    """
+    rnd = random.Random(42)
+    for _ in range(50):
+        results = []
+        for _ in range(rnd.randint(2, 60)):
+            start = rnd.randint(0, 80)
+            results.append(Result(start, start + rnd.randint(0, 12), "PERSON",
+                                  rnd.randint(0, 10)/10))
+        for policy in ("score", "length"):
+            exp = []
+            for r in sorted(results, key=_policy_key(policy)):
+                if not any(k.start <= r.start < k.end
+                           or r.start < k.start < r.end
+                           for k in exp):
+                    exp.append(r)
+            got = resolve_overlaps(results, policy)
+            assert _spans(got) == _spans(sorted(exp, key=lambda r: r.start))
+
+
+def test20_task(monkeypatch):
+    """
+    Check overlap resolution in the task
+    """
+    patch_presidio_analyzer(monkeypatch, {TEXT: RESULTS})
+
+    config = {defs.FMT_CONFIG: {defs.CFG_TASK: {defs.CFG_OVERLAP: "score"}}}
+    tdesc = list(PiiExtractPluginLoader(config).get_plugin_tasks("en"))
+    task = list(pii_build_tasks(tdesc))[0]
+
+    got = list(task.find(DocumentChunk("1", TEXT, {"lang": "en"})))
+    assert [p.fields["value"] for p in got] == ["John", "New York City",
+                                                "English"]
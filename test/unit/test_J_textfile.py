@@ -0,0 +1,114 @@
+"""
+Test detection over plain text files
+"""
+
+import re
+
+import pytest
+
+from pii_data.helper.exception import InvArgException
+
+from pii_extract_plg_presidio.plugin_loader import PiiExtractPluginLoader
+import pii_extract_plg_presidio.task.textfile as mod
+
+from taux.monkey_patch import Result, patch_presidio_analyzer
+from taux.taskproc import pii_build_tasks
+
+
+PARAGRAPHS = [
+    "The English mathematician Alan Turing is considered the father of AI.",
+    "Él nació en Londres, y Alan Turing murió en Wilmslow en 1954.",
+    "Ñandú, pingüino, Alan Turing: ¿qué tienen en común? " * 10
+]
+
+
+def _task(monkeypatch):
+    """
+    Build a task with a mock analyzer that detects "Alan Turing" anywhere
+    """
+    mck = patch_presidio_analyzer(monkeypatch, {})
+
+    def analyze(text, **kwargs):
+        return [Result(m.start(), m.end(), "PERSON", 0.85)
+                for m in re.finditer("Alan Turing", text)]
+    mck.return_value.analyze = analyze
+
+    tdesc = list(PiiExtractPluginLoader().get_plugin_tasks("en"))
+    return list(pii_build_tasks(tdesc))[0]
+
+
+@pytest.fixture
+def textfile(tmp_path):
+    name = tmp_path / "doc.txt"
+    with open(name, "w", encoding="utf-8") as f:
+        f.write("\n\n".join(PARAGRAPHS) + "\n")
+    return name
+
+
+# ---------------------------------------------------------------------------
+
+
+def test10_chunks_paragraph(textfile):
+    """
+    Check splitting a file into paragraphs
+    """
+    got = list(mod.text_chunks(textfile, lang="en"))
+    assert len(got) == 3
+    assert [c.data.strip() for c in got] == [p.strip() for p in PARAGRAPHS]
+    assert got[0].context == {"lang": "en", "byte_offset": 0,
+                              "char_offset": 0}
+
+
+@pytest.mark.parametrize("mode", ["paragraph", "size"])
+def test11_chunks_offsets(textfile, mode):
+    """
+    Check the chunk offsets, for small chunk sizes
+    """
+    text = textfile.read_text(encoding="utf-8")
+    data = text.encode("utf-8")
+
+    got = list(mod.text_chunks(textfile, max_size=37, mode=mode))
+    assert len(got) > 10
+    for c in got:
+        assert len(c.data.encode("utf-8")) <= 37
+        boff = c.context["byte_offset"]
+        coff = c.context["char_offset"]
+        assert text[coff:coff+len(c.data)] == c.data
+        assert data[boff:].decode("utf-8").startswith(c.data)
+    assert "".join(c.data for c in got) == text
+
+
+def test12_chunks_split_char(tmp_path):
+    """
+    Check that chunks without separators are not split inside a character
+    """
+    name = tmp_path / "doc.txt"
+    name.write_text("ñ" * 100, encoding="utf-8")
+    got = list(mod.text_chunks(name, max_size=15, mode="size"))
+    assert [len(c.data) for c in got] == [7]*14 + [2]
+
+
+def test13_chunks_error(textfile):
+    with pytest.raises(InvArgException):
+        list(mod.text_chunks(textfile, mode="unknown"))
+
+
+@pytest.mark.parametrize("max_size", [40, 1000])
+def test20_find_file(monkeypatch, textfile, max_size):
+    """
+    Check detection over a file: positions are relative to the file
+    """
+    task = _task(monkeypatch)
+    text = textfile.read_text(encoding="utf-8")
+    data = text.encode("utf-8")
+
+    got = list(task.find_file(textfile, max_size=max_size, lang="en"))
+    exp = [m.start() for m in re.finditer("Alan Turing", text)]
+    assert [p.pos for p in got] == exp
+
+    for pii in got:
+        assert pii.info.lang == "en"
+        d = pii.asdict()
+        assert text[d["start"]:d["end"]] == "Alan Turing"
+        extra = d["extra"]
+        assert data[extra["byte_start"]:extra["byte_end"]] == b"Alan Turing"
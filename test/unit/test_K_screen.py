@@ -0,0 +1,144 @@
+"""
+Test the early-exit PII screening mode
+"""
+
+from unittest.mock import Mock
+
+import pytest
+
+from presidio_analyzer import EntityRecognizer, RecognizerResult
+from presidio_analyzer.predefined_recognizers import SpacyRecognizer
+
+from pii_data.types.doc import DocumentChunk
+
+from pii_extract_plg_presidio.plugin_loader import PiiExtractPluginLoader
+from pii_extract_plg_presidio.task.screen import RecognizerCosts
+
+from taux.monkey_patch import patch_presidio_analyzer
+from taux.taskproc import pii_build_tasks
+
+
+class FakeRecognizer(EntityRecognizer):
+    """
+    A recognizer that detects a fixed word
+    """
+
+    def __init__(self, name, entity, word, score=0.5):
+        self.word = word
+        self.score = score
+        self.calls = 0
+        super().__init__([entity], name=name)
+
+    def load(self):
+        pass
+
+    def analyze(self, text, entities, nlp_artifacts=None):
+        self.calls += 1
+        pos = text.find(self.word)
+        if pos < 0:
+            return []
+        return [RecognizerResult(self.supported_entities[0], pos,
+                                 pos + len(self.word), self.score)]
+
+
+class FakeNer(SpacyRecognizer):
+    """
+    A NER recognizer that detects capitalized words
+    """
+
+    def __init__(self):
+        super().__init__(supported_entities=["PERSON"], name="FakeNer")
+        self.calls = 0
+
+    def analyze(self, text, entities, nlp_artifacts=None):
+        assert nlp_artifacts == "<nlp_artifacts>"
+        self.calls += 1
+        return [RecognizerResult("PERSON", 0, 4, 0.85)] \
+            if text[:1].isupper() else []
+
+
+def _task(monkeypatch, recognizers):
+    mck = patch_presidio_analyzer(monkeypatch, {}, pres_recognizers=recognizers)
+    nlp_engine = Mock()
+    nlp_engine.process_text = Mock(return_value="<nlp_artifacts>")
+    mck.return_value.nlp_engine = nlp_engine
+    tdesc = list(PiiExtractPluginLoader().get_plugin_tasks("en"))
+    return list(pii_build_tasks(tdesc))[0], nlp_engine
+
+
+def _chunk(text):
+    return DocumentChunk("1", text, {"lang": "en"})
+
+
+# ---------------------------------------------------------------------------
+
+
+def test10_costs():
+    """
+    Check the recognizer cost ordering
+    """
+    ner = FakeNer()
+    rec1 = FakeRecognizer("Rec1", "US_PASSPORT", "xxx")
+    rec2 = FakeRecognizer("Rec2", "US_PASSPORT", "yyy")
+
+    costs = RecognizerCosts()
+    assert costs.order([ner, rec2, rec1]) == [rec1, rec2, ner]
+
+    costs.update(rec1, 0.5, 10)
+    costs.update(rec2, 0.1, 10)
+    assert costs.order([ner, rec2, rec1]) == [rec2, rec1, ner]
+
+    costs.update(rec2, 1.1, 10)
+    assert costs.cost(rec2) == pytest.approx(0.03)
+
+
+def test20_no_nlp(monkeypatch):
+    """
+    Check that a pattern hit stops the check before running the NLP pipeline
+    """
+    ner = FakeNer()
+    rec = FakeRecognizer("Passport", "US_PASSPORT", "A12345678")
+    task, nlp = _task(monkeypatch, [ner, rec])
+
+    assert task.contains_pii(_chunk("My passport is A12345678")) is True
+    assert rec.calls == 1
+    assert ner.calls == 0
+    nlp.process_text.assert_not_called()
+
+
+def test21_nlp(monkeypatch):
+    """
+    Check a text needing the NER recognizer
+    """
+    ner = FakeNer()
+    rec = FakeRecognizer("Passport", "US_PASSPORT", "A12345678")
+    task, nlp = _task(monkeypatch, [ner, rec])
+
+    got = task.contains_pii_batch([_chunk("John is here"),
+                                   _chunk("nobody is here")])
+    assert got == [True, False]
+    assert rec.calls == 2
+    assert ner.calls == 2
+    assert nlp.process_text.call_count == 2
+
+
+def test22_min_score(monkeypatch):
+    """
+    Check the minimum score
+    """
+    rec = FakeRecognizer("Passport", "US_PASSPORT", "A12345678", score=0.3)
+    task, _ = _task(monkeypatch, [rec])
+
+    assert task.contains_pii(_chunk("passport A12345678")) is True
+    assert task.contains_pii(_chunk("passport A12345678"), 0.5) is False
+
+
+def test23_unused(monkeypatch):
+    """
+    Check that recognizers for entities not in the task are not used
+    """
+    rec = FakeRecognizer("Other", "CREDIT_CARD", "4111")
+    task, _ = _task(monkeypatch, [rec])
+
+    assert task.contains_pii(_chunk("card 4111")) is False
+    assert rec.calls == 0
@@ -0,0 +1,180 @@
+"""
+Test two-tier cascade detection
+"""
+
+import pytest
+
+from pii_data.helper.exception import ConfigException
+from pii_data.types.doc import DocumentChunk
+
+from pii_extract_plg_presidio import defs
+from pii_extract_plg_presidio.plugin_loader import PiiExtractPluginLoader
+from pii_extract_plg_presidio.task.cascade import cascade_config
+import pii_extract_plg_presidio.task.analyzer as mod_an
+
+from taux.monkey_patch import (AnalyzerEngineMock, PRESIDIO_ENT,
+                               patch_presidio_analyzer, patch_blank_nlp)
+from taux.taskproc import pii_build_tasks
+
+
+TEXT1 = "Mr. John Smith lives in New York, passport 912803456"
+TEXT2 = "No entities here, just passport 912803456"
+
+# First tier: a short PERSON span with low score, plus a pattern result
+RESULTS1 = {
+    TEXT1: [{"start": 4, "end": 8, "entity_type": "PERSON", "score": 0.6},
+            {"start": 43, "end": 52, "entity_type": "US_PASSPORT",
+             "score": 0.4}],
+    TEXT2: [{"start": 32, "end": 41, "entity_type": "US_PASSPORT",
+             "score": 0.4}]
+}
+
+# Second tier: better NER results
+RESULTS2 = {
+    TEXT1: [{"start": 4, "end": 14, "entity_type": "PERSON", "score": 0.85},
+            {"start": 24, "end": 32, "entity_type": "LOCATION", "score": 0.85}]
+}
+
+CASCADE = {
+    "models": [{"lang_code": "en", "model_name": "en_core_web_trf"}],
+    "entities": ["PERSON", "LOCATION", "NRP"]
+}
+
+
+def _task(monkeypatch, cascade):
+    mck = patch_presidio_analyzer(monkeypatch, {})
+    tier1 = AnalyzerEngineMock(RESULTS1, entities=PRESIDIO_ENT)
+    tier2 = AnalyzerEngineMock(RESULTS2, entities=PRESIDIO_ENT)
+    mck.side_effect = [tier1, tier2]
+
+    config = {defs.FMT_CONFIG: {defs.CFG_ENGINE: {defs.CFG_CASCADE: cascade}}}
+    tdesc = list(PiiExtractPluginLoader(config).get_plugin_tasks("en"))
+    return list(pii_build_tasks(tdesc))[0], tier1, tier2
+
+
+def _chunks():
+    return [DocumentChunk("1", TEXT1, {"lang": "en"}),
+            DocumentChunk("2", TEXT2, {"lang": "en"})]
+
+
+# ---------------------------------------------------------------------------
+
+
+def test10_config():
+    """
+    Check the configuration for the second tier
+    """
+    config = {defs.CFG_ENGINE: {"nlp_engine_name": "spacy",
+                                "models": [{"lang_code": "en",
+                                            "model_name": "en_core_web_sm"}],
+                                defs.CFG_CASCADE: CASCADE}}
+    got = cascade_config(config)
+    assert got[defs.CFG_ENGINE] == {"nlp_engine_name": "spacy",
+                                    "models": CASCADE["models"]}
+    assert mod_an.engine_key(got) != mod_an.engine_key(config)
+
+    with pytest.raises(ConfigException):
+        cascade_config({defs.CFG_ENGINE: {defs.CFG_CASCADE: {"models": []}}})
+
+
+def test20_candidates(monkeypatch):
+    """
+    Check the cascade with the default trigger
+    """
+    task, tier1, tier2 = _task(monkeypatch, CASCADE)
+    assert len(mod_an.ENGINE_CACHE) == 2
+
+    got = task.find_batch(_chunks())
+    assert [(p.info.pii.name, p.fields["value"]) for p in got[0]] == [
+        ("PERSON", "John Smith"), ("LOCATION", "New York"),
+        ("GOV_ID", "912803456")
+    ]
+    assert [p.fields["value"] for p in got[1]] == ["912803456"]
+
+    # Only the first text went to the second tier, for the NER entities
+    assert list(tier2.call_args) == [TEXT1]
+    assert sorted(tier2.call_args[TEXT1]["entities"]) == ["LOCATION", "NRP",
+                                                          "PERSON"]
+    assert task.cascade_stats() == {"chunks": 2, "triggered": 1, "rate": 0.5}
+
+
+def test21_low_score(monkeypatch):
+    """
+    Check the cascade triggered only by low scores
+    """
+    cascade = {**CASCADE, "trigger": "low_score", "min_score": 0.5}
+    task, tier1, tier2 = _task(monkeypatch, cascade)
+
+    got = list(task.find(_chunks()[0]))
+    assert [p.fields["value"] for p in got] == ["John", "912803456"]
+    assert tier2.call_args == {}
+    assert task.cascade_stats()["triggered"] == 0
+
+
+def test22_no_cascade(monkeypatch):
+    """
+    Check that there are no cascade stats when it is not configured
+    """
+    patch_presidio_analyzer(monkeypatch, RESULTS1)
+    tdesc = list(PiiExtractPluginLoader().get_plugin_tasks("en"))
+    task = list(pii_build_tasks(tdesc))[0]
+    assert task.cascade_stats() is None
+    assert task.analyzer2 is None
+
+
+class Tier2Mock(AnalyzerEngineMock):
+    """
+    A second-tier engine that, as Presidio does, fails for languages it has
+    no NLP model for
+    """
+
+    def analyze(self, text: str, language: str, **kwargs):
+        if language != "en":
+            raise ValueError(f"No matching recognizers were found for language {language}")
+        return super().analyze(text, language=language, **kwargs)
+
+
+def test30_languages(monkeypatch):
+    """
+    Check a cascade whose models cover only some of the task languages: the
+    other languages skip the second tier
+    """
+    text_es = "El Sr. Juan vive en Madrid"
+    mck = patch_presidio_analyzer(monkeypatch, {})
+    results1 = {**RESULTS1, text_es: [
+        {"start": 7, "end": 11, "entity_type": "PERSON", "score": 0.6}]}
+    tier1 = AnalyzerEngineMock(results1, entities=PRESIDIO_ENT)
+    tier2 = Tier2Mock(RESULTS2, entities=PRESIDIO_ENT)
+    mck.side_effect = [tier1, tier2]
+
+    config = {defs.FMT_CONFIG: {defs.CFG_ENGINE: {defs.CFG_CASCADE: CASCADE}}}
+    tdesc = list(PiiExtractPluginLoader(config).get_plugin_tasks(["en", "es"]))
+    task = list(pii_build_tasks(tdesc))[0]
+
+    got = task.find_batch([DocumentChunk("1", TEXT1, {"lang": "en"}),
+                           DocumentChunk("2", text_es, {"lang": "es"})])
+    assert [p.fields["value"] for p in got[0]] == ["John Smith", "New York",
+                                                   "912803456"]
+    assert [p.fields["value"] for p in got[1]] == ["Juan"]
+    assert list(tier2.call_args) == [TEXT1]
+    assert task.cascade_stats() == {"chunks": 2, "triggered": 1, "rate": 0.5}
+
+
+def test31_languages_engine(monkeypatch):
+    """
+    Check building a multi-language task with a single-language cascade,
+    with real analyzer engines: only the entities for the cascade languages
+    are checked against the second-tier engine
+    """
+    patch_blank_nlp(monkeypatch)
+    cascade = {"models": [{"lang_code": "en", "model_name": "en_blank"}]}
+    config = {defs.FMT_CONFIG: {defs.CFG_ENGINE: {defs.CFG_CASCADE: cascade}}}
+    tdesc = list(PiiExtractPluginLoader(config).get_plugin_tasks())
+    task = list(pii_build_tasks(tdesc))[0]
+    assert sorted(task._ent_map) == ["en", "es", "it"]
+    assert task.analyzer2.supported_languages == ["en"]
+
+    chunk = DocumentChunk("1", "codice fiscale RSSMRA85T10A562S",
+                          {"lang": "it"})
+    got = [p.info.pii.name for p in task.find(chunk)]
+    assert "GOV_ID" in got
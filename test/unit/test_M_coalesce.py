@@ -0,0 +1,104 @@
+"""
+Test coalescing of small chunks in batch processing
+"""
+
+import re
+
+import pytest
+
+from pii_data.helper.exception import ConfigException
+from pii_data.types.doc import DocumentChunk
+
+from pii_extract_plg_presidio import defs
+from pii_extract_plg_presidio.plugin_loader import PiiExtractPluginLoader
+from pii_extract_plg_presidio.task.coalesce import Coalescer
+
+from taux.monkey_patch import Result, patch_presidio_analyzer
+from taux.taskproc import pii_build_tasks
+
+
+CELLS = ["name", "Alan Turing", "born in", "1912", "Maida Vale",
+         "mathematician", "Turing", "Bletchley Park"]
+
+
+def _task(monkeypatch, coalesce):
+    """
+    Build a task with a mock analyzer that detects sequences of capitalized
+    words separated by spaces (which could cross chunk boundaries, if the
+    separator is a space)
+    """
+    mck = patch_presidio_analyzer(monkeypatch, {})
+    calls = []
+
+    def analyze(text, **kwargs):
+        calls.append(text)
+        return [Result(m.start(), m.end(), "PERSON", 0.85)
+                for m in re.finditer(r"[A-Z][a-z]+( +[A-Z][a-z]+)*", text)]
+    mck.return_value.analyze = analyze
+
+    config = {defs.FMT_CONFIG: {defs.CFG_TASK: {defs.CFG_COALESCE: coalesce}}}
+    tdesc = list(PiiExtractPluginLoader(config).get_plugin_tasks("en"))
+    return list(pii_build_tasks(tdesc))[0], calls
+
+
+def _chunks(cells, lang="en"):
+    return [DocumentChunk(str(n), c, {"lang": lang})
+            for n, c in enumerate(cells)]
+
+
+# ---------------------------------------------------------------------------
+
+
+def test10_groups():
+    """
+    Check grouping of requests
+    """
+    ent = ["PERSON"]
+    req = [("a"*5, "en", ent), ("b"*5, "en", ent), ("c"*5, "en", ent),
+           ("d"*5, "es", ent), ("e"*20, "es", ent), ("f"*5, "es", ent)]
+    c = Coalescer({"max_size": 12, "separator": " "})
+    assert c.groups(req) == [[0, 1], [2], [3], [4], [5]]
+
+    with pytest.raises(ConfigException):
+        Coalescer({"separator": "|"})
+
+
+def test20_find_batch(monkeypatch):
+    """
+    Check detection with coalescing: a single analyzer call, entities mapped
+    back to their chunks, the same results as without coalescing
+    """
+    task, calls = _task(monkeypatch, True)
+    got = task.find_batch(_chunks(CELLS))
+    assert len(calls) == 1
+
+    values = [[(p.fields["chunkid"], p.pos, p.fields["value"]) for p in r]
+              for r in got]
+    assert values == [
+        [], [("1", 0, "Alan Turing")], [], [], [("4", 0, "Maida Vale")],
+        [], [("6", 0, "Turing")], [("7", 0, "Bletchley Park")]
+    ]
+
+
+def test21_separator(monkeypatch):
+    """
+    Check that entities crossing a separator are dropped
+    """
+    task, calls = _task(monkeypatch, {"separator": " "})
+    got = task.find_batch(_chunks(["Alan", "Turing", "was", "here"]))
+    assert len(calls) == 1
+    assert got == [[], [], [], []]
+
+
+def test22_max_size(monkeypatch):
+    """
+    Check the size limit & language changes
+    """
+    task, calls = _task(monkeypatch, {"max_size": 30})
+    chunks = _chunks(CELLS[:4]) + _chunks(CELLS[4:], lang="es")
+    got = task.find_batch(chunks)
+    assert calls == ["name\n\nAlan Turing\n\nborn in", "1912",
+                     "Maida Vale\n\nmathematician",
+                     "Turing\n\nBletchley Park"]
+    assert [len(r) for r in got] == [0, 1, 0, 0, 1, 0, 1, 1]
+    assert got[7][0].info.lang == "es"
@@ -0,0 +1,31 @@
+"""
+Test the overhead micro-benchmark tooling
+"""
+
+import json
+
+from bench import overhead as mod
+
+
+def test10_run(tmp_path):
+    """
+    Check running a benchmark & saving the results
+    """
+    out = tmp_path / "bench.json"
+    assert mod.main(["--bench", "pii_list", "--bench", "find_hits",
+                     "--repeat", "1", "--min-time", "0.001",
+                     "run", "--save", str(out)]) == 0
+    with open(out, encoding="utf-8") as f:
+        got = json.load(f)
+    assert sorted(got["results"]) == ["find_hits", "pii_list"]
+    assert all(t > 0 for t in got["results"].values())
+
+
+def test20_compare():
+    """
+    Check flagging slowdowns
+    """
+    baseline = {"results": {"a": 1.0, "b": 2.0, "c": 1.0}}
+    current = {"results": {"a": 1.1, "b": 3.0, "d": 1.0}}
+    got = mod.compare(current, baseline, tolerance=0.2)
+    assert got == {"a": (1.1, False), "b": (1.5, True)}
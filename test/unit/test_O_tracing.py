@@ -0,0 +1,127 @@
+"""
+Test tracing of engine creation & detection
+"""
+
+import json
+from unittest.mock import Mock
+
+import pytest
+
+from pii_data.types.doc import DocumentChunk
+
+from pii_extract_plg_presidio import defs
+from pii_extract_plg_presidio.plugin_loader import PiiExtractPluginLoader
+import pii_extract_plg_presidio.task.tracing as mod
+
+from taux.monkey_patch import patch_presidio_analyzer
+from taux.taskproc import pii_build_tasks
+
+
+TEXT = "The English mathematician Alan Turing is considered the father of AI"
+
+RESULTS = {
+    TEXT: [{"start": 4, "end": 11, "entity_type": "NRP", "score": 0.85},
+           {"start": 26, "end": 37, "entity_type": "PERSON", "score": 0.85}]
+}
+
+
+@pytest.fixture
+def notracer():
+    """
+    Ensure tracing is disabled after the test
+    """
+    yield
+    mod.set_tracer(None)
+
+
+def _task(monkeypatch, tracing=None):
+    mck = patch_presidio_analyzer(monkeypatch, RESULTS)
+    mck.return_value.nlp_engine = Mock()
+    config = {defs.FMT_CONFIG: {defs.CFG_TASK: {defs.CFG_TRACING: tracing}}}
+    tdesc = list(PiiExtractPluginLoader(config).get_plugin_tasks("en"))
+    return list(pii_build_tasks(tdesc))[0]
+
+
+def _chunk():
+    return DocumentChunk("1", TEXT, {"lang": "en"})
+
+
+# ---------------------------------------------------------------------------
+
+
+def test10_disabled(monkeypatch, notracer):
+    """
+    Check that spans are no-ops when tracing is disabled
+    """
+    assert mod.span("test", a=1) is mod.NULL_SPAN
+    task = _task(monkeypatch)
+    assert len(list(task.find(_chunk()))) == 2
+    task.analyzer.nlp_engine.process_text.assert_not_called()
+
+
+def test20_jsonl(monkeypatch, tmp_path, notracer):
+    """
+    Check tracing to a JSON-lines file
+    """
+    name = tmp_path / "trace.jsonl"
+    task = _task(monkeypatch, {"exporter": "jsonl", "file": str(name)})
+    got = list(task.find(_chunk()))
+    assert len(got) == 2
+    task.analyzer.nlp_engine.process_text.assert_called_once()
+
+    with open(name, encoding="utf-8") as f:
+        spans = {s["name"]: s for s in map(json.loads, f)}
+
+    assert list(spans) == ["presidio.engine.build", "presidio.engine",
+                           "presidio.task.init", "presidio.nlp",
+                           "presidio.recognizers", "presidio.convert",
+                           "presidio.find"]
+    assert spans["presidio.engine"]["attributes"]["presidio.cache"] == "miss"
+    assert spans["presidio.engine"]["parent_id"] == \
+        spans["presidio.task.init"]["span_id"]
+
+    find = spans["presidio.find"]
+    assert find["parent_id"] is None
+    assert find["attributes"] == {"presidio.lang": "en",
+                                  "presidio.chunk_length": len(TEXT),
+                                  "presidio.entity_count": 2}
+    for name in ("presidio.nlp", "presidio.recognizers", "presidio.convert"):
+        assert spans[name]["parent_id"] == find["span_id"]
+        assert spans[name]["trace_id"] == find["trace_id"]
+    assert spans["presidio.recognizers"]["attributes"]["presidio.result_count"] == 2
+
+
+def test21_auto(monkeypatch, tmp_path, notracer):
+    """
+    Check that the automatic exporter falls back to a file when there is no
+    OpenTelemetry tracer provider
+    """
+    name = tmp_path / "trace.jsonl"
+    task = _task(monkeypatch, {"exporter": "auto", "file": str(name)})
+    list(task.find(_chunk()))
+    assert isinstance(mod._TRACER, mod.JsonlTracer)
+    assert name.stat().st_size > 0
+
+
+def test30_otel(monkeypatch, notracer):
+    """
+    Check tracing through OpenTelemetry
+    """
+    sdk = pytest.importorskip("opentelemetry.sdk.trace")
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import \
+        InMemorySpanExporter
+
+    exporter = InMemorySpanExporter()
+    provider = sdk.TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    mod.set_tracer(mod.OtelTracer(provider))
+
+    task = _task(monkeypatch)
+    list(task.find(_chunk()))
+
+    spans = {s.name: s for s in exporter.get_finished_spans()}
+    assert spans["presidio.engine"].attributes["presidio.cache"] == "miss"
+    find = spans["presidio.find"]
+    assert find.attributes["presidio.entity_count"] == 2
+    assert spans["presidio.nlp"].parent.span_id == find.context.span_id
@@ -0,0 +1,153 @@
+"""
+Test the sharded, resumable detection job runner
+"""
+
+import re
+import json
+
+import pytest
+
+from pii_data.helper.exception import ProcException
+
+from pii_extract_plg_presidio.plugin_loader import PiiExtractPluginLoader
+import pii_extract_plg_presidio.app.job as mod
+
+from taux.monkey_patch import Result, patch_presidio_analyzer
+from taux.taskproc import pii_build_tasks
+
+
+NAMES = ["Alan Turing", "Ada Lovelace", "Grace Hopper"]
+
+
+def _task(monkeypatch):
+    """
+    Build a task with a mock analyzer that detects some fixed names
+    """
+    mck = patch_presidio_analyzer(monkeypatch, {})
+
+    def analyze(text, **kwargs):
+        return [Result(m.start(), m.end(), "PERSON", 0.85)
+                for m in re.finditer("|".join(NAMES), text)]
+    mck.return_value.analyze = analyze
+
+    tdesc = list(PiiExtractPluginLoader().get_plugin_tasks("en"))
+    return list(pii_build_tasks(tdesc))[0]
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    """
+    Create an input corpus in two files, 45 chunks in total
+    """
+    names = []
+    for f in range(2):
+        name = tmp_path / f"input{f}.jsonl"
+        with open(name, "w", encoding="utf-8") as out:
+            for n in range(20 + 5*f):
+                cid = f"{f}-{n}"
+                data = f"Chunk {cid} mentions {NAMES[n % 3]}"
+                print(json.dumps({"id": cid, "data": data}), file=out)
+                if n % 7 == 0:
+                    print("", file=out)     # blank lines are ignored
+        names.append(str(name))
+    return names
+
+
+def _output(outdir):
+    """
+    Read all the output segments of a job
+    """
+    pii = []
+    for name in sorted((outdir / mod.SEGMENT_DIR).glob("*.jsonl")):
+        with open(name, encoding="utf-8") as f:
+            pii += [json.loads(line) for line in f]
+    return pii
+
+
+# ---------------------------------------------------------------------------
+
+
+def test10_single(monkeypatch, corpus, tmp_path):
+    """
+    Check a job with a single shard
+    """
+    task = _task(monkeypatch)
+    outdir = tmp_path / "out"
+    reports = []
+    job = mod.ShardJob(corpus, outdir, segment_size=10, batch_size=4,
+                       lang="en", report=reports.append)
+    state = job.run(task)
+
+    assert job.segments() == [0, 1, 2, 3, 4]
+    assert state["chunks"] == 45
+    assert state["entities"] == 45
+    assert state["finished"] is True
+    assert state["eta"] == 0
+    assert reports[-1].startswith(". shard 0/1: 45/45 chunks (100.0%)")
+
+    pii = _output(outdir)
+    assert len(pii) == 45
+    assert pii[0]["chunkid"] == "0-0"
+    assert pii[0]["value"] == "Alan Turing"
+
+
+def test20_shards(monkeypatch, corpus, tmp_path):
+    """
+    Check that the shards cover the corpus, without overlaps
+    """
+    task = _task(monkeypatch)
+    outdir = tmp_path / "out"
+    jobs = [mod.ShardJob(corpus, outdir, n, 3, segment_size=7, lang="en",
+                         report=lambda m: None)
+            for n in range(3)]
+    assert [j.segments() for j in jobs] == [[0, 3, 6], [1, 4], [2, 5]]
+
+    states = [j.run(task) for j in jobs]
+    assert [s["chunks"] for s in states] == [7 + 7 + 3, 14, 14]
+    ids = sorted(p["chunkid"] for p in _output(outdir))
+    assert len(ids) == len(set(ids)) == 45
+
+
+def test30_resume(monkeypatch, corpus, tmp_path):
+    """
+    Check resuming an interrupted job: finished segments are not processed
+    again
+    """
+    task = _task(monkeypatch)
+    outdir = tmp_path / "out"
+    find_batch = task.find_batch
+    calls = []
+
+    def failing_find_batch(chunks):
+        calls.append(len(chunks))
+        if len(calls) == 6:
+            raise RuntimeError("killed")
+        return find_batch(chunks)
+    monkeypatch.setattr(task, "find_batch", failing_find_batch)
+
+    job = mod.ShardJob(corpus, outdir, segment_size=10, batch_size=5,
+                       lang="en", report=lambda m: None)
+    with pytest.raises(RuntimeError):
+        job.run(task)
+    assert len(_output(outdir)) == 20           # two segments done
+    assert not list((outdir / mod.SEGMENT_DIR).glob("*.tmp"))
+
+    # Resume: only the remaining 3 segments are processed
+    calls.clear()
+    state = job.run(task)
+    assert sum(calls) == 25
+    assert state["chunks"] == 45
+    assert state["finished"] is True
+    assert len(_output(outdir)) == 45
+
+
+def test40_manifest(corpus, tmp_path):
+    """
+    Check that a job cannot be resumed with different parameters
+    """
+    outdir = tmp_path / "out"
+    mod.ShardJob(corpus, outdir, segment_size=10)
+    with pytest.raises(ProcException):
+        mod.ShardJob(corpus, outdir, segment_size=20)
+    with pytest.raises(ProcException):
+        mod.ShardJob(corpus, outdir, 2, 2)
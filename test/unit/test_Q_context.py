@@ -0,0 +1,178 @@
+"""
+Test the indexed context-aware enhancer
+"""
+
+import random
+from unittest.mock import Mock
+
+import pytest
+import spacy
+
+from presidio_analyzer import (PatternRecognizer, Pattern, RecognizerResult,
+                               AnalysisExplanation)
+from presidio_analyzer.context_aware_enhancers import LemmaContextAwareEnhancer
+from presidio_analyzer.nlp_engine import NlpArtifacts
+
+from pii_data.helper.exception import ConfigException
+
+from pii_extract_plg_presidio import defs
+from pii_extract_plg_presidio.plugin_loader import load_presidio_plugin_config
+import pii_extract_plg_presidio.task.context as mod
+import pii_extract_plg_presidio.task.analyzer as mod_an
+
+from taux.monkey_patch import patch_presidio_analyzer
+
+
+WORDS = ["phone", "telephone", "call", "number", "the", "card", "credit",
+         "my", "is", "and", "id", "passport", "please", "xx", "visa"]
+
+CONTEXT = {"PHONE": ["phone", "call"], "CARD": ["credit", "card", "visa"],
+           "ID": ["passport"], "OTHER": []}
+
+
+def _recognizers():
+    return [PatternRecognizer(ent, patterns=[Pattern(ent, "xx", 0.3)],
+                              context=ctx, supported_language="en")
+            for ent, ctx in CONTEXT.items()]
+
+
+def _artifacts(text: str) -> NlpArtifacts:
+    """
+    Build NLP artifacts for a text, with the words as lemmas & keywords
+    """
+    doc = spacy.blank("en")(text)
+    engine = Mock()
+    engine.is_stopword = lambda word, lang: word in ("the", "my", "is", "and")
+    engine.is_punct = lambda word, lang: False
+    return NlpArtifacts(entities=[], tokens=doc,
+                        tokens_indices=[t.idx for t in doc],
+                        lemmas=[t.text for t in doc],
+                        nlp_engine=engine, language="en")
+
+
+def _results(text: str, recognizers):
+    """
+    Build a result for each "xx" word in the text, with a random recognizer
+    """
+    out = []
+    pos = text.find("xx")
+    while pos >= 0:
+        rec = random.choice(recognizers)
+        expl = AnalysisExplanation(rec.name, 0.3)
+        out.append(RecognizerResult(
+            rec.supported_entities[0], pos, pos + 2, 0.3, expl,
+            {RecognizerResult.RECOGNIZER_IDENTIFIER_KEY: rec.id}))
+        pos = text.find("xx", pos + 2)
+    return out
+
+
+def _summary(results):
+    return [(r.entity_type, r.start, r.score,
+             r.analysis_explanation.supportive_context_word)
+            for r in results]
+
+
+# ---------------------------------------------------------------------------
+
+
+@pytest.mark.parametrize("prefix,suffix", [(5, 0), (2, 3), (0, 0)])
+@pytest.mark.parametrize("mode", ["substring", "whole_word"])
+def test10_same_as_lemma(prefix, suffix, mode):
+    """
+    Check that results are the same as for the Presidio enhancer, on random
+    texts
+    """
+    random.seed(42)
+    recognizers = _recognizers()
+    ref = LemmaContextAwareEnhancer(context_prefix_count=prefix,
+                                    context_suffix_count=suffix,
+                                    context_matching_mode=mode)
+    enh = mod.IndexedContextEnhancer(context_prefix_count=prefix,
+                                     context_suffix_count=suffix,
+                                     context_matching_mode=mode)
+    enh.build_index(recognizers)
+    for _ in range(50):
+        text = " ".join(random.choices(WORDS, k=30))
+        nlp = _artifacts(text)
+        results = _results(text, recognizers)
+        context = random.choice([None, [], ["Visa"]])
+        exp = ref.enhance_using_context(text, results, nlp, recognizers,
+                                        context)
+        got = enh.enhance_using_context(text, results, nlp, recognizers,
+                                        context)
+        assert _summary(got) == _summary(exp)
+        assert all(r.score == 0.3 for r in results)     # input unchanged
+
+
+def test20_window():
+    """
+    Check the window sizes
+    """
+    text = "phone the xx is xx my card number"
+    recognizers = _recognizers()
+    nlp = _artifacts(text)
+
+    enh = mod.IndexedContextEnhancer(context_prefix_count=1,
+                                     context_suffix_count=0)
+    phone = recognizers[0]
+    results = [RecognizerResult("PHONE", 10, 12, 0.3, AnalysisExplanation("P", 0.3),
+                                {RecognizerResult.RECOGNIZER_IDENTIFIER_KEY: phone.id})]
+    got = enh.enhance_using_context(text, results, nlp, recognizers)
+    assert got[0].score == pytest.approx(0.65)
+    assert got[0].analysis_explanation.supportive_context_word == "phone"
+
+    # The second "xx" is too far from "phone", and "card" is not in the window
+    card = recognizers[1]
+    results = [RecognizerResult("CARD", 16, 18, 0.3, AnalysisExplanation("C", 0.3),
+                                {RecognizerResult.RECOGNIZER_IDENTIFIER_KEY: card.id})]
+    got = enh.enhance_using_context(text, results, nlp, recognizers)
+    assert got[0].score == 0.3
+
+    enh = mod.IndexedContextEnhancer(context_prefix_count=1,
+                                     context_suffix_count=1)
+    got = enh.enhance_using_context(text, results, nlp, recognizers)
+    assert got[0].score == pytest.approx(0.65)
+    assert got[0].analysis_explanation.supportive_context_word == "card"
+
+
+def test30_config():
+    """
+    Check creating enhancers from the configuration
+    """
+    enh = mod.context_enhancer({"context_suffix_count": 3})
+    assert isinstance(enh, mod.IndexedContextEnhancer)
+    assert enh.context_suffix_count == 3
+
+    enh = mod.context_enhancer({"type": "lemma"})
+    assert isinstance(enh, LemmaContextAwareEnhancer)
+
+    with pytest.raises(ConfigException):
+        mod.context_enhancer({"type": "unknown"})
+    with pytest.raises(ConfigException):
+        mod.context_enhancer({"context_matching_mode": "fuzzy"})
+    with pytest.raises(ConfigException):
+        mod.context_enhancer({"window": 3})
+
+
+def test40_engine_key(monkeypatch):
+    """
+    Check that engines with different analyzer params are not shared
+    """
+    mck = patch_presidio_analyzer(monkeypatch, {})
+    mck.side_effect = lambda **kwargs: Mock()
+    config = load_presidio_plugin_config()
+    key0 = mod_an.engine_key(config, ["en"])
+    engine0 = mod_an.presidio_analyzer(config, ["en"])
+
+    keys, engines = [], []
+    for suffix in (1, 2, 1):
+        config[defs.CFG_ENGINE][defs.CFG_PARAMS] = {
+            "context_aware_enhancer": {"context_suffix_count": suffix}}
+        keys.append(mod_an.engine_key(config, ["en"]))
+        engines.append(mod_an.presidio_analyzer(config, ["en"]))
+
+    assert keys[0].startswith(key0 + "/") and keys[0] != keys[1]
+    assert keys[0] == keys[2]
+    assert engines[0] is not engine0 and engines[0] is not engines[1]
+    assert engines[0] is engines[2]
+    assert mck.call_count == 3
@@ -0,0 +1,122 @@
+"""
+Test the parallel loading of NLP models
+"""
+
+import time
+
+import pytest
+
+from pii_data.helper.exception import ProcException
+
+from pii_extract_plg_presidio import defs
+from pii_extract_plg_presidio.plugin_loader import load_presidio_plugin_config
+import pii_extract_plg_presidio.task.analyzer as mod
+
+from taux.monkey_patch import patch_presidio_analyzer
+
+
+DELAY = 0.3
+
+
+class NlpEngineMock:
+
+    def __init__(self, models):
+        self.models = models
+        self.nlp = None
+
+    def load(self):
+        time.sleep(DELAY)
+        self.nlp = {}
+        for m in self.models:
+            if m["model_name"].startswith("missing"):
+                raise OSError(f"cannot find model {m['model_name']}")
+            self.nlp[m["lang_code"]] = f"<{m['model_name']}>"
+
+
+class NlpEngineProviderMock:
+
+    def __init__(self, nlp_configuration):
+        self.config = nlp_configuration
+
+    def create_engine(self):
+        engine = NlpEngineMock(self.config["models"])
+        engine.load()
+        return engine
+
+
+@pytest.fixture
+def config(monkeypatch):
+    patch_presidio_analyzer(monkeypatch, {})
+    monkeypatch.setattr(mod, "NlpEngineProvider", NlpEngineProviderMock)
+    config = load_presidio_plugin_config()
+    config[defs.CFG_ENGINE][defs.CFG_REUSE] = False
+    return config
+
+
+def _nlp_engine(config, logger=None):
+    """
+    Build an engine, and return the NLP engine passed to it
+    """
+    mod.presidio_analyzer(config, logger=logger)
+    return mod.AnalyzerEngine.call_args.kwargs["nlp_engine"]
+
+
+# ---------------------------------------------------------------------------
+
+
+def test10_serial(monkeypatch, config):
+    """
+    Check the default loading (all models in one NLP engine)
+    """
+    engine = _nlp_engine(config)
+    assert sorted(engine.nlp) == ["en", "es", "it"]
+
+
+def test20_parallel(monkeypatch, config):
+    """
+    Check parallel loading: all models end up in a single NLP engine, and
+    load times are logged per model
+    """
+    config[defs.CFG_ENGINE][defs.CFG_PARALLEL] = True
+    msgs = []
+
+    def logger(msg, *args):
+        msgs.append(msg % args)
+
+    start = time.perf_counter()
+    engine = _nlp_engine(config, logger)
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 2*DELAY
+    assert engine.nlp == {"en": "<en_core_web_lg>", "es": "<es_core_news_md>",
+                          "it": "<it_core_news_md>"}
+    assert [m["lang_code"] for m in engine.models] == ["en", "es", "it"]
+    loaded = sorted(m.split()[4] for m in msgs if "loaded" in m)
+    assert loaded == ["en:en_core_web_lg", "es:es_core_news_md",
+                      "it:it_core_news_md"]
+
+
+def test30_parallel_errors(monkeypatch, config):
+    """
+    Check that all failing models are reported
+    """
+    cfg = config[defs.CFG_ENGINE]
+    cfg[defs.CFG_PARALLEL] = 2
+    cfg["models"][0]["model_name"] = "missing_en"
+    cfg["models"][2]["model_name"] = "missing_it"
+    with pytest.raises(ProcException) as e:
+        mod.presidio_analyzer(config)
+    msg = str(e.value)
+    assert "en:missing_en: cannot find model missing_en" in msg
+    assert "it:missing_it" in msg
+    assert "es:" not in msg
+
+
+def test40_engine_key(config):
+    """
+    Check that parallel loading does not change the engine cache key: the
+    engine built is the same either way
+    """
+    key = mod.engine_key(config)
+    config[defs.CFG_ENGINE][defs.CFG_PARALLEL] = 2
+    assert mod.engine_key(config) == key
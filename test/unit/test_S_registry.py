@@ -0,0 +1,150 @@
+"""
+Test the pruned recognizer registry
+"""
+
+import pickle
+from unittest.mock import Mock
+
+import pytest
+
+from pii_data.types.doc import DocumentChunk
+
+from pii_extract_plg_presidio import defs
+from pii_extract_plg_presidio.plugin_loader import load_presidio_plugin_config, \
+    PiiExtractPluginLoader
+import pii_extract_plg_presidio.task.registry as mod
+import pii_extract_plg_presidio.task.analyzer as mod_an
+
+from taux.monkey_patch import Result, patch_presidio_analyzer
+from taux.taskproc import pii_build_tasks
+
+
+def _nlp_engine():
+    """
+    A mock NLP engine, enough for the registry to add the NLP recognizer
+    """
+    engine = Mock()
+    engine.get_supported_languages = Mock(return_value=["en", "es", "it"])
+    engine.get_supported_entities = Mock(return_value=["PERSON", "LOCATION",
+                                                       "NRP", "DATE_TIME"])
+    return engine
+
+
+@pytest.fixture
+def mock_analyzer(monkeypatch):
+    mck = patch_presidio_analyzer(monkeypatch, {})
+    provider = mod_an.NlpEngineProvider.return_value
+    provider.create_engine = Mock(return_value=_nlp_engine())
+    return mck
+
+
+# ---------------------------------------------------------------------------
+
+
+def test10_used_entities():
+    """
+    Check the entities used in the default config
+    """
+    config = load_presidio_plugin_config()
+    got = mod.used_entities(config, {"en", "it"})
+    assert got == {
+        "en": {"PERSON", "NRP", "LOCATION", "US_PASSPORT", "US_DRIVER_LICENSE"},
+        "it": {"PERSON", "NRP", "LOCATION", "IT_FISCAL_CODE",
+               "IT_IDENTITY_CARD"}
+    }
+    assert mod.entities_key(got) == mod.entities_key(dict(reversed(got.items())))
+
+
+def test20_pruned_registry():
+    """
+    Check pruning the registry
+    """
+    entities = {"en": {"PERSON", "US_PASSPORT"}, "it": {"IT_FISCAL_CODE"}}
+    registry, pruned = mod.pruned_registry(["en", "it"], entities,
+                                           _nlp_engine())
+    got = sorted((r.name, r.supported_language) for r in registry.recognizers)
+    assert got == [("ItFiscalCodeRecognizer", "it"),
+                   ("SpacyRecognizer", "en"),
+                   ("UsPassportRecognizer", "en")]
+    names = {(r.name, r.supported_language) for r in pruned}
+    assert ("CreditCardRecognizer", "en") in names
+    assert ("SpacyRecognizer", "it") in names
+
+
+def test21_pruned_registry_legacy(monkeypatch):
+    """
+    Check pruning the registry with a Presidio version without the registry
+    provider
+    """
+    import presidio_analyzer.recognizer_registry as mod_reg
+    entities = {"en": {"PERSON", "US_PASSPORT"}, "it": {"IT_FISCAL_CODE"}}
+    exp = mod.pruned_registry(["en", "it"], entities, _nlp_engine())[0]
+
+    monkeypatch.delattr(mod_reg, "RecognizerRegistryProvider")
+    registry, pruned = mod.pruned_registry(["en", "it"], entities,
+                                           _nlp_engine())
+    got = sorted((r.name, r.supported_language) for r in registry.recognizers)
+    assert got == sorted((r.name, r.supported_language)
+                         for r in exp.recognizers)
+    assert ("CreditCardRecognizer", "en") in {(r.name, r.supported_language)
+                                               for r in pruned}
+
+
+def test30_engine(mock_analyzer):
+    """
+    Check building an engine with a pruned registry
+    """
+    config = load_presidio_plugin_config()
+    key_full = mod_an.engine_key(config, ["en"])
+    engine_full = mod_an.presidio_analyzer(config, ["en"])
+    assert "registry" not in mock_analyzer.call_args.kwargs
+    assert mod_an.pruned_recognizers(engine_full) is None
+
+    config[defs.CFG_ENGINE][defs.CFG_PRUNE] = True
+    key = mod_an.engine_key(config, ["en"])
+    assert key.startswith(key_full + "/pruned:")
+
+    mock_analyzer.return_value = Mock()
+    engine = mod_an.presidio_analyzer(config, ["en"])
+    assert engine is not engine_full
+    assert mod_an.ENGINE_CACHE[key] is engine
+
+    registry = mock_analyzer.call_args.kwargs["registry"]
+    got = sorted(r.name for r in registry.recognizers)
+    assert got == ["SpacyRecognizer", "UsLicenseRecognizer",
+                   "UsPassportRecognizer"]
+    pruned = mod_an.pruned_recognizers(engine)
+    assert "UsSsnRecognizer" in {r.name for r in pruned}
+
+
+def test40_task(mock_analyzer):
+    """
+    Check a task built through the plugin loader with a pruned registry:
+    detection, and pickling
+    """
+    mock_analyzer.return_value.analyze = lambda text, **kwargs: [
+        Result(8, 12, "PERSON", 0.85)]
+    config = {defs.FMT_CONFIG: {defs.CFG_ENGINE: {defs.CFG_PRUNE: True}}}
+    tdesc = list(PiiExtractPluginLoader(config).get_plugin_tasks("en"))
+    task = list(pii_build_tasks(tdesc))[0]
+
+    registry = mock_analyzer.call_args.kwargs["registry"]
+    got = sorted(r.name for r in registry.recognizers)
+    assert got == ["SpacyRecognizer", "UsLicenseRecognizer",
+                   "UsPassportRecognizer"]
+
+    # The task uses the same engine as the one for the full plugin config
+    full_config = load_presidio_plugin_config()
+    full_config[defs.CFG_ENGINE][defs.CFG_PRUNE] = True
+    key = mod_an.engine_key(full_config, ["en"])
+    assert "/pruned:" in key
+    assert mod_an.ENGINE_CACHE[key] is task.analyzer
+
+    chunk = DocumentChunk("1", "This is Anna", {"lang": "en"})
+    assert [p.fields["value"] for p in task.find(chunk)] == ["Anna"]
+
+    task2 = pickle.loads(pickle.dumps(task))
+    assert task2.__getstate__()["_engine_key"] == key
+    assert [p.fields["value"] for p in task2.find(chunk)] == ["Anna"]
+    assert task2.analyzer is task.analyzer
+    assert mock_analyzer.call_count == 1
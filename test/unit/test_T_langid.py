@@ -0,0 +1,125 @@
+"""
+Test the language identification for chunks without a language
+"""
+
+import pytest
+
+from pii_data.helper.exception import ProcException, ConfigException
+from pii_data.types.doc import DocumentChunk
+
+from pii_extract_plg_presidio import defs
+from pii_extract_plg_presidio.plugin_loader import PiiExtractPluginLoader
+import pii_extract_plg_presidio.task.langid as mod
+
+from taux.monkey_patch import Result, patch_presidio_analyzer
+from taux.taskproc import pii_build_tasks
+
+
+TEXTS = {
+    "en": "His name is John Smith and he lives in the house near the river.",
+    "es": "Su nombre es Juan García y vive en la casa que está junto al río.",
+    "it": "Il suo nome è Mario Rossi e abita nella casa vicino al fiume."
+}
+
+
+def _task(monkeypatch, langid):
+    """
+    Build a task for all languages, with a mock analyzer that returns a
+    PERSON entity at the start of each text
+    """
+    mck = patch_presidio_analyzer(monkeypatch, {})
+    calls = []
+
+    def analyze(text, language, **kwargs):
+        calls.append(language)
+        return [Result(0, 3, "PERSON", 0.85)]
+    mck.return_value.analyze = analyze
+
+    config = {defs.FMT_CONFIG: {defs.CFG_TASK: {defs.CFG_LANGID: langid}}}
+    tdesc = list(PiiExtractPluginLoader(config).get_plugin_tasks())
+    return list(pii_build_tasks(tdesc))[0], calls
+
+
+# ---------------------------------------------------------------------------
+
+
+def test10_identify():
+    """
+    Check identification & confidence
+    """
+    ident = mod.LangIdentifier(["en", "es", "it"], True)
+    for lang, text in TEXTS.items():
+        got, conf = ident.identify(text)
+        assert got == lang
+        assert 0.9 < conf <= 1
+
+    # No letters: all languages are equally probable
+    assert ident.scores("1234") == pytest.approx({"en": 1/3, "es": 1/3,
+                                                  "it": 1/3})
+
+    # Low confidence
+    ident = mod.LangIdentifier(["en", "es"], {"min_confidence": 0.6,
+                                              "default": "es"})
+    assert ident.identify("1234") == ("es", 0.5)
+
+
+def test11_cache():
+    """
+    Check the decision cache
+    """
+    ident = mod.LangIdentifier(["en", "es", "it"], {"cache_size": 2})
+    ident.identify(TEXTS["en"])
+    ident.identify(TEXTS["en"])
+    ident.identify(TEXTS["es"])
+    assert len(ident._cache) == 2
+    ident.identify(TEXTS["it"])
+    assert len(ident._cache) == 1
+
+
+def test12_no_profile():
+    """
+    Check languages without a profile
+    """
+    with pytest.raises(ConfigException):
+        mod.LangIdentifier(["en", "xx"], True)
+
+
+def test20_task_find(monkeypatch):
+    """
+    Check language identification in a multi-language task
+    """
+    task, calls = _task(monkeypatch, True)
+    for lang, text in TEXTS.items():
+        got = list(task.find(DocumentChunk("1", text)))
+        assert calls[-1] == lang
+        assert got[0].info.lang == lang
+        assert got[0].fields["process"]["lang_confidence"] > 0.9
+
+    # A chunk language has precedence
+    got = list(task.find(DocumentChunk("1", TEXTS["en"], {"lang": "it"})))
+    assert calls[-1] == "it"
+    assert "lang_confidence" not in got[0].fields["process"]
+
+
+def test21_task_batch(monkeypatch):
+    """
+    Check language identification in a mixed-language batch
+    """
+    task, calls = _task(monkeypatch, True)
+    chunks = [DocumentChunk(str(n), t) for n, t in enumerate(TEXTS.values())]
+    got = task.find_batch(chunks)
+    assert calls == ["en", "es", "it"]
+    assert [e[0].info.lang for e in got] == ["en", "es", "it"]
+
+
+def test30_task_no_langid(monkeypatch):
+    """
+    Check a multi-language task without language identification
+    """
+    task, _ = _task(monkeypatch, None)
+    with pytest.raises(ProcException):
+        list(task.find(DocumentChunk("1", TEXTS["en"])))
+
+    task, _ = _task(monkeypatch, {"min_confidence": 0.99})
+    with pytest.raises(ProcException):
+        list(task.find(DocumentChunk("1", "1234")))
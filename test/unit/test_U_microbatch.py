@@ -0,0 +1,141 @@
+"""
+Test the micro-batching front end
+"""
+
+import re
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from pii_data.helper.exception import ProcException
+from pii_data.types.doc import DocumentChunk
+
+from pii_extract_plg_presidio.plugin_loader import PiiExtractPluginLoader
+from pii_extract_plg_presidio.task.microbatch import MicroBatcher
+
+from taux.monkey_patch import Result, patch_presidio_analyzer, patch_blank_nlp
+from taux.taskproc import pii_build_tasks
+
+
+@pytest.fixture
+def task(monkeypatch):
+    """
+    Build a task with a (slow) mock analyzer that detects "Name<number>"
+    """
+    mck = patch_presidio_analyzer(monkeypatch, {})
+
+    def analyze(text, **kwargs):
+        time.sleep(0.002)
+        return [Result(m.start(), m.end(), "PERSON", 0.85)
+                for m in re.finditer(r"Name\d+", text)]
+    mck.return_value.analyze = analyze
+
+    tdesc = list(PiiExtractPluginLoader().get_plugin_tasks("en"))
+    return list(pii_build_tasks(tdesc))[0]
+
+
+def _chunk(n: int, lang: str = "en") -> DocumentChunk:
+    return DocumentChunk(str(n), f"This is Name{n}", {"lang": lang})
+
+
+# ---------------------------------------------------------------------------
+
+
+def test10_light(task):
+    """
+    Check sequential requests: no batching, no waiting
+    """
+    with MicroBatcher(task, max_wait=1) as mb:
+        start = time.perf_counter()
+        for n in range(10):
+            got = mb.find(_chunk(n))
+            assert [p.fields["value"] for p in got] == [f"Name{n}"]
+        assert time.perf_counter() - start < 1
+        st = mb.stats()
+    assert st["requests"] == st["batches"] == 10
+    assert st["target"] == 1
+
+
+def test20_threads(task):
+    """
+    Check concurrent requests from threads: each caller gets its own results,
+    and requests are batched
+    """
+    def call(n):
+        return n, mb.find(_chunk(n))
+
+    with MicroBatcher(task, max_batch=16) as mb:
+        with ThreadPoolExecutor(32) as pool:
+            results = list(pool.map(call, range(200)))
+        st = mb.stats()
+
+    for n, got in results:
+        assert [(p.fields["value"], p.fields["chunkid"]) for p in got] == [(f"Name{n}", str(n))]
+    assert st["requests"] == 200
+    assert st["batches"] < 200
+    assert 1 < st["max_size"] <= 16
+
+
+def test30_async(task):
+    """
+    Check requests from coroutines
+    """
+    async def main(mb):
+        return await asyncio.gather(*(mb.find_async(_chunk(n))
+                                      for n in range(20)))
+
+    with MicroBatcher(task) as mb:
+        results = asyncio.run(main(mb))
+    assert [[p.fields["value"] for p in r] for r in results] == \
+        [[f"Name{n}"] for n in range(20)]
+
+
+def test40_errors(task):
+    """
+    Check that an error in a chunk goes only to its caller
+    """
+    with MicroBatcher(task, max_wait=0.2) as mb:
+        futures = [mb.submit(_chunk(n, "en" if n != 3 else "xx"))
+                   for n in range(6)]
+        with pytest.raises(ProcException):
+            futures[3].result()
+        for n in (0, 1, 2, 4, 5):
+            assert futures[n].result()[0].fields["value"] == f"Name{n}"
+
+    with pytest.raises(RuntimeError):
+        mb.submit(_chunk(0))
+
+
+def test50_nlp_batch(monkeypatch):
+    """
+    Check that a batch analyzed by an in-process engine runs the NLP pipeline
+    once, over all its texts
+    """
+    from presidio_analyzer.nlp_engine import SpacyNlpEngine
+    patch_blank_nlp(monkeypatch)
+    calls = []
+    process_batch = SpacyNlpEngine.process_batch
+
+    def spy(self, texts, language, **kwargs):
+        calls.append((len(texts), language))
+        return process_batch(self, texts, language, **kwargs)
+    monkeypatch.setattr(SpacyNlpEngine, "process_batch", spy)
+
+    tdesc = list(PiiExtractPluginLoader().get_plugin_tasks("en"))
+    task = list(pii_build_tasks(tdesc))[0]
+    chunks = [DocumentChunk(str(n), f"My passport number is 91280345{n}",
+                            {"lang": "en"})
+              for n in range(6)]
+    exp = [[p.fields["value"] for p in task.find(c)] for c in chunks]
+    assert calls == []
+
+    with MicroBatcher(task, max_wait=0.2) as mb:
+        futures = [mb.submit(c) for c in chunks]
+        got = [[p.fields["value"] for p in f.result()] for f in futures]
+    assert got == exp
+    assert "912803450" in exp[0]
+    assert sum(n for n, _ in calls) == 6
+    assert all(lang == "en" for _, lang in calls)
+    assert max(n for n, _ in calls) > 1
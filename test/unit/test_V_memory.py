@@ -0,0 +1,71 @@
+"""
+Test the memory report
+"""
+
+import json
+
+from pii_extract_plg_presidio.plugin_loader import load_presidio_plugin_config
+import pii_extract_plg_presidio.app.memory as mod
+import pii_extract_plg_presidio.app.info as info
+
+from taux.monkey_patch import patch_presidio_analyzer
+
+
+def test10_probe():
+    """
+    Check measuring memory growth
+    """
+    probe = mod.MemoryProbe()
+    try:
+        data, got = probe.measure(lambda: [bytearray(1000) for _ in range(1000)])
+    finally:
+        probe.close()
+    assert len(data) == 1000
+    assert got["heap_delta"] >= 1000*1000
+    assert got["heap_peak"] >= got["heap_delta"]
+    assert got["rss"] > 0
+
+
+def test11_probe_no_peak(monkeypatch):
+    """
+    Check measuring memory growth without heap peaks (as in Python 3.8)
+    """
+    monkeypatch.setattr(mod, "HEAP_PEAK", False)
+    probe = mod.MemoryProbe()
+    try:
+        _, got = probe.measure(lambda: [bytearray(1000) for _ in range(1000)])
+    finally:
+        probe.close()
+    assert got["heap_delta"] >= 1000*1000
+    assert "heap_peak" not in got
+
+
+def test20_report(monkeypatch):
+    """
+    Check the memory report, with a mock engine
+    """
+    mck = patch_presidio_analyzer(monkeypatch, {})
+    config = load_presidio_plugin_config()
+    chunks = mod.sample_chunks(["en", "it", "xx"])
+    got = mod.memory_report(config, ["en", "it"], chunks, repeat=2)
+
+    assert [m["lang"] for m in got["models"]] == ["en", "it"]
+    assert got["models"][1]["model"] == "it_core_news_md"
+    assert got["first_pass"]["chunks"] == 2
+    assert got["first_pass"]["skipped"] == 1
+    assert got["steady_state"]["passes"] == 2
+    assert set(got["total"]) == {"rss", "rss_delta", "heap_delta"}
+    assert len(mck.return_value.call_args) == 2
+
+
+def test30_command(monkeypatch, tmp_path):
+    """
+    Check the info script command
+    """
+    patch_presidio_analyzer(monkeypatch, {})
+    out = tmp_path / "memory.json"
+    info.main(["memory", "--lang", "es", "--no-heap", "--outfile", str(out)])
+    with open(out, encoding="utf-8") as f:
+        got = json.load(f)
+    assert got["languages"] == ["es"]
+    assert "heap_delta" not in got["models"][0]
@@ -0,0 +1,145 @@
+"""
+Test pre-screening of texts
+"""
+
+import re
+
+import pytest
+
+from pii_data.helper.exception import ConfigException
+from pii_data.types.doc import DocumentChunk
+
+from pii_extract_plg_presidio import defs
+from pii_extract_plg_presidio.plugin_loader import load_presidio_plugin_config
+import pii_extract_plg_presidio.task.prescreen as mod
+
+from taux.monkey_patch import Result, patch_presidio_analyzer
+
+import bench.prescreen as bench
+
+
+def _analyze(text, **kwargs):
+    """
+    A mock analyzer: capitalized words are PERSON, 9-digit numbers are
+    US_PASSPORT
+    """
+    return [Result(m.start(), m.end(),
+                   "US_PASSPORT" if m.group()[0].isdigit() else "PERSON", 0.85)
+            for m in re.finditer(r"\b[A-Z]\w+|\b\d{9}\b", text)]
+
+
+def _task(monkeypatch, prescreen, languages=("en",)):
+    mck = patch_presidio_analyzer(monkeypatch, {})
+    mck.return_value.analyze = _analyze
+    config = load_presidio_plugin_config()
+    config[defs.CFG_ENGINE]["models"] = [
+        m for m in config[defs.CFG_ENGINE]["models"]
+        if m["lang_code"] in languages]
+    return bench.build_task(config, prescreen)
+
+
+CHUNKS = [
+    DocumentChunk("1", "My name is Jane", {"lang": "en"}),
+    DocumentChunk("2", "nothing to see here", {"lang": "en"}),
+    DocumentChunk("3", "passport 123456789", {"lang": "en"}),
+    DocumentChunk("4", "... --- ...", {"lang": "en"}),
+]
+
+
+# ---------------------------------------------------------------------------
+
+
+def test10_conditions():
+    """
+    Check the condition functions
+    """
+    cond = mod.CONDITIONS
+    assert cond["capitalized"]("hello Élodie")
+    assert not cond["capitalized"]("hello 123")
+    assert cond["letters"]("a bc")
+    assert not cond["letters"]("1 2 a")
+    assert cond["alnum"]("code X12")
+    assert not cond["alnum"]("code 12")
+    assert cond["email"]("me@there")
+
+
+def test20_keep():
+    """
+    Check the decision for a set of entities
+    """
+    ps = mod.Prescreen(True)
+    assert ps.keep("Alice", ["PERSON", "US_SSN"])
+    assert ps.keep("call 555", ["PERSON", "PHONE_NUMBER"])
+    assert not ps.keep("call me", ["PERSON", "PHONE_NUMBER"])
+    # Entities without a condition are always analyzed
+    assert ps.keep("call me", ["PERSON", "CUSTOM"])
+
+    ps = mod.Prescreen({"conditions": {"PERSON": "letters"}})
+    assert ps.keep("call me", ["PERSON", "PHONE_NUMBER"])
+
+
+def test30_config_error():
+    """
+    Check an unknown condition
+    """
+    with pytest.raises(ConfigException):
+        mod.Prescreen({"conditions": {"PERSON": "uppercase"}})
+
+
+def test40_run():
+    """
+    Check running an analyzer over a list of requests
+    """
+    ps = mod.Prescreen(True)
+    requests = [("Alice", "en", ["PERSON"]), ("bob", "en", ["PERSON"]),
+                ("Carol", "en", ["PERSON"])]
+    called = []
+
+    def analyze(req):
+        called.extend(req)
+        return [[t] for t, _, _ in req]
+
+    assert ps.run(requests, analyze) == [["Alice"], [], ["Carol"]]
+    assert [r[0] for r in called] == ["Alice", "Carol"]
+    assert ps.stats() == {"chunks": 3, "skipped": 1, "rate": 1/3}
+
+
+def test50_task(monkeypatch):
+    """
+    Check a task with pre-screening
+    """
+    task = _task(monkeypatch, True)
+    got = task.find_batch(CHUNKS)
+    assert [[p.fields["value"] for p in r] for r in got] == \
+        [["My", "Jane"], [], ["123456789"], []]
+    assert task.prescreen_stats() == {"chunks": 4, "skipped": 2, "rate": 0.5}
+
+    assert list(task.find(CHUNKS[1])) == []
+    assert [p.fields["value"] for p in task.find(CHUNKS[0])] == ["My", "Jane"]
+    assert task.prescreen_stats()["skipped"] == 3
+
+    assert not task.contains_pii(CHUNKS[3])
+
+
+def test60_task_no_prescreen(monkeypatch):
+    """
+    Check a task without pre-screening
+    """
+    task = _task(monkeypatch, None)
+    assert task.prescreen_stats() is None
+    assert len(task.find_batch(CHUNKS)) == 4
+
+
+def test70_bench(monkeypatch):
+    """
+    Check the benchmark comparison, over the benchmark corpus
+    """
+    full = _task(monkeypatch, None, ["en", "es", "it"])
+    screened = _task(monkeypatch, True, ["en", "es", "it"])
+    chunks = bench.load_corpus()
+    got = bench.compare(full, screened, chunks)
+    assert got["chunks"] == len(chunks)
+    assert 0 < got["skipped"] < len(chunks)
+    # The mock analyzer only finds entities that pass the conditions
+    assert got["missed"] == []
+    assert got["recall"] == 1
@@ -0,0 +1,160 @@
+"""
+Test the compact binary serialization of PII entities
+"""
+
+import io
+import re
+import json
+
+import pytest
+
+from pii_data.helper.exception import ProcException, InvArgException
+from pii_data.types import PiiEntity
+
+from pii_extract_plg_presidio.plugin_loader import PiiExtractPluginLoader
+import pii_extract_plg_presidio.task.serial as mod
+import pii_extract_plg_presidio.app.job as job
+
+from taux.monkey_patch import Result, patch_presidio_analyzer
+from taux.taskproc import pii_build_tasks
+
+
+def _entities():
+    pii = [
+        PiiEntity.build("PERSON", "Jöhn Smith", "c1", 3, lang="en",
+                        process={"stage": "detection", "score": 0.85}),
+        PiiEntity.build("LOCATION", "Málaga", "c1", 21, lang="es",
+                        country="es", docid="doc1",
+                        detector={"name": "Presidio", "version": "0.4.0"},
+                        process={"stage": "detection", "score": 0.6,
+                                 "lang_confidence": 0.93}),
+        # Fields that do not fit the entity record
+        PiiEntity.build("PERSON", "Ana", 7, 0, lang="es", docid=12,
+                        extra={"notes": [1, 2]},
+                        process={"stage": "detection", "score": 1,
+                                 "history": []}),
+        PiiEntity.build("GOV_ID", "12345678Z", "c2", 0, lang="es",
+                        subtype="NIF"),
+    ]
+    pii[0].add_field("custom", {"a": "b"})
+    return pii
+
+
+def _check(got, exp):
+    assert len(got) == len(exp)
+    for g, e in zip(got, exp):
+        assert g.info == e.info
+        assert g.pos == e.pos
+        assert g.fields == e.fields
+        assert g.asdict() == e.asdict()
+
+
+# ---------------------------------------------------------------------------
+
+
+def test10_roundtrip():
+    """
+    Check encoding & decoding a batch
+    """
+    exp = _entities()
+    data = mod.pack_batch(exp)
+    _check(mod.unpack_batch(data), exp)
+    assert mod.unpack_batch(mod.pack_batch([])) == []
+
+
+def test20_size():
+    """
+    Check the encoding is smaller than JSON for repetitive batches
+    """
+    pii = [PiiEntity.build("PERSON", "Ada Lovelace", f"chunk-{n//4}", n*20,
+                           lang="en", process={"stage": "detection",
+                                               "score": 0.85})
+           for n in range(200)]
+    data = mod.pack_batch(pii)
+    jdata = "\n".join(json.dumps(p.asdict()) for p in pii).encode("utf-8")
+    assert len(data) < len(jdata)*0.55
+
+
+def test30_stream(tmp_path):
+    """
+    Check writing & reading a stream of batches
+    """
+    exp = _entities()
+    name = tmp_path / "out.piib"
+    with mod.BatchWriter(name) as w:
+        w.write(exp[:2])
+        w.write([])
+        w.write(iter(exp[2:]))
+        assert w.batches == 3 and w.entities == 4
+
+    with mod.BatchReader(name) as r:
+        batches = list(r)
+    assert [len(b) for b in batches] == [2, 0, 2]
+    with mod.BatchReader(str(name)) as r:
+        _check(list(r.entities()), exp)
+
+    _check(mod.loads(mod.dumps([exp]))[0], exp)
+
+
+def test40_errors():
+    """
+    Check invalid inputs
+    """
+    with pytest.raises(InvArgException):
+        mod.BatchReader(io.BytesIO(b"{}"))
+    data = mod.dumps([_entities()])
+    with pytest.raises(ProcException):
+        list(mod.BatchReader(io.BytesIO(data[:-5])))
+    with pytest.raises(ProcException):
+        mod.unpack_batch(mod.pack_batch(_entities())[:-1])
+    with pytest.raises(InvArgException, match="version"):
+        mod.BatchReader(io.BytesIO(b"PIIB\x01" + data[len(mod.MAGIC):]))
+    with pytest.raises(ProcException):
+        mod.pack_batch([PiiEntity.build("PERSON", "Ana", "c1", -1)])
+
+
+def test45_large_pos():
+    """
+    Check positions beyond 4 GB, as found in large files
+    """
+    exp = [PiiEntity.build("PERSON", "Ana", "c1", 5_000_000_000, lang="en"),
+           PiiEntity.build("PERSON", "Eva", "c1", 2**40, lang="en")]
+    _check(mod.unpack_batch(mod.pack_batch(exp)), exp)
+
+
+def test50_job(monkeypatch, tmp_path):
+    """
+    Check a detection job with binary output
+    """
+    mck = patch_presidio_analyzer(monkeypatch, {})
+    mck.return_value.analyze = lambda text, **kw: [
+        Result(m.start(), m.end(), "PERSON", 0.85)
+        for m in re.finditer(r"Name\d", text)]
+    tdesc = list(PiiExtractPluginLoader().get_plugin_tasks("en"))
+    task = list(pii_build_tasks(tdesc))[0]
+
+    corpus = tmp_path / "input.jsonl"
+    with open(corpus, "w", encoding="utf-8") as f:
+        for n in range(10):
+            print(json.dumps({"id": str(n), "data": f"This is Name{n}"}),
+                  file=f)
+
+    got = {}
+    for fmt in ("jsonl", "binary"):
+        outdir = tmp_path / fmt
+        sj = job.ShardJob([str(corpus)], outdir, segment_size=4,
+                          batch_size=3, lang="en", output_format=fmt)
+        state = sj.run(task)
+        assert state["entities"] == 10
+        got[fmt] = sorted((outdir / job.SEGMENT_DIR).iterdir())
+    assert [p.suffix for p in got["binary"]] == [".piib"]*3
+
+    for jname, bname in zip(got["jsonl"], got["binary"]):
+        with open(jname, encoding="utf-8") as f:
+            exp = [json.loads(line) for line in f]
+        with mod.BatchReader(bname) as r:
+            assert [p.asdict() for p in r.entities()] == exp
+
+    # A job cannot be resumed with a different output format
+    with pytest.raises(ProcException):
+        job.ShardJob([str(corpus)], tmp_path / "binary", segment_size=4)
@@ -0,0 +1,118 @@
+"""
+Test pickling tasks as lightweight handles
+"""
+
+import re
+import pickle
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from pii_data.types.doc import DocumentChunk
+
+from pii_extract_plg_presidio import defs
+from pii_extract_plg_presidio.plugin_loader import PiiExtractPluginLoader
+import pii_extract_plg_presidio.task.analyzer as mod_an
+
+from taux.monkey_patch import Result, patch_presidio_analyzer
+from taux.taskproc import pii_build_tasks
+
+
+def _analyze(text, **kwargs):
+    return [Result(m.start(), m.end(), "PERSON", 0.85)
+            for m in re.finditer(r"Name\d+", text)]
+
+
+def _task(config=None):
+    tdesc = list(PiiExtractPluginLoader(config).get_plugin_tasks("en"))
+    return list(pii_build_tasks(tdesc))[0]
+
+
+@pytest.fixture
+def mck(monkeypatch):
+    mck = patch_presidio_analyzer(monkeypatch, {})
+    mck.return_value.analyze = _analyze
+    return mck
+
+
+def _chunk(n: int) -> DocumentChunk:
+    return DocumentChunk(str(n), f"This is Name{n}", {"lang": "en"})
+
+
+def _values(result):
+    return [p.fields["value"] for p in result]
+
+
+def _find(task, n: int):
+    return _values(task.find(_chunk(n)))
+
+
+# ---------------------------------------------------------------------------
+
+
+def test10_handle(mck):
+    """
+    Check the pickled state
+    """
+    task = _task()
+    state = task.__getstate__()
+    assert "analyzer" not in state
+    assert state["_engine_key"] in mod_an.ENGINE_CACHE
+    assert state["lang"] == task.lang
+    assert "PERSON" in state["_ent_map"]["en"]
+
+
+def test20_rebind_cached(mck):
+    """
+    Check an unpickled task binds to the engine in the cache
+    """
+    task = _task()
+    task2 = pickle.loads(pickle.dumps(task))
+    assert task2.analyzer is None
+    task2.ready()
+    assert task2.analyzer is task.analyzer
+    assert _find(task2, 3) == ["Name3"]
+    assert mck.call_count == 1
+
+
+def test30_rebind_new(mck, monkeypatch):
+    """
+    Check an unpickled task builds an engine when the cache does not have it
+    """
+    data = pickle.dumps(_task())
+    monkeypatch.setattr(mod_an, "ENGINE_CACHE", {})
+    task = pickle.loads(data)
+    assert task.ready() is False
+    assert task.analyzer is None
+    assert _find(task, 4) == ["Name4"]
+    assert mck.call_count == 2
+    assert len(mod_an.ENGINE_CACHE) == 1
+
+
+def test40_components(mck):
+    """
+    Check task components are rebuilt in the unpickled task
+    """
+    config = {defs.FMT_CONFIG: {defs.CFG_TASK: {defs.CFG_PRESCREEN: True}}}
+    task = pickle.loads(pickle.dumps(_task(config)))
+    got = task.find_batch([_chunk(1), DocumentChunk("x", "lowercase only",
+                                                    {"lang": "en"})])
+    assert [_values(r) for r in got] == [["Name1"], []]
+    assert task.prescreen_stats()["skipped"] == 1
+
+
+def _worker_find(args):
+    task, n = args
+    return _find(task, n)
+
+
+def test50_pool(mck):
+    """
+    Check sending a task to a process pool
+    """
+    task = _task()
+    ctx = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(2, mp_context=ctx) as pool:
+        got = list(pool.map(_worker_find, [(task, n) for n in range(6)]))
+    assert got == [[f"Name{n}"] for n in range(6)]
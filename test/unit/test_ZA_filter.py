@@ -0,0 +1,132 @@
+"""
+Test per-call PII filters
+"""
+
+import re
+
+import pytest
+
+from pii_data.helper.exception import ProcException
+from pii_data.types.doc import DocumentChunk
+
+from pii_extract_plg_presidio import defs
+from pii_extract_plg_presidio.plugin_loader import PiiExtractPluginLoader
+
+from taux.monkey_patch import Result, patch_presidio_analyzer
+from taux.taskproc import pii_build_tasks
+
+
+PATTERNS = {"PERSON": r"Name\d", "US_PASSPORT": r"\d{9}",
+            "LOCATION": r"London"}
+
+TEXT = "Name1 lives in London, passport 912803456"
+
+
+@pytest.fixture
+def task(monkeypatch):
+    """
+    Build a task with a mock analyzer that detects only the entities it is
+    asked for, and records them
+    """
+    mck = patch_presidio_analyzer(monkeypatch, {})
+    calls = []
+
+    def analyze(text, language, entities, **kwargs):
+        assert entities, "analyzer called with no entities"
+        calls.append(sorted(entities))
+        return [Result(m.start(), m.end(), ent, 0.85)
+                for ent, regex in PATTERNS.items() if ent in entities
+                for m in re.finditer(regex, text)]
+    mck.return_value.analyze = analyze
+
+    tdesc = list(PiiExtractPluginLoader().get_plugin_tasks("en"))
+    task = list(pii_build_tasks(tdesc))[0]
+    task.calls = calls
+    task.engines = mck
+    return task
+
+
+def _chunk(pii_filter=None, cid: str = "1") -> DocumentChunk:
+    ctx = {"lang": "en"}
+    if pii_filter is not None:
+        ctx[defs.CTX_FILTER] = pii_filter
+    return DocumentChunk(cid, TEXT, ctx)
+
+
+def _types(result):
+    return sorted(p.info.pii.name for p in result)
+
+
+# ---------------------------------------------------------------------------
+
+
+def test10_no_filter(task):
+    """
+    Check detection without filters: all task entities are used
+    """
+    assert _types(task.find(_chunk())) == ["GOV_ID", "LOCATION", "PERSON"]
+    assert task.calls == [["LOCATION", "NRP", "PERSON", "US_DRIVER_LICENSE",
+                           "US_PASSPORT"]]
+
+
+def test20_argument(task):
+    """
+    Check a filter given as argument, with Presidio entities or PII types
+    """
+    assert _types(task.find(_chunk(), pii_filter=["PERSON"])) == ["PERSON"]
+    assert _types(task.find(_chunk(), pii_filter="GOV_ID")) == ["GOV_ID"]
+    assert _types(task.find(_chunk(), pii_filter=["NORP", "LOCATION"])) == \
+        ["LOCATION"]
+    assert task.calls == [["PERSON"], ["US_DRIVER_LICENSE", "US_PASSPORT"],
+                          ["LOCATION", "NRP"]]
+
+
+def test30_context(task):
+    """
+    Check a filter in the chunk context, and combined with an argument
+    """
+    chunk = _chunk(["PERSON", "GOV_ID"])
+    assert _types(task.find(chunk)) == ["GOV_ID", "PERSON"]
+    assert _types(task.find(chunk, pii_filter=["PERSON", "LOCATION"])) == \
+        ["PERSON"]
+    assert task.calls[-1] == ["PERSON"]
+
+
+def test40_empty(task):
+    """
+    Check filters that leave no entities: the analyzer is not called
+    """
+    assert list(task.find(_chunk([]))) == []
+    assert list(task.find(_chunk(), pii_filter=["CREDIT_CARD"])) == []
+    assert not task.contains_pii(_chunk(), pii_filter=["EMAIL_ADDRESS"])
+    assert task.calls == []
+
+
+def test45_unknown(task):
+    """
+    Check filters with names that are neither PII types nor Presidio entities
+    """
+    with pytest.raises(ProcException, match="PASSPORT, PERSONS"):
+        list(task.find(_chunk(), pii_filter=["PERSONS", "PERSON", "PASSPORT"]))
+    with pytest.raises(ProcException, match="GOVID"):
+        task.find_batch([_chunk(["GOVID"])])
+    with pytest.raises(ProcException):
+        task.contains_pii(_chunk("LOCATIONS"))
+    assert task.calls == []
+
+
+def test50_batch(task):
+    """
+    Check a batch with a different filter for each chunk, on one engine
+    """
+    chunks = [_chunk(["PERSON"], "1"), _chunk(["LOCATION"], "2"),
+              _chunk([], "3"), _chunk(None, "4")]
+    got = task.find_batch(chunks)
+    assert [_types(r) for r in got] == [
+        ["PERSON"], ["LOCATION"], [], ["GOV_ID", "LOCATION", "PERSON"]]
+    assert len(task.calls) == 3
+
+    got = task.find_batch(chunks, pii_filter=["GOV_ID", "PERSON"])
+    assert [_types(r) for r in got] == [["PERSON"], [], [],
+                                        ["GOV_ID", "PERSON"]]
+    assert task.engines.call_count == 1
@@ -0,0 +1,259 @@
+"""
+Test engine recycling
+"""
+
+import re
+from types import SimpleNamespace
+
+import pytest
+
+from pii_data.helper.exception import ConfigException
+from pii_data.types.doc import DocumentChunk
+
+from pii_extract_plg_presidio import defs
+from pii_extract_plg_presidio.plugin_loader import load_presidio_plugin_config
+from pii_extract_plg_presidio.task import PresidioTaskCollector
+import pii_extract_plg_presidio.task.analyzer as mod_an
+import pii_extract_plg_presidio.task.recycle as mod
+
+from taux.monkey_patch import Result, AnalyzerEngineMock, PRESIDIO_ENT, \
+    patch_presidio_analyzer
+from taux.taskproc import pii_build_tasks
+
+
+class EngineMock(AnalyzerEngineMock):
+    """
+    An analyzer engine mock that detects "Name<number>", with a fake spaCy
+    pipeline whose StringStore grows with each new word analyzed
+    """
+
+    def __init__(self, fail: bool = False, **kwargs):
+        if fail:
+            raise RuntimeError("cannot build")
+        super().__init__({}, entities=PRESIDIO_ENT)
+        self.strings = set()
+        vocab = SimpleNamespace(strings=self.strings)
+        self.nlp_engine = SimpleNamespace(nlp={"en": SimpleNamespace(vocab=vocab)})
+
+    def get_recognizers(self, language: str = None):
+        return []
+
+    def analyze(self, text: str, **kwargs):
+        self.strings.update(text.split())
+        return [Result(m.start(), m.end(), "PERSON", 0.85)
+                for m in re.finditer(r"Name\d+", text)]
+
+
+@pytest.fixture
+def engines(monkeypatch):
+    """
+    Patch the analyzer engine class so that each build creates a new engine
+    """
+    mck = patch_presidio_analyzer(monkeypatch, {})
+    mck.side_effect = lambda **kwargs: EngineMock(**kwargs)
+    monkeypatch.setattr(mod_an, "RECYCLERS", {})
+    return mck
+
+
+def _task(recycle):
+    config = load_presidio_plugin_config()
+    config[defs.CFG_ENGINE][defs.CFG_RECYCLE] = recycle
+    tdesc = list(PresidioTaskCollector(config, languages=["en"]).gather_tasks())
+    return list(pii_build_tasks(tdesc))[0]
+
+
+def _chunk(n: int, words: int = 1) -> DocumentChunk:
+    text = " ".join(f"word{n}-{w}" for w in range(words))
+    return DocumentChunk(str(n), f"This is Name{n} {text}", {"lang": "en"})
+
+
+def _find(task, n: int, words: int = 1):
+    return [p.fields["value"] for p in task.find(_chunk(n, words))]
+
+
+# ---------------------------------------------------------------------------
+
+
+def test10_config():
+    """
+    Check invalid configurations
+    """
+    args = "key", None, lambda old: None, lambda new: None
+    with pytest.raises(ConfigException):
+        mod.EngineRecycler(args[0], {"check_interval": 10}, *args[1:])
+    with pytest.raises(ConfigException):
+        mod.EngineRecycler(args[0], {"max_chunks": 10, "max_memory": 10},
+                           *args[1:])
+    with pytest.raises(ConfigException):
+        mod.EngineRecycler(args[0], True, *args[1:])
+
+
+def test20_string_store():
+    """
+    Check the StringStore size of an engine
+    """
+    engine = EngineMock()
+    assert mod.string_store_size(engine) == 0
+    engine.analyze("one two three")
+    assert mod.string_store_size(engine) == 3
+    assert mod.string_store_size(object()) is None
+
+
+def test30_chunks(engines):
+    """
+    Check recycling after a number of chunks, in the foreground
+    """
+    task = _task({"max_chunks": 5, "background": False})
+    engine0 = task.analyzer
+    for n in range(5):
+        assert _find(task, n) == [f"Name{n}"]
+
+    # The fifth chunk triggered a recycle, and the new engine is in the cache
+    assert engines.call_count == 2
+    key = mod_an.engine_key(task._cfg, ["en"])
+    assert mod_an.ENGINE_CACHE[key] is not engine0
+    assert _find(task, 5) == ["Name5"]
+    assert task.analyzer is mod_an.ENGINE_CACHE[key]
+
+    stats = task.recycle_stats()
+    assert len(stats) == 1
+    assert stats[0]["recycles"] == 1
+    assert stats[0]["chunks"] == 1
+    event = stats[0]["events"][0]
+    assert event["reason"] == "chunks"
+    assert event["chunks"] == 5
+    assert event["rss_before"] > 0 and event["rss_after"] > 0
+
+
+def test40_background(engines):
+    """
+    Check recycling in a background thread
+    """
+    task = _task({"max_chunks": 3})
+    for n in range(3):
+        assert _find(task, n) == [f"Name{n}"]
+    recycler = mod_an.RECYCLERS[mod_an.engine_key(task._cfg, ["en"])]
+    recycler.wait()
+    assert recycler.recycles == 1
+    assert _find(task, 3) == ["Name3"]
+    assert task.analyzer is recycler.engine
+
+
+def test50_strings(engines):
+    """
+    Check recycling on StringStore growth
+    """
+    task = _task({"max_strings": 30, "check_interval": 2,
+                  "background": False})
+    for n in range(4):
+        _find(task, n, words=10)
+    stats = task.recycle_stats()[0]
+    assert stats["recycles"] == 1
+    assert stats["events"][0]["reason"] == "strings"
+    assert stats["events"][0]["strings_growth"] >= 30
+    assert stats["strings_growth"] == 0
+
+
+@pytest.fixture
+def rss(monkeypatch):
+    """
+    Patch the process RSS seen by the recycler, to a settable value (in MB)
+    """
+    value = [100]
+    monkeypatch.setattr(mod, "current_rss", lambda: value[0]*2**20)
+    return value
+
+
+def test60_rss(engines, rss):
+    """
+    Check recycling on process RSS growth
+    """
+    task = _task({"max_rss": 50, "check_interval": 1, "background": False})
+    rss[0] = 140
+    _find(task, 1)
+    assert task.recycle_stats()[0]["recycles"] == 0
+    rss[0] = 160
+    _find(task, 2)
+    stats = task.recycle_stats()[0]
+    assert stats["recycles"] == 1
+    assert stats["events"][0]["reason"] == "rss"
+    assert stats["rss_growth"] == 0
+
+
+def test61_rss_baseline(engines, rss):
+    """
+    Check that a process RSS that stays above the threshold after a recycle
+    does not trigger further recycles
+    """
+    task = _task({"max_rss": 50, "check_interval": 1, "background": False})
+    rss[0] = 300
+    for n in range(10):
+        _find(task, n)
+    assert task.recycle_stats()[0]["recycles"] == 1
+    assert engines.call_count == 2
+
+    # Further growth from the new baseline triggers another one
+    rss[0] = 360
+    _find(task, 10)
+    assert task.recycle_stats()[0]["recycles"] == 2
+
+
+def test70_failure(engines):
+    """
+    Check a failed recycle: the current engine is kept
+    """
+    task = _task({"max_chunks": 2, "background": False})
+    engine0 = task.analyzer
+    engines.side_effect = lambda **kwargs: EngineMock(fail=True)
+    for n in range(3):
+        assert _find(task, n) == [f"Name{n}"]
+    stats = task.recycle_stats()[0]
+    assert stats["recycles"] == 0
+    assert "RuntimeError" in stats["events"][0]["error"]
+    assert stats["chunks"] == 1
+    assert task.analyzer is engine0
+
+
+def test71_contains_pii(engines):
+    """
+    Check that PII screening counts for recycling, and switches to the
+    recycled engine
+    """
+    task = _task({"max_chunks": 3, "background": False})
+    engine0 = task.analyzer
+    for n in range(3):
+        assert task.contains_pii(_chunk(n)) is False
+    stats = task.recycle_stats()[0]
+    assert stats["recycles"] == 1
+    assert stats["events"][0]["chunks"] == 3
+
+    task.contains_pii(_chunk(3))
+    assert task.analyzer is not engine0
+    assert task.analyzer is mod_an.ENGINE_CACHE[mod_an.engine_key(task._cfg,
+                                                                  ["en"])]
+    assert task.recycle_stats()[0]["chunks"] == 1
+
+
+def test75_engine_key(engines):
+    """
+    Check that tasks with different recycling policies do not share engines
+    """
+    task1 = _task({"max_chunks": 2, "background": False})
+    task2 = _task({"max_chunks": 100, "background": False})
+    task3 = _task({"max_chunks": 2, "background": False})
+    assert task1.analyzer is not task2.analyzer
+    assert task1.analyzer is task3.analyzer
+    assert engines.call_count == 2
+    for n in range(2):
+        _find(task2, n)
+    assert task2.recycle_stats()[0]["recycles"] == 0
+    assert task1.recycle_stats()[0]["chunks"] == 0
+
+
+def test80_no_recycle(engines):
+    """
+    Check a task without recycling
+    """
+    task = _task(None)
+    assert task.recycle_stats() is None
+    assert _find(task, 1) == ["Name1"]